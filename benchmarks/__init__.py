@@ -0,0 +1,5 @@
+"""
+Benchmarks of the DCF-WACC valuation engine on synthetic universes.
+
+python -m benchmarks --sizes 10 1000 100000 1000000
+"""
@@ -0,0 +1,319 @@
+"""
+Throughput and peak memory of the valuation engine.
+
+Cases time the per-ticker path of runner.value_statements, its steps
+(financials, capital) and the batch path of valuation.value_universe
+on synthetic universes. Per-ticker cases run on the first
+CONFIG["tickerSample"] tickers of a universe, throughput is per ticker
+either way. Every case reports:
+1/ best wall time of CONFIG["repeat"] runs, tickers per second
+2/ tracemalloc peak of one more run, numpy buffers included
+and is compared with benchmarks/baselines.json; throughput below or
+peak memory above the baseline by more than CONFIG["tolerance"] is a
+regression, python -m benchmarks exits with 1.
+
+python -m benchmarks --sizes 10 1000 --update
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks import synthetic
+from evkit import capital, financials, runner, valuation
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "sizes": [10, 1_000, 100_000, 1_000_000],
+    "repeat": 3,
+    "minTime": 0.2,  # seconds of a timed run, short cases are looped
+    "tickerSample": 10_000,  # tickers of per-ticker cases
+    "tolerance": 0.25,  # relative change flagged as regression
+    "memorySlack": 1 << 20,  # bytes, ignored growth of small peaks
+    "baselines": os.path.join(os.path.dirname(__file__), "baselines.json"),
+    "rf": 0.025,
+    "mrp": 0.055,
+    "horizon": 5,
+}
+
+
+# -------------------- Cases --------------------
+def statements(row):
+    """ Actual pro-forma statements of a ticker row """
+    fin_is = financials.IncomeStatement(ticker=None)
+    fin_bs = financials.BalanceSheet(ticker=None)
+    fin_cf = financials.CashFlowStatement(ticker=None)
+    for fs in (fin_is, fin_bs, fin_cf):
+        fs.set_actual(row)
+    return fin_is, fin_bs, fin_cf
+
+
+def cost_of_capital(beta, price):
+    cap = capital.CostOfCapital(ticker=None,
+                                rf=CONFIG["rf"],
+                                mrp=CONFIG["mrp"])
+    cap.equity_beta, cap.mkt_price = beta, price
+    return cap
+
+
+def value_ticker(data, i, row):
+    fin_is, fin_bs, fin_cf = statements(row)
+    cap = cost_of_capital(data["equity_beta"][i], data["mkt_price"][i])
+    return runner.value_statements(fin_is, fin_bs, fin_cf, cap,
+                                   data["num_shares"][i], CONFIG["horizon"])
+
+
+def st_growth(data, i, row):
+    return financials.IncomeStatement.get_st_growth(row["revenue"])
+
+
+def projections(data, i, row):
+    return financials.IncomeStatement.get_projections(
+        row["ebit"], CONFIG["horizon"], 0.05)
+
+
+def tax_rate(data, i, row):
+    fin_is = financials.IncomeStatement(ticker=None)
+    fin_is.tax, fin_is.ebit = row["tax"], row["ebit"]
+    return fin_is.get_tax_rate()
+
+
+def wacc(data, i, row):
+    cap = cost_of_capital(data["equity_beta"][i], data["mkt_price"][i])
+    debt = row["st_debt"] + row["lt_debt"]
+    cap.get_cost_of_debt(debt=debt, interest=row["interest"])
+    cap.get_debt_beta()
+    cap.get_asset_beta(debt=row["lt_debt"], equity=row["equity"],
+                       tax_rate=0.21)
+    cap.get_cost_of_equity()
+    return cap.get_wacc(debt=row["lt_debt"],
+                        assets=row["total_assets"],
+                        tax_rate=0.21)
+
+
+def discount_factors(data, i, row):
+    return capital.discount_factors(0.08, periods=CONFIG["horizon"])
+
+
+def dcf(data, i, row):
+    periods = valuation.HISTORY + CONFIG["horizon"]
+    flows = np.resize(row["ebit"], periods)
+    return financials.dcf(ebit=flows,
+                          dna=flows * 0.2,
+                          nwc=flows * 0.1,
+                          capex=-flows * 0.3,
+                          tax_rate=0.21,
+                          lt_growth=0.03,
+                          wacc=0.08,
+                          dt=np.full(CONFIG["horizon"] + 1, 0.9))
+
+
+def value_universe(data):
+    with np.errstate(all="ignore"):
+        return valuation.value_universe(data["statements"],
+                                        equity_beta=data["equity_beta"],
+                                        num_shares=data["num_shares"],
+                                        mkt_price=data["mkt_price"],
+                                        rf=CONFIG["rf"],
+                                        mrp=CONFIG["mrp"],
+                                        horizon=CONFIG["horizon"])
+
+
+# per-ticker cases, func(data, i, row) of every sampled ticker
+TICKER_CASES = {
+    "runner.value_statements": value_ticker,
+    "IncomeStatement.get_st_growth": st_growth,
+    "IncomeStatement.get_projections": projections,
+    "IncomeStatement.get_tax_rate": tax_rate,
+    "CostOfCapital.get_wacc": wacc,
+    "capital.discount_factors": discount_factors,
+    "financials.dcf": dcf,
+}
+# batch cases, func(data) of the whole universe
+BATCH_CASES = {
+    "valuation.value_universe": value_universe,
+}
+
+
+# -------------------- Runner --------------------
+def timed(run, loops):
+    gc.collect()
+    start = time.perf_counter()
+    for _ in range(loops):
+        run()
+    return time.perf_counter() - start
+
+
+def measure(run, repeat):
+    """
+    Best wall time of a run out of repeated timings and tracemalloc
+    peak of one run; runs shorter than minTime are looped per timing.
+    """
+    loops = 1
+    elapsed = timed(run, loops)
+    while elapsed < CONFIG["minTime"]:
+        scale = int(CONFIG["minTime"] / max(elapsed, 1e-9))
+        loops *= max(2, min(10, scale))
+        elapsed = timed(run, loops)
+    best = elapsed / loops
+    for _ in range(repeat - 1):
+        best = min(best, timed(run, loops) / loops)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    run()
+    peak = tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return best, peak
+
+
+def run_size(size, cases=None, repeat=None):
+    """ Results of every case on a synthetic universe of size tickers """
+    repeat = repeat or CONFIG["repeat"]
+    data = synthetic.universe(size)
+    rows = synthetic.rows(data, CONFIG["tickerSample"])
+    results = []
+    for name, func in {**TICKER_CASES, **BATCH_CASES}.items():
+        if cases is not None and name not in cases:
+            continue
+        if name in TICKER_CASES:
+            tickers = len(rows)
+
+            def run():
+                for i, row in enumerate(rows):
+                    func(data, i, row)
+        else:
+            tickers = size
+
+            def run():
+                func(data)
+
+        with np.errstate(all="ignore"):
+            seconds, peak = measure(run, repeat)
+        results.append({
+            "case": name,
+            "size": size,
+            "tickers": tickers,
+            "seconds": seconds,
+            "throughput": tickers / seconds,
+            "peak": peak,
+        })
+    return results
+
+
+def key(result):
+    return f'{result["case"]}@{result["size"]}'
+
+
+# -------------------- Baselines --------------------
+def load_baselines(path=None):
+    path = path or CONFIG["baselines"]
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r") as file:
+        return json.load(file)["results"]
+
+
+def save_baselines(results, path=None):
+    """ Merge results into the baselines file """
+    path = path or CONFIG["baselines"]
+    baselines = load_baselines(path)
+    for result in results:
+        baselines[key(result)] = {
+            "throughput": round(result["throughput"], 1),
+            "peak": result["peak"],
+        }
+    with open(path, "w") as file:
+        json.dump(
+            {
+                "machine": {
+                    "python": platform.python_version(),
+                    "numpy": np.__version__,
+                    "processor": platform.machine(),
+                    "cpus": os.cpu_count(),
+                },
+                "results": dict(sorted(baselines.items())),
+            },
+            file,
+            indent=1)
+    return path
+
+
+def compare(results, baselines, tolerance=None):
+    """ Flag results slower or heavier than their baseline """
+    tolerance = CONFIG["tolerance"] if tolerance is None else tolerance
+    for result in results:
+        baseline = baselines.get(key(result))
+        result["speedup"] = None
+        result["regression"] = []
+        if baseline is None:
+            continue
+        result["speedup"] = result["throughput"] / baseline["throughput"]
+        if result["speedup"] < 1 - tolerance:
+            result["regression"].append("throughput")
+        if result["peak"] > baseline["peak"] * (1 + tolerance) + \
+                CONFIG["memorySlack"]:
+            result["regression"].append("memory")
+    return results
+
+
+def report(results):
+    lines = [
+        f'{"case":<32s} {"size":>9s} {"tickers/s":>12s} '
+        f'{"peak, MiB":>10s} {"vs base":>8s}  flags'
+    ]
+    for result in results:
+        speedup = "" if result.get("speedup") is None else \
+            f'{result["speedup"]:.2f}x'
+        lines.append(f'{result["case"]:<32s} {result["size"]:>9d} '
+                     f'{result["throughput"]:>12,.0f} '
+                     f'{result["peak"] / 2**20:>10.2f} {speedup:>8s}  '
+                     f'{",".join(result.get("regression", []))}')
+    return "\n".join(lines)
+
+
+# -------------------- Command Line --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the valuation engine on synthetic universes.')
+    parser.add_argument('--sizes',
+                        nargs='+',
+                        type=int,
+                        default=CONFIG['sizes'],
+                        help='tickers of synthetic universes')
+    parser.add_argument('--cases', nargs='+', help='names of cases to run')
+    parser.add_argument('--repeat', type=int, default=CONFIG['repeat'])
+    parser.add_argument('--baselines', default=CONFIG['baselines'])
+    parser.add_argument('--tolerance',
+                        type=float,
+                        default=CONFIG['tolerance'],
+                        help='relative change flagged as regression')
+    parser.add_argument('--update',
+                        action='store_true',
+                        help='store results as new baselines')
+    parser.add_argument('--output', help='json file of results')
+    args = parser.parse_args(argv)
+
+    results = []
+    for size in args.sizes:
+        results += run_size(size, args.cases, args.repeat)
+    compare(results, load_baselines(args.baselines), args.tolerance)
+    print(report(results))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=1)
+    if args.update:
+        print(f"Baselines saved to {save_baselines(results, args.baselines)}")
+        return 0
+    regressions = [key(r) for r in results if r["regression"]]
+    if regressions:
+        print(f"Regressions: {', '.join(regressions)}")
+        return 1
+    return 0
@@ -0,0 +1,61 @@
+"""
+Synthetic statement data of a universe of tickers.
+
+Statements are 4 yearly periods of every valuation.FIELDS item in the
+units and sign conventions of YahooFinance pages (interest and capex
+negative), with market inputs of every ticker. Data only depends on
+the size and the seed.
+"""
+
+import numpy as np
+
+from evkit import valuation
+
+# item to revenue ratios of the latest year, (low, high)
+RATIOS = {
+    "ebit": (0.05, 0.3),
+    "interest": (-0.03, -0.005),
+    "tax": (0.01, 0.06),
+    "cash": (0.05, 0.3),
+    "current_assets": (0.3, 0.8),
+    "total_assets": (1.0, 3.0),
+    "current_liabilities": (0.2, 0.6),
+    "st_debt": (0.02, 0.2),
+    "lt_debt": (0.1, 0.8),
+    "equity": (0.5, 1.5),
+    "depreciation": (0.02, 0.08),
+    "capex": (-0.1, -0.02),
+}
+
+
+def universe(size, seed=0):
+    """
+    Statement arrays of shape (size, HISTORY) by field and market
+    inputs of shape (size, ): equity_beta, num_shares, mkt_price.
+    """
+    rng = np.random.default_rng(seed)
+    periods = valuation.HISTORY
+    revenue = rng.lognormal(mean=7, sigma=1.5, size=size)
+    growth = rng.normal(0.05, 0.1, size=size)
+    # oldest period first
+    trend = (1 + growth[:, np.newaxis])**np.arange(1 - periods, 1)
+    noise = rng.normal(1, 0.02, size=(size, periods))
+    statements = {"revenue": revenue[:, np.newaxis] * trend * noise}
+    for field, (low, high) in RATIOS.items():
+        ratio = rng.uniform(low, high, size=(size, 1))
+        noise = rng.normal(1, 0.05, size=(size, periods))
+        statements[field] = statements["revenue"] * ratio * noise
+    return {
+        "statements": statements,
+        "equity_beta": rng.uniform(0.3, 2.0, size=size),
+        "num_shares": revenue * rng.uniform(0.01, 0.1, size=size),
+        "mkt_price": rng.lognormal(mean=3.5, sigma=1, size=size),
+    }
+
+
+def rows(data, count):
+    """ Per-ticker dicts of statement rows of the first count tickers """
+    statements = data["statements"]
+    return [{field: values[i]
+             for field, values in statements.items()}
+            for i in range(min(count, len(data["equity_beta"])))]
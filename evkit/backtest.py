@@ -0,0 +1,379 @@
+"""
+Vectorized backtest of the DCF-WACC signal
+over SEC Financial Statement Data Sets.
+
+Every filer is valued at every quarter from the statements filed up to
+that quarter and compared to the quote of a local price file.
+Panels are arrays of shape (quarters, companies).
+"""
+
+import hashlib
+import json
+import os
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from evkit import beta, sec_datareader, symbols, valuation
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "path": {
+        "cache": "data/backtest/",
+        # csv of quotes with columns date (yyyy-mm-dd), cik or ticker, close
+        "prices": "data/prices.csv",
+    },
+    "assumptions": {
+        "horizon": 5,
+        "riskFree": 0.025,
+        "marketPremium": 0.055,
+    },
+    "betaWindow": 12,  # quarters of returns in beta regression
+    "betaMinPeriods": 6,
+    "quantiles": 5,
+    "unit": 1_000_000_000,  # SEC values are in dollars
+}
+
+# balance sheet items, observed at the period end (qtrs == 0);
+# other statement items are annual flows (qtrs == 4)
+STOCKS = tuple(sec_datareader.CONFIG["statementInstants"])
+
+# format of cached panels, bumped when panels of the same inputs change
+CACHE_VERSION = 2
+
+
+# -------------------- Helper Functions --------------------
+def quarter_ordinal(dates):
+    """ Quarter ordinal of yyyymmdd dates """
+    dates = np.asarray(dates, dtype=np.int64)
+    return dates // 10000 * 4 + (dates // 100 % 100 - 1) // 3
+
+
+def quarter_label(ordinals):
+    """ Label quarter ordinals as in SEC archive names """
+    return [f"{q // 4}q{q % 4 + 1}" for q in ordinals]
+
+
+def forward_fill(panel):
+    """ Carry the last valid value forward along the time axis """
+    rows = np.where(~np.isnan(panel), np.arange(panel.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return panel[rows, np.arange(panel.shape[1])]
+
+
+def lag(panel, periods):
+    """ Shift panel along the time axis, padding with NaN """
+    shifted = np.full_like(panel, np.nan)
+    if periods >= 0:
+        shifted[periods:] = panel[:panel.shape[0] - periods]
+    else:
+        shifted[:periods] = panel[-periods:]
+    return shifted
+
+
+def history(panel, periods=valuation.HISTORY, step=4):
+    """ Stack yearly history of a quarterly panel, oldest period first """
+    return np.stack([lag(panel, step * k) for k in reversed(range(periods))],
+                    axis=-1)
+
+
+def load_prices(path=None, symbol_index=None):
+    """
+    Read quotes, keep the last close of every quarter.
+    Quotes by ticker are mapped to CIKs with the symbol index.
+    """
+    prices = pd.read_csv(path or CONFIG["path"]["prices"])
+    if "cik" not in prices.columns:
+        symbol_index = symbol_index or symbols.SymbolIndex.load()
+        tickers = prices["ticker"].unique()
+        ciks = dict(zip(tickers, symbol_index.map_tickers(tickers)))
+        prices = prices.assign(cik=prices["ticker"].map(ciks))
+        prices = prices.dropna(subset=["cik"])
+        prices["cik"] = prices["cik"].astype(np.int64)
+    dates = pd.to_datetime(prices["date"]).dt.strftime("%Y%m%d")
+    prices["quarter"] = quarter_ordinal(dates.astype(np.int64))
+    prices = prices.sort_values("date")
+    prices = prices.groupby(["quarter", "cik"])["close"].last()
+    return prices.unstack("cik").sort_index()
+
+
+def align(series, quarters):
+    """ Broadcast scalar or per-quarter assumption over the time axis """
+    if isinstance(series, pd.Series):
+        values = series.reindex(quarters).ffill().to_numpy(dtype=float)
+        return values[:, np.newaxis]
+    return series
+
+
+# -------------------- Backtest --------------------
+class Backtest:
+    """
+    Class for backtesting DCF-WACC stock price against the market quote.
+    """
+
+    def __init__(self, finData, index, prices, rf=None, mrp=None, market=None):
+        self.verbose = CONFIG["verbose"]
+        self.cache = CONFIG["path"]["cache"]
+        self.horizon = CONFIG["assumptions"]["horizon"]
+
+        self.finData = finData
+        self.index = index
+        self.prices = prices.sort_index().sort_index(axis=1)
+        # scalars or pd.Series indexed by quarter ordinal
+        self.rf = CONFIG["assumptions"]["riskFree"] if rf is None else rf
+        self.mrp = CONFIG["assumptions"]["marketPremium"] if mrp is None \
+            else mrp
+        self.market = market  # market returns, equal-weighted if None
+
+        self.quarters = self.prices.index.to_numpy()
+        self.ciks = self.prices.columns.to_numpy()
+        self.panel = None
+        self.betas = None
+        self.valuation = None
+        self.signal = None
+        self.performance = None
+        self.summary = None
+
+    def _key(self, *params):
+        """ Fingerprint of the inputs of a cached panel """
+        digest = hashlib.md5()
+        for frame in (self.finData, self.index):
+            digest.update(
+                pd.util.hash_pandas_object(frame).to_numpy().tobytes())
+        digest.update(np.asarray(self.prices.index).tobytes())
+        digest.update(np.asarray(self.prices.columns).tobytes())
+        digest.update(self.prices.to_numpy(dtype=float).tobytes())
+        digest.update(
+            json.dumps([CACHE_VERSION,
+                        sec_datareader.CONFIG["statementTags"], *params],
+                       default=str).encode())
+        return digest.hexdigest()[:16]
+
+    def _cached(self, name, key, builder):
+        """ Load panels from the cache, build and save them on a miss """
+        path = "".join([self.cache, name, "-", key, ".npz"])
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                panels = {field: cached[field] for field in cached.files}
+            if self.verbose:
+                print(f"Loaded {path}")
+            return panels
+
+        panels = builder()
+        if not os.path.exists(self.cache):
+            os.makedirs(self.cache)
+        np.savez(path, **panels)
+        if self.verbose:
+            print(f"Cached {path}")
+        return panels
+
+    def build_panel(self):
+        """
+        Point-in-time statement items of every company at every quarter.
+        """
+        if self.verbose:
+            print("Start building statement panel.")
+
+        self.panel = self._cached("panel", self._key(), self._build_panel)
+
+        if self.verbose:
+            print(f"Complete statement panel of {len(self.ciks)} companies, "
+                  f"{len(self.quarters)} quarters.\n")
+        return self.panel
+
+    def _build_panel(self):
+        # values as first reported, comparatives of later filings
+        # restate them after the fact
+        facts = sec_datareader.statement_facts(self.finData,
+                                               self.index,
+                                               first=True)
+        stock = facts["field"].isin(STOCKS)
+        facts = facts[(stock & (facts["qtrs"] == 0)) |
+                      (~stock & (facts["qtrs"] == 4))]
+
+        # facts become known in the quarter of filing
+        filed = quarter_ordinal(facts["filed"])
+        t = np.searchsorted(self.quarters, filed)
+        i = np.searchsorted(self.ciks, facts["cik"])
+        i = np.minimum(i, len(self.ciks) - 1)
+        known = (filed <= self.quarters[-1]) & (
+            self.ciks[i] == facts["cik"].to_numpy())
+        facts = facts.assign(t=t, i=i)[known]
+        # latest period end of each filing quarter
+        facts = facts.sort_values(["field", "i", "t", "ddate"])
+        facts = facts.drop_duplicates(["field", "i", "t"], keep="last")
+
+        shape = (len(self.quarters), len(self.ciks))
+        panel = {}
+        for field in (*valuation.FIELDS, "shares"):
+            values = np.full(shape, np.nan)
+            items = facts[facts["field"] == field]
+            values[items["t"], items["i"]] = items["value"]
+            panel[field] = forward_fill(values)
+        return panel
+
+    def get_betas(self):
+        """
+        Rolling equity betas from quarterly returns.
+        """
+        prices = self.prices.to_numpy(dtype=float)
+        returns = prices / lag(prices, 1) - 1
+        if self.market is None:
+            with warnings.catch_warnings():
+                # quarters without quotes
+                warnings.simplefilter("ignore", RuntimeWarning)
+                market = np.nanmean(returns, axis=1)
+        else:
+            market = align(self.market, self.quarters).ravel()
+        self.betas = beta.rolling_beta(returns,
+                                       market,
+                                       window=CONFIG["betaWindow"],
+                                       min_periods=CONFIG["betaMinPeriods"])
+        return self.betas
+
+    def value(self):
+        """
+        DCF-WACC valuation of the panel.
+        """
+        if self.panel is None:
+            self.build_panel()
+        if self.betas is None:
+            self.get_betas()
+
+        if self.verbose:
+            print("Start valuation of the panel.")
+
+        rf = align(self.rf, self.quarters)
+        mrp = align(self.mrp, self.quarters)
+        key = self._key(self.horizon, CONFIG["betaWindow"],
+                        np.asarray(rf).tolist(),
+                        np.asarray(mrp).tolist())
+
+        def builder():
+            statements = {
+                field: history(self.panel[field])
+                for field in valuation.FIELDS
+            }
+            results = valuation.value_universe(
+                statements,
+                equity_beta=self.betas,
+                num_shares=self.panel["shares"],
+                mkt_price=self.prices.to_numpy(dtype=float),
+                rf=rf,
+                mrp=mrp,
+                horizon=self.horizon,
+                unit=CONFIG["unit"])
+            return results
+
+        self.valuation = self._cached("valuation", key, builder)
+
+        if self.verbose:
+            print("Complete valuation of the panel.\n")
+        return self.valuation
+
+    def get_signal(self):
+        """
+        Upside of DCF-WACC stock price to the market quote.
+        """
+        if self.valuation is None:
+            self.value()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            self.signal = (self.valuation["stock_price"] /
+                           self.valuation["mkt_stock_price"] - 1)
+        self.signal[~np.isfinite(self.signal)] = np.nan
+        return self.signal
+
+    def evaluate(self):
+        """
+        Performance of the signal against next quarter returns.
+        """
+        if self.signal is None:
+            self.get_signal()
+
+        prices = self.prices.to_numpy(dtype=float)
+        forward = lag(prices, -1) / prices - 1
+        valid = ~np.isnan(self.signal) & ~np.isnan(forward)
+        signal = np.where(valid, self.signal, np.nan)
+        forward = np.where(valid, forward, np.nan)
+
+        # cross-sectional ranks, rank IC as correlation of ranks
+        signalRank = pd.DataFrame(signal).rank(axis=1, pct=True).to_numpy()
+        forwardRank = pd.DataFrame(forward).rank(axis=1, pct=True).to_numpy()
+        coverage = valid.sum(axis=1)
+        with warnings.catch_warnings(), np.errstate(divide="ignore",
+                                                    invalid="ignore"):
+            # quarters without coverage
+            warnings.simplefilter("ignore", RuntimeWarning)
+            sd = signalRank - np.nanmean(signalRank, axis=1, keepdims=True)
+            fd = forwardRank - np.nanmean(forwardRank, axis=1, keepdims=True)
+            ic = np.nansum(sd * fd, axis=1) / np.sqrt(
+                np.nansum(sd**2, axis=1) * np.nansum(fd**2, axis=1))
+
+            # long top quantile, short bottom quantile of the signal
+            order = pd.DataFrame(signal).rank(axis=1,
+                                              method="first",
+                                              pct=True).to_numpy()
+            bucket = np.ceil(order * CONFIG["quantiles"])
+            top = bucket == CONFIG["quantiles"]
+            bottom = bucket == 1
+            spread = (np.nansum(np.where(top, forward, 0), axis=1) /
+                      top.sum(axis=1) -
+                      np.nansum(np.where(bottom, forward, 0), axis=1) /
+                      bottom.sum(axis=1))
+            hits = np.sign(signal) == np.sign(forward)
+            hitRate = hits.sum(axis=1) / coverage
+
+        self.performance = pd.DataFrame(
+            {
+                "coverage": coverage,
+                "ic": ic,
+                "spread": spread,
+                "hit_rate": hitRate,
+            },
+            index=pd.Index(quarter_label(self.quarters), name="quarter"))
+        self.performance = self.performance[coverage > 0]
+
+        ics = self.performance["ic"].dropna()
+        self.summary = {
+            "quarters": len(self.performance),
+            "mean_coverage": self.performance["coverage"].mean(),
+            "mean_ic": ics.mean(),
+            "ic_tstat": ics.mean() / ics.std() * np.sqrt(len(ics)),
+            "mean_spread": self.performance["spread"].mean(),
+            "annual_spread": (1 + self.performance["spread"].mean())**4 - 1,
+            "hit_rate": self.performance["hit_rate"].mean(),
+        }
+        return self.performance
+
+    def run(self):
+        """
+        Run all stages of the backtest.
+        """
+        self.build_panel()
+        self.get_betas()
+        self.value()
+        self.get_signal()
+        self.evaluate()
+
+        if self.verbose:
+            print("Signal performance:")
+            for key, value in self.summary.items():
+                print(f"{key:>14s} {value:.4f}")
+        return self.performance
+
+
+def main():
+    # load persisted SEC data and quotes
+    findata = sec_datareader.FinancialDataSEC()
+    index, finData = findata.load()
+    prices = load_prices()
+
+    # backtest DCF-WACC signal
+    backtest = Backtest(finData, index, prices)
+    backtest.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+"""
+Regression betas of a universe from a local price history.
+
+Closes of every ticker and of a market index are read from one csv
+(date, ticker, close), sampled at period ends (daily, weekly or
+monthly) and turned into returns. Betas of all tickers are OLS slopes
+of their returns on market returns over a rolling window, computed at
+once from rolling sums of the return panel:
+    beta = cov(r, m) / var(m)
+Tables of betas and last closes as of a date are cached by window,
+frequency and date, so CostOfCapital reads the equity beta of a ticker
+without requesting its summary page.
+
+python -m evkit.beta --window 104 --frequency W --date 2020-06-30
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import warnings
+
+import numpy as np
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "path": {
+        # csv of quotes with columns date (yyyy-mm-dd), ticker, close
+        "prices": "data/prices.csv",
+        "cache": "data/betas/",
+    },
+    "market": "^GSPC",  # ticker of the market index in the price file
+    "frequency": "W",  # D, W or M returns
+    "window": 104,  # periods of returns in a regression
+    "minPeriods": 52,
+    "table": None,  # npz of betas read by lookup, set by compute
+}
+
+# the table of lookup in pool workers, spawned ones do not share CONFIG
+TABLE_VARIABLE = "EVKIT_BETA_TABLE"
+
+# pandas periods of return frequencies, None for daily closes
+PERIODS = {"D": None, "W": "W", "M": "M"}
+
+# tables read by lookup in this process, path -> {ticker: (beta, close)}
+TABLES = {}
+
+
+# -------------------- Helper Functions --------------------
+def rolling_beta(returns, market, window, min_periods=2):
+    """ Rolling OLS beta of panel returns on market returns """
+    valid = ~np.isnan(returns) & ~np.isnan(market)[:, np.newaxis]
+    x = np.where(valid, market[:, np.newaxis], 0)
+    y = np.where(valid, returns, 0)
+
+    def rolling_sum(values):
+        total = np.cumsum(values, axis=0)
+        total[window:] = total[window:] - total[:-window]
+        return total
+
+    n = rolling_sum(valid.astype(float))
+    sx, sy = rolling_sum(x), rolling_sum(y)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = rolling_sum(x * y) - sx * sy / n
+        var = rolling_sum(x * x) - sx * sx / n
+        beta = cov / var
+    beta[n < min_periods] = np.nan
+    return beta
+
+
+def simple_returns(closes):
+    """ Returns of a panel of closes along the time axis, NaN first row """
+    returns = np.full_like(closes, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = closes[1:] / closes[:-1] - 1
+    returns[~np.isfinite(returns)] = np.nan
+    return returns
+
+
+def fingerprint(path):
+    """ Size and modification time of a file, changes on every write """
+    stat = os.stat(path)
+    return [os.path.abspath(path), stat.st_size, stat.st_mtime_ns]
+
+
+# -------------------- Beta Engine --------------------
+class BetaEngine:
+    """
+    Class for rolling betas of a universe from a local price file.
+    """
+
+    def __init__(self,
+                 path=None,
+                 market=None,
+                 window=None,
+                 frequency=None,
+                 min_periods=None):
+        self.verbose = CONFIG["verbose"]
+        self.path = path or CONFIG["path"]["prices"]
+        self.cache = CONFIG["path"]["cache"]
+        self.market = market or CONFIG["market"]
+        self.window = window or CONFIG["window"]
+        self.frequency = frequency or CONFIG["frequency"]
+        self.minPeriods = min_periods or CONFIG["minPeriods"]
+        if self.frequency not in PERIODS:
+            raise ValueError(f"Unknown frequency {self.frequency}")
+        self.closes = None  # DataFrame of period-end closes, date x ticker
+
+    def load_prices(self):
+        """ Period-end closes of every ticker, dates ascending """
+        import pandas as pd
+
+        prices = pd.read_csv(self.path, usecols=["date", "ticker", "close"])
+        prices["date"] = pd.to_datetime(prices["date"])
+        closes = prices.pivot_table(index="date",
+                                    columns="ticker",
+                                    values="close",
+                                    aggfunc="last").sort_index()
+        period = PERIODS[self.frequency]
+        if period is not None:
+            # last close of every period, labelled with its date
+            groups = closes.index.to_period(period)
+            dates = closes.index.to_series().groupby(groups).max()
+            closes = closes.groupby(groups).last()
+            closes.index = pd.DatetimeIndex(dates.to_numpy())
+        self.closes = closes
+        return self.closes
+
+    def history(self, date=None):
+        """
+        Tickers, dates and the panel of rolling betas up to a date,
+        the market index is left out of the tickers.
+        """
+        if self.closes is None:
+            self.load_prices()
+        closes = self.closes
+        if date is not None:
+            closes = closes.loc[:date]
+        returns = simple_returns(closes.to_numpy(dtype=float))
+        tickers = closes.columns.to_numpy(dtype=str)
+        stocks = tickers != self.market
+        if stocks.all():
+            # no index quotes, equal weighted market of the universe
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                market = np.nanmean(returns, axis=1)
+        else:
+            market = returns[:, ~stocks][:, 0]
+        betas = rolling_beta(returns[:, stocks],
+                             market,
+                             window=self.window,
+                             min_periods=self.minPeriods)
+        return tickers[stocks], closes.index, betas
+
+    def key(self, date=None):
+        """ Cache key of a table of betas as of a date, latest if None """
+        digest = hashlib.md5(
+            json.dumps([
+                fingerprint(self.path), self.market, self.frequency,
+                self.window, self.minPeriods,
+                str(date)
+            ]).encode())
+        return "-".join([
+            f"{self.frequency}{self.window}",
+            str(date or "latest"),
+            digest.hexdigest()[:16]
+        ])
+
+    def compute(self, date=None):
+        """
+        Betas and last closes of every ticker as of a date, read from
+        the cache or computed and cached. The table becomes the one of
+        lookup in this process and in pool workers started after,
+        passed to them in an environment variable.
+        """
+        path = "".join([self.cache, "betas-", self.key(date), ".npz"])
+        if os.path.exists(path):
+            with np.load(path) as cached:
+                table = {field: cached[field] for field in cached.files}
+            if self.verbose:
+                print(f"Loaded {path}")
+        else:
+            tickers, dates, betas = self.history(date)
+            closes = self.closes.loc[:date, tickers].ffill()
+            missing = np.full(len(tickers), np.nan)
+            table = {
+                "ticker": tickers,
+                "beta": betas[-1] if len(dates) else missing,
+                "close": closes.to_numpy(dtype=float)[-1]
+                if len(dates) else missing,
+                "date": np.array(str(dates[-1].date()) if len(dates) else ""),
+            }
+            if not os.path.exists(self.cache):
+                os.makedirs(self.cache)
+            # write under a temporary name, readers never see a partial file
+            temp = path[:-len(".npz")] + ".tmp.npz"
+            np.savez(temp, **table)
+            os.replace(temp, path)
+            if self.verbose:
+                print(f"Cached {path}")
+        CONFIG["table"] = path
+        os.environ[TABLE_VARIABLE] = path
+        TABLES.pop(path, None)
+        return table
+
+
+def load_table(path):
+    """ {ticker: (beta, close)} of a cached table, None for NaN """
+    if path not in TABLES:
+        with np.load(path) as table:
+            values = [[None if np.isnan(v) else float(v) for v in column]
+                      for column in (table["beta"], table["close"])]
+            TABLES[path] = dict(zip(table["ticker"].tolist(),
+                                    zip(*values)))
+    return TABLES[path]
+
+
+def lookup(ticker):
+    """
+    Equity beta and last close of a ticker, (None, None) if it is not
+    in the price history; the latest table is computed on first use.
+    """
+    path = CONFIG["table"] or os.environ.get(TABLE_VARIABLE)
+    if path is None:
+        BetaEngine().compute()
+        path = CONFIG["table"]
+    return load_table(path).get(ticker, (None, None))
+
+
+# -------------------- Command Line --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Rolling regression betas from a local price history.')
+    parser.add_argument('--prices', default=CONFIG['path']['prices'])
+    parser.add_argument('--market',
+                        default=CONFIG['market'],
+                        help='ticker of the market index')
+    parser.add_argument('--window',
+                        type=int,
+                        default=CONFIG['window'],
+                        help='periods of returns in a regression')
+    parser.add_argument('--frequency',
+                        choices=sorted(PERIODS),
+                        default=CONFIG['frequency'])
+    parser.add_argument('--min-periods',
+                        type=int,
+                        default=CONFIG['minPeriods'])
+    parser.add_argument('--date', help='as of date, yyyy-mm-dd')
+    parser.add_argument('--output', help='csv file, stdout by default')
+    args = parser.parse_args(argv)
+
+    import pandas as pd
+
+    engine = BetaEngine(path=args.prices,
+                        market=args.market,
+                        window=args.window,
+                        frequency=args.frequency,
+                        min_periods=args.min_periods)
+    table = engine.compute(args.date)
+    frame = pd.DataFrame({
+        "ticker": table["ticker"],
+        "beta": table["beta"],
+        "close": table["close"],
+    })
+    text = frame.to_csv(args.output, index=False)
+    if text is not None:
+        print(text, end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,7 +21,8 @@
 #  SOFTWARE.
 """
 Algorithm
-1/ get equity_beta, rf, mrp from sources
+1/ get equity_beta, rf, mrp from sources, or equity_beta from
+   a local price history (evkit.beta)
 2/ get empirical rd from mean(interest / total debt)
 3/ get debt_beta from the reverse CAPM of rd
 4/ unlever equity beta by βu = (βL + βd*(1-tax)*D/E) / (1 + (1-tax)*D/E)
@@ -31,7 +32,7 @@ Algorithm
 
 import numpy as np
 
-from evkit import utils
+from evkit import beta, metrics, utils
 
 
 class CostOfCapital:
@@ -56,12 +57,19 @@ class CostOfCapital:
         self.wacc = None
         self.num_shares = None  # number of shares outstanding
 
-    def get_shares_outstanding(self):
-        statistics_html = utils.get_html(ticker=self.ticker,
-                                         url_id=self.statistics_url_id,
-                                         show_page=False)
+    @metrics.timed('capital_seconds', step='shares_outstanding')
+    def get_shares_outstanding(self, statistics_html=None, release=False):
+        # open key statistics page, unless provided
+        fetched = statistics_html is None
+        if fetched:
+            statistics_html = utils.get_html(ticker=self.ticker,
+                                             url_id=self.statistics_url_id,
+                                             show_page=False)
         num_shares = utils.get_shares_num(
             html_page=statistics_html, value_index=self.shares_outstanding_id)
+        if release and fetched:
+            # free the page fetched here, a provided page is of the caller
+            utils.release_page(statistics_html)
         return num_shares
 
     def capm(self, beta, rate=None):
@@ -73,20 +81,32 @@ class CostOfCapital:
             value = (rate - self.rf) / self.mrp
         return value
 
-    def get_stock_summary(self):
-        # open summary page
-        summary_html = utils.get_html(ticker=self.ticker,
-                                      url_id=self.summary_url_id,
-                                      YahooFinance=True,
-                                      show_page=False)
+    @metrics.timed('capital_seconds', step='stock_summary')
+    def get_stock_summary(self, summary_html=None, release=False):
+        # open summary page, unless provided
+        fetched = summary_html is None
+        if fetched:
+            summary_html = utils.get_html(ticker=self.ticker,
+                                          url_id=self.summary_url_id,
+                                          YahooFinance=True,
+                                          show_page=False)
         # get equity beta
         self.equity_beta = utils.get_value(html_page=summary_html,
                                            value_index=self.beta_id)
         # get previous close price
         self.mkt_price = utils.get_value(html_page=summary_html,
                                          value_index=self.mkt_price_id)
+        if release and fetched:
+            utils.release_page(summary_html)
         return self.equity_beta, self.mkt_price
 
+    @metrics.timed('capital_seconds', step='local_summary')
+    def get_local_summary(self):
+        # regression beta and last close of a local price history
+        self.equity_beta, self.mkt_price = beta.lookup(self.ticker)
+        return self.equity_beta, self.mkt_price
+
+    @metrics.timed('capital_seconds', step='cost_of_debt')
     def get_cost_of_debt(self, debt, interest):
         # cost of debt
         if 0 in debt:
@@ -114,6 +134,7 @@ class CostOfCapital:
         self.re = self.capm(beta=self.asset_beta, rate=None)
         return self.re
 
+    @metrics.timed('capital_seconds', step='wacc')
     def get_wacc(self, debt, assets, tax_rate):
         debt = debt[3]
         assets = assets[3]
@@ -0,0 +1,198 @@
+"""
+Array-backed panel of SEC facts by company and tag.
+
+Facts are sorted by (cik, tag, ddate, qtrs) into contiguous columns,
+with two levels of offsets in compressed sparse row layout:
+1/ companyOffsets: range of series of every company (sorted cik)
+2/ seriesOffsets: range of facts of every (company, tag) series
+so the history of a company and tag is a slice of the columns, found
+with a dict lookup of the company and a bisect over its tags.
+Columns are saved as .npy files of a directory and memory-mapped on
+load; batch loops over companies read contiguous memory.
+"""
+
+import os
+
+import numpy as np
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "path": "data/sec_panel/",
+    # units of repeated facts kept first, e.g. USD over a foreign currency
+    # of a restated comparative, then the latest filed
+    "units": ["USD", "shares", "pure"],
+}
+
+# fact columns, one value per fact
+COLUMNS = {
+    "ddate": np.int32,
+    "qtrs": np.int8,
+    "value": np.float64,
+    "filed": np.int32,
+}
+# offsets and vocabularies
+INDEX = ("cik", "companyOffsets", "tag", "seriesTag", "seriesOffsets")
+
+
+# -------------------- Fact Panel --------------------
+class FactPanel:
+    """
+    Class for O(1) slices of company and tag series of SEC facts.
+    """
+
+    def __init__(self, arrays):
+        self.verbose = CONFIG["verbose"]
+        self.arrays = arrays
+        for key in (*INDEX, *COLUMNS):
+            setattr(self, key, arrays[key])
+        self.companies = {cik: i for i, cik in enumerate(self.cik.tolist())}
+        self.tags = {tag: i for i, tag in enumerate(self.tag.tolist())}
+
+    def __len__(self):
+        return len(self.value)
+
+    # -------------------- Builders --------------------
+    @classmethod
+    def from_frame(cls, facts, key="tag"):
+        """
+        Panel of a frame of facts with cik, key, ddate, qtrs, value and
+        filed columns, e.g. statement_facts with key="field".
+        The latest filed value of repeated facts is kept, of the most
+        preferred unit if the frame has a uom column.
+        """
+        facts = facts.dropna(subset=["cik", key, "ddate", "value"])
+        tag = np.unique(facts[key].to_numpy(dtype=str))
+        tagCode = np.searchsorted(tag, facts[key].to_numpy(dtype=str))
+        cik = facts["cik"].to_numpy(dtype=np.int64)
+        columns = {
+            column: facts[column].fillna(0).to_numpy(dtype=dtype)
+            if column in facts.columns else np.zeros(len(facts), dtype)
+            for column, dtype in COLUMNS.items()
+        }
+        columns["value"] = facts["value"].to_numpy(dtype=np.float64)
+        # higher for preferred units, the last fact of a key is kept
+        units = CONFIG["units"]
+        unitRank = np.zeros(len(facts), dtype=np.int64)
+        if "uom" in facts.columns:
+            uom = facts["uom"].to_numpy()
+            for rank, unit in enumerate(units):
+                unitRank[uom == unit] = len(units) - rank
+
+        order = np.lexsort((columns["filed"], unitRank, columns["qtrs"],
+                            columns["ddate"], tagCode, cik))
+        cik, tagCode = cik[order], tagCode[order]
+        columns = {column: values[order] for column, values in columns.items()}
+
+        # last filed of the preferred unit of every (cik, tag, ddate, qtrs)
+        last = np.ones(len(cik), dtype=bool)
+        last[:-1] = ((cik[:-1] != cik[1:]) | (tagCode[:-1] != tagCode[1:]) |
+                     (columns["ddate"][:-1] != columns["ddate"][1:]) |
+                     (columns["qtrs"][:-1] != columns["qtrs"][1:]))
+        cik, tagCode = cik[last], tagCode[last]
+        columns = {column: values[last] for column, values in columns.items()}
+
+        # series start where company or tag changes
+        starts = np.ones(len(cik), dtype=bool)
+        starts[1:] = (cik[1:] != cik[:-1]) | (tagCode[1:] != tagCode[:-1])
+        starts = np.flatnonzero(starts)
+        seriesCik = cik[starts]
+        ciks = np.unique(seriesCik)
+        return cls({
+            "cik": ciks,
+            "companyOffsets": np.append(np.searchsorted(seriesCik, ciks),
+                                        len(starts)).astype(np.int64),
+            "tag": tag,
+            "seriesTag": tagCode[starts].astype(np.int32),
+            "seriesOffsets": np.append(starts, len(cik)).astype(np.int64),
+            **columns,
+        })
+
+    @classmethod
+    def from_facts(cls, finData, index, tags=None):
+        """ Panel of SEC financial data (num.txt) and filings index """
+        facts = finData if "adsh" in finData.columns else \
+            finData.reset_index()
+        if tags is not None:
+            facts = facts[facts["tag"].isin(tags)]
+        if "coreg" in facts.columns:
+            # consolidated entity only
+            facts = facts[facts["coreg"].isna()]
+        columns = ["adsh", "tag", "ddate", "qtrs", "uom", "value"]
+        facts = facts[[c for c in columns if c in facts.columns]]
+        facts = facts.join(index[["cik", "filed"]], on="adsh")
+        return cls.from_frame(facts)
+
+    # -------------------- Persistence --------------------
+    def save(self, path=None):
+        """ Write every array to <path>/<name>.npy """
+        path = os.path.join(path or CONFIG["path"], "")
+        if not os.path.exists(path):
+            os.makedirs(path)
+        for key in (*INDEX, *COLUMNS):
+            np.save(path + key + ".npy", np.asarray(self.arrays[key]))
+        if self.verbose:
+            print(f"Fact panel of {len(self)} facts saved to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path=None, mmap=True):
+        """ Panel of a directory, fact columns memory-mapped """
+        path = os.path.join(path or CONFIG["path"], "")
+        mode = "r" if mmap else None
+        return cls({
+            key: np.load(path + key + ".npy", mmap_mode=mode)
+            for key in (*INDEX, *COLUMNS)
+        })
+
+    # -------------------- Slices --------------------
+    def company(self, cik):
+        """ Slice of series of a company, empty if unknown """
+        i = self.companies.get(int(cik))
+        if i is None:
+            return slice(0, 0)
+        return slice(int(self.companyOffsets[i]),
+                     int(self.companyOffsets[i + 1]))
+
+    def rows(self, cik, tag):
+        """ Slice of facts of a company and tag, empty if unknown """
+        series = self.company(cik)
+        code = self.tags.get(tag)
+        if code is None or series.start == series.stop:
+            return slice(0, 0)
+        tags = self.seriesTag[series]
+        j = int(np.searchsorted(tags, code))
+        if j == len(tags) or tags[j] != code:
+            return slice(0, 0)
+        j += series.start
+        return slice(int(self.seriesOffsets[j]),
+                     int(self.seriesOffsets[j + 1]))
+
+    def series(self, cik, tag, qtrs=None):
+        """
+        Period ends and values of a company and tag, oldest first;
+        views of the panel unless filtered by duration (qtrs).
+        """
+        rows = self.rows(cik, tag)
+        ddate, value = self.ddate[rows], self.value[rows]
+        if qtrs is not None:
+            mask = self.qtrs[rows] == qtrs
+            ddate, value = ddate[mask], value[mask]
+        return ddate, value
+
+    def company_tags(self, cik):
+        """ Tags reported by a company """
+        return self.tag[self.seriesTag[self.company(cik)]].tolist()
+
+    def latest(self, ciks, tag, qtrs=None, periods=1):
+        """
+        Latest values of a tag of many companies, shape
+        (companies, periods), oldest first, missing values as nan.
+        """
+        values = np.full((len(ciks), periods), np.nan)
+        for i, cik in enumerate(ciks):
+            _, value = self.series(cik, tag, qtrs)
+            value = value[-periods:]
+            if len(value):
+                values[i, periods - len(value):] = value
+        return values
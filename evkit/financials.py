@@ -32,12 +32,14 @@ Algorithm
 
 import numpy as np
 
-from evkit import utils
+from evkit import metrics, utils
 
 
 class IncomeStatement:
     # unique ID of YahooFinance url
     fin_statement_url_id = '/financials?p='  # Income statement
+    # elements of pro-forma statement
+    elements = ('revenue', 'ebit', 'interest', 'tax')
     # positional index of values in html
     revenue_id = 6
     ebit_id = 47
@@ -93,11 +95,19 @@ class IncomeStatement:
             elements_list = np.append(elements_list, element_t)
         return elements_list
 
-    def get_html_data(self):
-        self.html = utils.get_html(ticker=self.ticker,
-                                   url_id=self.fin_statement_url_id,
-                                   YahooFinance=True,
-                                   show_page=False)
+    def get_html_data(self, html=None):
+        # parsed page of the statement, fetched if not provided
+        if html is None:
+            html = utils.get_html(ticker=self.ticker,
+                                  url_id=self.fin_statement_url_id,
+                                  YahooFinance=True,
+                                  show_page=False)
+        self.html = html
+
+    def release_html(self):
+        # keep decoded arrays only, free the parsed page
+        utils.release_page(self.html)
+        self.html = None
 
     def get_tax_rate(self):
         actual_tax = self.tax[:4]
@@ -121,6 +131,7 @@ class IncomeStatement:
             ratio = 0
         return ratio
 
+    @metrics.timed('statement_actual_seconds', statement='income')
     def actual_statement(self):
         """
         Write actual data to pro-forma statement
@@ -138,6 +149,20 @@ class IncomeStatement:
         # tax
         self.tax = self.get_actual(html=self.html, element_id=self.tax_id)
 
+    def set_actual(self, data):
+        """
+        Write actual data from a panel of statement values,
+        e.g. ttm.statement_data of SEC financial data
+        """
+        for element in self.elements:
+            element_list = np.array(data.get(element, np.zeros(4)),
+                                    dtype=float)
+            # missing values break the series, as in get_actual
+            if np.isnan(element_list).any():
+                element_list = np.zeros(4)
+            setattr(self, element, element_list)
+
+    @metrics.timed('statement_forecast_seconds', statement='income')
     def forecast_statement(self, st_growth, periods=3):
         # forecast elements
         # ebit
@@ -151,6 +176,8 @@ class IncomeStatement:
 class BalanceSheet(IncomeStatement):
     # unique ID of YahooFinance url
     fin_statement_url_id = '/balance-sheet?p='
+    elements = ('cash', 'current_assets', 'total_assets',
+                'current_liabilities', 'st_debt', 'lt_debt', 'equity')
     # positional index of values in html
     cash_id = 7
     current_assets_id = 32
@@ -172,6 +199,7 @@ class BalanceSheet(IncomeStatement):
         self.equity = np.zeros(4)
         self.nwc = np.zeros(4)
 
+    @metrics.timed('statement_actual_seconds', statement='balance')
     def actual_statement(self):
         """
         Write actual data to pro-forma statement
@@ -200,6 +228,11 @@ class BalanceSheet(IncomeStatement):
         # total debt
         self.total_debt = self.st_debt + self.lt_debt
 
+    def set_actual(self, data):
+        super().set_actual(data)
+        # total debt
+        self.total_debt = self.st_debt + self.lt_debt
+
     def get_nwc(self):
         # net working capital
         wc = self.current_assets - self.current_liabilities
@@ -208,6 +241,7 @@ class BalanceSheet(IncomeStatement):
         self.nwc = np.array(nwc)
         return self.nwc
 
+    @metrics.timed('statement_forecast_seconds', statement='balance')
     def forecast_statement(self, st_growth, periods=3):
         # forecast elements
         self.current_assets = self.get_projections(
@@ -226,6 +260,7 @@ class BalanceSheet(IncomeStatement):
 class CashFlowStatement(IncomeStatement):
     # unique ID of YahooFinance url
     fin_statement_url_id = '/cash-flow?p='
+    elements = ('depreciation', 'capex')
     # positional index of values in html
     depreciation_id = 12
     capex_id = 48
@@ -235,6 +270,7 @@ class CashFlowStatement(IncomeStatement):
         self.depreciation = np.zeros(4)
         self.capex = np.zeros(4)
 
+    @metrics.timed('statement_actual_seconds', statement='cash_flow')
     def actual_statement(self):
         """
         Write actual data to pro-forma statement
@@ -247,6 +283,7 @@ class CashFlowStatement(IncomeStatement):
         # NOTE: negative values
         self.capex = self.get_actual(html=self.html, element_id=self.capex_id)
 
+    @metrics.timed('statement_forecast_seconds', statement='cash_flow')
     def forecast_statement(self, st_growth, periods=3):
         # forecast elements
         # dna_growth = self.get_st_growth(self.depreciation)
@@ -263,6 +300,7 @@ class CashFlowStatement(IncomeStatement):
         )
 
 
+@metrics.timed('dcf_seconds')
 def dcf(ebit, dna, nwc, capex, tax_rate, lt_growth, wacc, dt):
     # FCF = EBIT(1 - tax) + DnA - NWC - CAPEX
     capex = -capex  # adjust negative value
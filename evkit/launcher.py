@@ -20,146 +20,276 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+"""
+Command line entry point of the batch DCF-WACC valuation.
+
+python -m evkit.launcher large_cap --workers 8 --output ./reports/
+python -m evkit.launcher large_cap --pipeline --fetch-workers 16
+python -m evkit.launcher mega_cap large_cap technology
+python -m evkit.launcher all
+python -m evkit.launcher large_cap --betas prices --prices data/prices.csv
+python -m evkit.launcher all --shard 0/4 --run-id all-20200601
+python -m evkit.launcher all --merge 4 --run-id all-20200601
+python -m evkit.launcher large_cap --yahoo-url http://127.0.0.1:8000/
+Without a universe, the stock pool is selected interactively; several
+universes are valued as their union with a report per universe.
+"""
+
+import argparse
+import contextlib
+import os
 import warnings
-from datetime import datetime
 
 import pandas as pd
 
-from evkit import capital, financials, utils
-
-warnings.filterwarnings('ignore')
-
-# Assumptions
-forecast_horizon = 5
-
-# get tickers pool url
-tickers_key, tickers_urls = utils.get_tickers_url()
-# extract list of stocks, write to file
-tickers_df = utils.get_tickers(tickers_urls)
-# extract risk-free rate, market return, market risk premium
-rf, mrp = utils.get_rf_mrp()
-# select data to be written to report
-results_dict = {
-    'beta_equity': [],
-    'beta_asset': [],
-    'beta_debt': [],
-    're': [],
-    'rd': [],
-    'wacc': [],
-    'enterprise_value, $B': [],
-    'equity_value, $B': [],
-    'stock_price': [],
-    'mkt_stock_price': []
-}
-# select tickers sample
-ticker_collection = tickers_df.ticker[:]
-sample_size = len(ticker_collection)
-try:
-    for num, ticker in enumerate(ticker_collection):
-        print(f'\n{num + 1}/{sample_size} Processing {ticker}', end=' ')
-        # create instances of pro-forma financial statements and Cost of Capital
-        fin_is = financials.IncomeStatement(ticker)
-        fin_bs = financials.BalanceSheet(ticker)
-        fin_cf = financials.CashFlowStatement(ticker)
-        cap = capital.CostOfCapital(ticker=ticker, rf=rf, mrp=mrp)
-        # Web data extraction
-        # extract beta of equity (levered beta)
-        beta_eq, mkt_price = cap.get_stock_summary()
-        # extract shares outstanding
-        num_shares = cap.get_shares_outstanding()
-        # extract previous close
-        # [TBD]
-
-        # web data integrity check
-        collection = [beta_eq, mkt_price, num_shares]
-        if None in collection:
-            print('-> Missing trading information', end='')
-            for key in results_dict.keys():
-                results_dict[key].append(None)
-            continue
-        # extract financial reports
-        fin_is.get_html_data()
-        fin_bs.get_html_data()
-        fin_cf.get_html_data()
-        # populate fin statements with actual data
-        fin_is.actual_statement()
-        fin_bs.actual_statement()
-        fin_cf.actual_statement()
-        # get effective tax rate
-        tax_rate = fin_is.get_tax_rate()
-
-        # Cost of Capital
-        # get cost of debt
-        rd = cap.get_cost_of_debt(debt=fin_bs.total_debt,
-                                  interest=fin_is.interest)
-        # get debt beta
-        beta_debt = cap.get_debt_beta()
-        # get asset beta
-        beta_asset = cap.get_asset_beta(debt=fin_bs.lt_debt,
-                                        equity=fin_bs.equity,
-                                        tax_rate=tax_rate)
-        # get cost of equity
-        re = cap.get_cost_of_equity()
-        # get WACC
-        wacc = cap.get_wacc(debt=fin_bs.lt_debt,
-                            assets=fin_bs.total_assets,
-                            tax_rate=tax_rate)
-        # get discount factors
-        dt = capital.discount_factors(wacc=wacc, periods=forecast_horizon)
-
-        # DCF
-        # implement industry-specific estimates for LT growth rate
-        lt_growth = wacc * 0.5
-        # get ST growth rate from revenue
-        st_growth = fin_is.get_st_growth(fin_is.revenue)
-        # make financial projections
-        fin_is.forecast_statement(st_growth=st_growth,
-                                  periods=forecast_horizon)
-        fin_bs.forecast_statement(st_growth=st_growth,
-                                  periods=forecast_horizon)
-        fin_cf.forecast_statement(st_growth=st_growth,
-                                  periods=forecast_horizon)
-        # Enterprise value
-        fcf, ev = financials.dcf(ebit=fin_is.ebit,
-                                 dna=fin_cf.depreciation,
-                                 nwc=fin_bs.nwc,
-                                 capex=fin_cf.capex,
-                                 tax_rate=tax_rate,
-                                 lt_growth=lt_growth,
-                                 wacc=wacc,
-                                 dt=dt)
-        # Equity value
-        eq = ev - fin_bs.total_debt[3] + fin_bs.cash[3]
-        # Share price
-        stock_price = max(0, eq / num_shares)
-
-        # store results into dictionary
-        results_dict['beta_equity'].append(beta_eq)
-        results_dict['beta_asset'].append(beta_asset)
-        results_dict['beta_debt'].append(beta_debt)
-        results_dict['re'].append(re)
-        results_dict['rd'].append(rd)
-        results_dict['wacc'].append(wacc)
-        results_dict['enterprise_value, $B'].append(ev / 1_000_000)
-        results_dict['equity_value, $B'].append(eq / 1_000_000)
-        results_dict['stock_price'].append(stock_price)
-        results_dict['mkt_stock_price'].append(mkt_price)
-
-except KeyboardInterrupt:
-    print('\n-> Program interrupted by user', end='')
-    quit()
-finally:
-    # write results to report
-    results_df = pd.DataFrame(results_dict)
-    report_df = pd.concat([tickers_df, results_df], axis=1)
-    # get date as id for report
-    date = datetime.today().strftime('-%Y%m%d')
-    report_id = date.join([tickers_key, ''])
-    utils.results_to_csv(data_df=report_df, report_id=report_id)
+from evkit import (beta, metrics, pipeline, plot, profiling, reports,
+                   runner, shards, utils)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description='DCF-WACC valuation of a universe of stocks.')
+    parser.add_argument(
+        'universe',
+        nargs='*',
+        help='screener keys, e.g. large_cap, or csv files with ticker and '
+        'name columns; all for every screener; selected interactively '
+        'if omitted')
+    parser.add_argument('--horizon',
+                        type=int,
+                        default=runner.CONFIG['assumptions']['horizon'],
+                        help='forecast horizon, years')
+    parser.add_argument('--output',
+                        default=runner.CONFIG['path']['reports'],
+                        help='directory of csv reports')
+    parser.add_argument('--workers',
+                        type=int,
+                        default=runner.CONFIG['workers'],
+                        help='number of parallel workers, 1 runs serially')
+    parser.add_argument('--executor',
+                        choices=sorted(runner.EXECUTORS),
+                        default=runner.CONFIG['executor'],
+                        help='pool of parallel workers')
+    parser.add_argument('--pipeline',
+                        action='store_true',
+                        help='overlap fetch, decode and valuation of '
+                        'tickers in separate stages')
+    parser.add_argument('--fetch-workers',
+                        type=int,
+                        default=pipeline.CONFIG['workers']['fetch'],
+                        help='pipeline threads downloading pages')
+    parser.add_argument('--decode-workers',
+                        type=int,
+                        default=pipeline.CONFIG['workers']['decode'],
+                        help='pipeline threads parsing pages')
+    parser.add_argument('--decode-processes',
+                        type=int,
+                        default=pipeline.CONFIG['decodeProcesses'],
+                        help='parse pages on a pool of processes if > 0')
+    parser.add_argument('--rss-limit',
+                        type=float,
+                        metavar='MB',
+                        help='resident memory ceiling of the run, fetching '
+                        'waits for tickers in flight above it')
+    parser.add_argument('--unordered',
+                        action='store_true',
+                        help='stream results as soon as tickers complete')
+    parser.add_argument('--sink',
+                        help='json lines file streaming results, '
+                        'defaults to <output>/<report id>.jsonl')
+    parser.add_argument('--restart',
+                        action='store_true',
+                        help='discard results of an interrupted run '
+                        'instead of resuming it')
+    parser.add_argument('--store',
+                        metavar='DIR',
+                        help='also add reports to the columnar report store '
+                        'in DIR, partitioned by date and universe')
+    parser.add_argument('--metrics',
+                        action='store_true',
+                        help='record timers and counters of the run, write '
+                        '<report id>.prom and .json to output')
+    parser.add_argument('--profile',
+                        metavar='DIR',
+                        help='write per-stage pstats, collapsed stacks and '
+                        'slowest tickers to DIR; pools run on threads')
+    parser.add_argument('--profile-memory',
+                        action='store_true',
+                        help='with --profile, tracemalloc peaks of stages')
+    parser.add_argument('--plot',
+                        action='store_true',
+                        help='write charts of valuation results to '
+                        '<output>/plots/, one set per universe')
+    parser.add_argument('--betas',
+                        choices=['yahoo', 'prices'],
+                        default=runner.CONFIG['betaSource'],
+                        help='equity betas of summary pages or regression '
+                        'betas of a local price history')
+    parser.add_argument('--prices',
+                        default=beta.CONFIG['path']['prices'],
+                        help='csv of daily closes (date, ticker, close) '
+                        'with --betas prices')
+    parser.add_argument('--shard',
+                        metavar='I/N',
+                        help='value shard I of N of the universe only, '
+                        'e.g. 0/4, into its sink in output; shards run on '
+                        'separate processes or nodes')
+    parser.add_argument('--merge',
+                        type=int,
+                        metavar='N',
+                        help='write reports of the N complete shards of a '
+                        'run, for the universes its shards ran on')
+    parser.add_argument('--cleanup',
+                        action='store_true',
+                        help='with --merge, remove sinks, markers and plan '
+                        'of the shards once merged')
+    parser.add_argument('--run-id',
+                        help='id of a sharded run, the same on every node; '
+                        'dated report id of the universe by default')
+    parser.add_argument('--yahoo-url',
+                        help='base url of YahooFinance pages, e.g. of a '
+                        'python -m evkit.standin server')
+    parser.add_argument('--morningstar-url',
+                        help='base url of Morningstar pages')
+    return parser.parse_args(argv)
+
+
+def get_universe_key(universe=None):
+    """ Key of a screener or csv file, without scraping its tickers """
+    if universe is not None and os.path.isfile(universe):
+        return os.path.splitext(os.path.basename(universe))[0]
+    return utils.get_tickers_url(universe)[0]
+
+
+def get_universe(universe=None):
+    """ Key and DataFrame of tickers of a screener or csv file """
+    if universe is not None and os.path.isfile(universe):
+        tickers_df = pd.read_csv(universe)[['ticker', 'name']]
+        return get_universe_key(universe), tickers_df
+    # get tickers pool url
+    tickers_key, tickers_urls = utils.get_tickers_url(universe)
+    # extract list of stocks
+    return tickers_key, utils.get_tickers(tickers_urls)
+
+
+def main(argv=None):
+    warnings.filterwarnings('ignore')
+    args = parse_args(argv)
+    metrics.enable(args.metrics)
+    utils.set_base_urls(yahoo=args.yahoo_url,
+                        morningstar=args.morningstar_url)
+    runner.CONFIG['memory']['rssLimit'] = args.rss_limit
+    runner.set_beta_source(args.betas)
+    if args.betas == 'prices':
+        # one table of betas, read by every worker
+        beta.BetaEngine(path=args.prices).compute()
+    profiler = contextlib.nullcontext()
+    if args.profile:
+        # profiles cover threads of this process only
+        args.executor = 'thread'
+        args.decode_processes = 0
+        profiler = profiling.Profiler(path=os.path.join(args.profile, ''),
+                                      memory=args.profile_memory)
+
+    if args.universe == ['all']:
+        args.universe = list(utils.SCREENERS)
+    if args.merge:
+        # universes of the run plan, screeners may have changed since
+        universes = None
+        keys = [get_universe_key(universe)
+                for universe in args.universe or [None]]
+    else:
+        universes = dict(get_universe(universe)
+                         for universe in args.universe or [None])
+        keys = list(universes)
+    stream = None
+    if args.pipeline:
+        stream = pipeline.Pipeline(fetch=args.fetch_workers,
+                                   decode=args.decode_workers,
+                                   processes=args.decode_processes).run
+    options = dict(horizon=args.horizon,
+                   output=args.output,
+                   workers=args.workers,
+                   executor=args.executor,
+                   ordered=not args.unordered,
+                   sink_path=args.sink,
+                   resume=not args.restart,
+                   stream=stream,
+                   store=reports.ReportStore(args.store)
+                   if args.store else None)
+    if len(keys) == len(utils.SCREENERS) and len(keys) > 1:
+        report_key = 'all'
+    else:
+        report_key = '+'.join(keys)
+    run_id = args.run_id or runner.get_report_id(report_key)
+    report_dfs = {}
+    metrics_id = None
+    with profiler:
+        if args.shard:
+            shard, count = shards.parse_shard(args.shard)
+            marker = shards.run_shard(runner.union(universes),
+                                      report_key=report_key,
+                                      shard=shard,
+                                      shards=count,
+                                      horizon=args.horizon,
+                                      output=args.output,
+                                      run_id=run_id,
+                                      workers=args.workers,
+                                      executor=args.executor,
+                                      ordered=not args.unordered,
+                                      resume=not args.restart,
+                                      stream=stream,
+                                      universes=universes)
+            # metrics of every node next to its shard sink
+            metrics_id = f'{run_id}.shard-{shard}-of-{count}'
+            tickers = marker['tickers'] if marker else None
+            tickers_key = report_key
+        elif args.merge:
+            report_dfs = shards.merge(None,
+                                      report_key=report_key,
+                                      shards=args.merge,
+                                      output=args.output,
+                                      run_id=run_id,
+                                      store=options['store'])
+            if args.cleanup:
+                shards.cleanup(run_id, args.merge, args.output)
+            report_df = pd.concat(list(
+                report_dfs.values())).drop_duplicates('ticker')
+            tickers_key = report_key
+        elif len(universes) == 1:
+            [(tickers_key, tickers_df)] = universes.items()
+            report_df = runner.run_batch(tickers_df,
+                                         report_key=tickers_key,
+                                         **options)
+            report_dfs = {tickers_key: report_df}
+        else:
+            report_dfs = runner.run_universes(universes,
+                                              report_key=report_key,
+                                              **options)
+            report_df = pd.concat(list(
+                report_dfs.values())).drop_duplicates('ticker')
+            tickers_key = report_key
+    if args.metrics:
+        if metrics_id is None:
+            metrics_id = runner.get_report_id(tickers_key)
+            tickers = len(report_df)
+        metrics.to_prometheus(os.path.join(args.output, metrics_id + '.prom'))
+        metrics.to_json(os.path.join(args.output, metrics_id + '.json'),
+                        universe=tickers_key,
+                        tickers=tickers,
+                        workers=args.workers,
+                        executor=args.executor,
+                        pipeline=args.pipeline)
     # plot results
-    beta_asset = report_df.beta_asset
-    wacc = report_df.wacc
-    dcf = report_df.stock_price
-    mkt_quote = report_df.mkt_stock_price
-    utils.plot_beta_wacc(beta=beta_asset, wacc=wacc)
-    utils.plot_dcf_mkt_price(dcf_price=dcf, mkt_price=mkt_quote)
+    if args.plot:
+        charts = plot.plot_reports(
+            {runner.get_report_id(key): df
+             for key, df in report_dfs.items()},
+            path=os.path.join(args.output, 'plots', ''))
+        for paths in charts.values():
+            for path in paths:
+                print(f'\n-> Chart saved to a file {path}', end='')
+
+
+if __name__ == '__main__':
+    main()
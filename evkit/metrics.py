@@ -0,0 +1,243 @@
+"""
+Instrumentation of valuation runs: timers, counters and histograms.
+
+Hot paths (http, html parsing, statements, cost of capital, DCF, SEC data
+stages) are wrapped with timed; recording is a no-op until enable() is
+called, so a disabled registry costs a dict lookup per call.
+Metrics of a run are exported as a Prometheus text file and a json summary.
+Metrics are collected per process: workers of a process pool drain theirs
+with every result and the parent merges them into its registry.
+"""
+
+import bisect
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "enabled": False,
+    "prefix": "evkit_",
+    "buckets": {
+        "seconds": (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+        "bytes": (1_000, 10_000, 100_000, 250_000, 500_000, 1_000_000,
+                  5_000_000),
+    },
+}
+
+
+# -------------------- Registry --------------------
+class Registry:
+    """
+    Class for thread-safe counters and histograms of a process.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}  # (name, labels) -> value
+        self.histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+
+    @staticmethod
+    def key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    @staticmethod
+    def buckets(name):
+        unit = "bytes" if name.endswith("_bytes") else "seconds"
+        return CONFIG["buckets"][unit]
+
+    def inc(self, name, value=1, **labels):
+        key = self.key(name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        key = self.key(name, labels)
+        buckets = self.buckets(name)
+        with self.lock:
+            if key not in self.histograms:
+                self.histograms[key] = [[0] * (len(buckets) + 1), 0.0, 0]
+            histogram = self.histograms[key]
+            histogram[0][bisect.bisect_left(buckets, value)] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.counters.clear()
+            self.histograms.clear()
+
+    def drain(self):
+        """ Counters and histograms recorded since the last drain """
+        with self.lock:
+            snapshot = self.counters, self.histograms
+            self.counters, self.histograms = {}, {}
+        return snapshot
+
+    def merge(self, snapshot):
+        """ Add counters and histograms drained from another registry """
+        counters, histograms = snapshot
+        with self.lock:
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+            for key, (counts, total, count) in histograms.items():
+                if key not in self.histograms:
+                    self.histograms[key] = [[0] * len(counts), 0.0, 0]
+                histogram = self.histograms[key]
+                for i, value in enumerate(counts):
+                    histogram[0][i] += value
+                histogram[1] += total
+                histogram[2] += count
+
+    def summary(self):
+        """ Totals of every metric, json friendly """
+        with self.lock:
+            counters = dict(self.counters)
+            histograms = {
+                key: (list(counts), total, count)
+                for key, (counts, total, count) in self.histograms.items()
+            }
+        summary = {
+            "started": self.started,
+            "elapsed, s": time.time() - self.started,
+            "counters": [],
+            "histograms": [],
+        }
+        for (name, labels), value in sorted(counters.items()):
+            summary["counters"].append({
+                "name": name,
+                "labels": dict(labels),
+                "value": value
+            })
+        for (name, labels), (counts, total, count) in sorted(
+                histograms.items()):
+            summary["histograms"].append({
+                "name": name,
+                "labels": dict(labels),
+                "count": count,
+                "sum": total,
+                "mean": total / count if count else None,
+                "buckets": dict(zip(map(str, self.buckets(name)), counts)),
+            })
+        return summary
+
+    def prometheus(self):
+        """ Metrics in Prometheus text exposition format """
+        prefix = CONFIG["prefix"]
+        summary = self.summary()
+        lines = []
+        names = set()
+        for metric in summary["counters"]:
+            name = f'{prefix}{metric["name"]}'
+            if name not in names:
+                names.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f'{name}{_labels(metric["labels"])} '
+                         f'{metric["value"]}')
+        for metric in summary["histograms"]:
+            name = f'{prefix}{metric["name"]}'
+            if name not in names:
+                names.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in metric["buckets"].items():
+                cumulative += count
+                labels = _labels(metric["labels"], le=bound)
+                lines.append(f"{name}_bucket{labels} {cumulative}")
+            labels = _labels(metric["labels"], le="+Inf")
+            lines.append(f'{name}_bucket{labels} {metric["count"]}')
+            lines.append(f'{name}_sum{_labels(metric["labels"])} '
+                         f'{metric["sum"]}')
+            lines.append(f'{name}_count{_labels(metric["labels"])} '
+                         f'{metric["count"]}')
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels, **extra):
+    labels = {**labels, **extra}
+    if not labels:
+        return ""
+    pairs = ",".join(f'{key}="{value}"' for key, value in labels.items())
+    return "{" + pairs + "}"
+
+
+REGISTRY = Registry()
+
+
+# -------------------- Recording --------------------
+def enable(enabled=True):
+    CONFIG["enabled"] = enabled
+
+
+def inc(name, value=1, **labels):
+    """ Increase a counter """
+    if CONFIG["enabled"]:
+        REGISTRY.inc(name, value, **labels)
+
+
+def observe(name, value, **labels):
+    """ Record a value to a histogram """
+    if CONFIG["enabled"]:
+        REGISTRY.observe(name, value, **labels)
+
+
+@contextlib.contextmanager
+def timer(name, **labels):
+    """ Record seconds of a block to a histogram """
+    if not CONFIG["enabled"]:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        REGISTRY.observe(name, time.perf_counter() - start, **labels)
+
+
+def timed(name, **labels):
+    """ Decorator recording seconds of every call to a histogram """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not CONFIG["enabled"]:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                REGISTRY.observe(name,
+                                 time.perf_counter() - start, **labels)
+
+        return wrapper
+
+    return decorator
+
+
+# -------------------- Export --------------------
+def to_prometheus(path):
+    """ Write metrics to a Prometheus text file """
+    _makedirs(path)
+    with open(path, "w") as file:
+        file.write(REGISTRY.prometheus())
+    return path
+
+
+def to_json(path, **run):
+    """ Write json summary of a run, run keywords are added as is """
+    _makedirs(path)
+    with open(path, "w") as file:
+        json.dump({"run": run, **REGISTRY.summary()}, file, indent=2)
+    return path
+
+
+def _makedirs(path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
@@ -0,0 +1,355 @@
+"""
+Pipelined valuation of a universe of tickers.
+
+Tickers flow through three stages connected by bounded queues:
+1/ fetch: download YahooFinance pages of a ticker (network)
+2/ decode: parse pages, extract values into pro-forma statements (CPU)
+3/ value: cost of capital, projections and DCF-WACC (numpy)
+Every stage has its own number of workers; a full queue blocks the stage
+in front of it, so fetching never runs ahead of decoding by more than
+the queue size. Network and CPU work of different tickers overlap.
+"""
+
+import concurrent.futures
+import queue
+import threading
+import time
+
+from evkit import (capital, financials, metrics, profiling, runner, utils,
+                   valuation)
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "workers": {
+        "fetch": 16,
+        "decode": 2,
+        "value": 1,
+    },
+    "decodeProcesses": 0,  # parse pages on a process pool if > 0
+    "queueSize": 2,  # queued tickers per worker of the next stage
+    "pollInterval": 0.1,  # seconds between checks of a stopped pipeline
+}
+
+STATEMENTS = (financials.IncomeStatement, financials.BalanceSheet,
+              financials.CashFlowStatement)
+
+# end of stream marker
+STOP = None
+
+
+# -------------------- Stage Functions --------------------
+_local = threading.local()
+
+
+def fetch_ticker(ticker):
+    """ Raw html of trading and statement pages of a ticker """
+    # one keep-alive session per fetch worker
+    if not hasattr(_local, "session"):
+        import requests
+        _local.session = requests.Session()
+    url_ids = [
+        capital.CostOfCapital.summary_url_id,
+        capital.CostOfCapital.statistics_url_id,
+        *[statement.fin_statement_url_id for statement in STATEMENTS]
+    ]
+    if runner.CONFIG["betaSource"] == "prices":
+        # beta and close of the local price history
+        url_ids = url_ids[1:]
+    return {
+        url_id: utils.fetch_page(utils.get_url(ticker, url_id),
+                                 session=_local.session)
+        for url_id in url_ids
+    }
+
+
+def decode_ticker(ticker, pages, rf, mrp):
+    """
+    Pro-forma statements and cost of capital of a ticker from raw pages.
+    Returns valuation results of tickers missing trading information.
+    """
+    cap = capital.CostOfCapital(ticker=ticker, rf=rf, mrp=mrp)
+    parsed = []
+    if cap.summary_url_id in pages:
+        parsed.append(utils.parse_page(pages[cap.summary_url_id]))
+        beta_eq, mkt_price = cap.get_stock_summary(parsed[-1])
+    else:
+        beta_eq, mkt_price = cap.get_local_summary()
+    parsed.append(utils.parse_page(pages[cap.statistics_url_id]))
+    num_shares = cap.get_shares_outstanding(parsed[-1])
+    if runner.CONFIG["memory"]["releasePages"]:
+        for page in parsed:
+            utils.release_page(page)
+    if None in [beta_eq, mkt_price, num_shares]:
+        return dict.fromkeys(valuation.RESULTS)
+
+    statements = []
+    for statement in STATEMENTS:
+        fs = statement(ticker)
+        fs.get_html_data(utils.parse_page(pages[fs.fin_statement_url_id]))
+        fs.actual_statement()
+        # decoded arrays only, page tree is not passed downstream
+        fs.release_html()
+        statements.append(fs)
+    return (*statements, cap, num_shares)
+
+
+def value_ticker(decoded, horizon):
+    """ Valuation results of decoded statements """
+    if isinstance(decoded, dict):
+        # missing trading information
+        return decoded
+    return runner.value_statements(*decoded, horizon=horizon)
+
+
+# -------------------- Pipeline --------------------
+class Stage:
+    """
+    Class for a pool of worker threads between two bounded queues.
+    """
+
+    def __init__(self, name, func, workers, inbox, outbox, stopped):
+        self.name = name
+        self.func = func
+        self.workers = workers
+        self.inbox = inbox
+        self.outbox = outbox
+        self.stopped = stopped
+        self.threads = []
+        self.running = workers
+        self.active = 0  # workers in func
+        self.lock = threading.Lock()
+        self.error = None  # exception that ended a worker
+
+        # throughput stats
+        self.items = 0
+        self.errors = 0
+        self.busy = 0.0  # seconds of work, all workers
+        self.blocked = 0.0  # seconds waiting on a full outbox
+        self.started = None
+        self.finished = None
+
+    def start(self):
+        self.started = time.perf_counter()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self.work,
+                                      name=f"{self.name}-{i}",
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+    def put(self, item, box=None):
+        """ Put item to the outbox, blocking while it is full """
+        box = self.outbox if box is None else box
+        while not self.stopped.is_set():
+            try:
+                box.put(item, timeout=CONFIG["pollInterval"])
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def get(self):
+        """ Next item of the inbox, STOP once the pipeline is stopped """
+        while not self.stopped.is_set():
+            try:
+                return self.inbox.get(timeout=CONFIG["pollInterval"])
+            except queue.Empty:
+                continue
+        return STOP
+
+    def work(self):
+        try:
+            self.process()
+        except Exception as error:
+            # a failure outside of a ticker, e.g. of the outbox
+            with self.lock:
+                self.error = self.error or error
+        finally:
+            # the last worker out passes end of stream downstream
+            with self.lock:
+                self.running -= 1
+                last = self.running == 0
+            if last:
+                self.finished = time.perf_counter()
+                self.put(STOP)
+
+    def process(self):
+        while True:
+            item = self.get()
+            if item is STOP:
+                # end of stream for the sibling workers
+                self.put(STOP, box=self.inbox)
+                break
+            num, ticker, payload, results = item
+            start = time.perf_counter()
+            if results is None:
+                with self.lock:
+                    self.active += 1
+                try:
+                    with profiling.stage(self.name):
+                        payload = self.func(ticker, payload)
+                except Exception as error:
+                    results = dict.fromkeys(valuation.RESULTS) | {
+                        "error": f"{self.name}: {error}"
+                    }
+                    with self.lock:
+                        self.errors += 1
+                finally:
+                    with self.lock:
+                        self.active -= 1
+            done = time.perf_counter()
+            metrics.observe('pipeline_stage_seconds',
+                            done - start,
+                            stage=self.name)
+            if not self.put((num, ticker, payload, results)):
+                break
+            with self.lock:
+                self.items += 1
+                self.busy += done - start
+                self.blocked += time.perf_counter() - done
+
+    def stats(self):
+        elapsed = (self.finished or time.perf_counter()) - self.started
+        return {
+            "stage": self.name,
+            "workers": self.workers,
+            "items": self.items,
+            "errors": self.errors,
+            "elapsed, s": elapsed,
+            "throughput, 1/s": self.items / elapsed if elapsed else 0,
+            "utilization": self.busy / (elapsed * self.workers)
+            if elapsed else 0,
+            "blocked, s": self.blocked,
+        }
+
+
+class Pipeline:
+    """
+    Class for pipelined fetch, decode and valuation of tickers.
+    """
+
+    def __init__(self, fetch=None, decode=None, value=None, processes=None):
+        self.verbose = CONFIG["verbose"]
+        self.workers = {
+            "fetch": fetch or CONFIG["workers"]["fetch"],
+            "decode": decode or CONFIG["workers"]["decode"],
+            "value": value or CONFIG["workers"]["value"],
+        }
+        self.processes = CONFIG["decodeProcesses"] if processes is None \
+            else processes
+        self.stages = []
+
+    def run(self, tickers, rf, mrp, horizon=None, skip=(), **kwargs):
+        """
+        Stream (position, ticker, results) of a universe of tickers,
+        in order of completion; a drop-in stream of runner.run_batch.
+        """
+        horizon = horizon or runner.CONFIG["assumptions"]["horizon"]
+        stopped = threading.Event()
+        pool = None
+        meter = metrics.CONFIG["enabled"]
+        if self.processes:
+            pool = concurrent.futures.ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=runner.init_worker,
+                initargs=(meter, ))
+
+        def decode(ticker, pages):
+            if pool is None:
+                return decode_ticker(ticker, pages, rf, mrp)
+            if meter:
+                return runner.unmetered(
+                    pool.submit(runner.metered, decode_ticker, ticker, pages,
+                                rf, mrp).result())
+            return pool.submit(decode_ticker, ticker, pages, rf,
+                               mrp).result()
+
+        def fetch(ticker, _):
+            # backpressure on fetching above the RSS limit,
+            # while tickers downstream may still free memory
+            runner.wait_for_memory(
+                busy=lambda: any(q.qsize() for q in queues[1:]) or any(
+                    stage.active for stage in self.stages[1:]),
+                stopped=stopped)
+            return fetch_ticker(ticker)
+
+        funcs = {
+            "fetch": fetch,
+            "decode": decode,
+            "value": lambda ticker, decoded: value_ticker(decoded, horizon),
+        }
+        queues = [
+            queue.Queue(maxsize=CONFIG["queueSize"] * self.workers[name])
+            for name in funcs
+        ]
+        queues.append(queue.Queue(maxsize=CONFIG["queueSize"]))
+        self.stages = [
+            Stage(name, func, self.workers[name], queues[i], queues[i + 1],
+                  stopped) for i, (name, func) in enumerate(funcs.items())
+        ]
+
+        errors = []
+
+        def feed():
+            # fetch input, blocks while the fetch queue is full
+            try:
+                for num, ticker in enumerate(tickers):
+                    if ticker in skip:
+                        continue
+                    if not self.stages[0].put((num, ticker, None, None),
+                                              box=queues[0]):
+                        return
+            except Exception as error:
+                errors.append(error)
+            self.stages[0].put(STOP, box=queues[0])
+
+        def check(finished=False):
+            # re-raise a failure of a stage instead of waiting forever
+            failed = errors + [
+                stage.error for stage in self.stages if stage.error
+            ]
+            if failed:
+                raise failed[0]
+            if not finished and not any(thread.is_alive()
+                                        for stage in self.stages
+                                        for thread in stage.threads):
+                raise RuntimeError("Pipeline stages exited before "
+                                   "the end of stream")
+
+        runner.init_worker()
+        for stage in self.stages:
+            stage.start()
+        threading.Thread(target=feed, name="feed", daemon=True).start()
+
+        try:
+            while True:
+                try:
+                    item = queues[-1].get(timeout=CONFIG["pollInterval"])
+                except queue.Empty:
+                    check()
+                    continue
+                if item is STOP:
+                    check(finished=True)
+                    break
+                num, ticker, payload, results = item
+                yield num, ticker, payload if results is None else results
+        finally:
+            stopped.set()
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+            if self.verbose:
+                self.report()
+
+    def stats(self):
+        """ Throughput stats of every stage """
+        return [stage.stats() for stage in self.stages]
+
+    def report(self):
+        print("\nPipeline stats:")
+        for stats in self.stats():
+            print(f"{stats['stage']:>6s}: {stats['workers']} workers, "
+                  f"{stats['items']} items, "
+                  f"{stats['throughput, 1/s']:.2f} items/s, "
+                  f"utilization {stats['utilization']:.0%}, "
+                  f"blocked {stats['blocked, s']:.1f} s")
@@ -1,55 +1,171 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-
-
-def plot_beta_wacc(beta, wacc):
-    plt.style.use('ggplot')
-    plt.figure(figsize=(10, 5))
-    n = len(wacc)
-    plt.scatter(x=beta_asset,
-                y=wacc,
-                edgecolor='black',
-                linewidth=1,
-                alpha=0.75)
-    plt.title('Asset beta - WACC \nN = ' + str(n))
-    plt.xlabel('Asset beta')
-    plt.ylabel('WACC')
-    plt.tight_layout()
-    plt.show()
-
-
-def plot_dcf_mkt_price(dcf_price, mkt_price):
-    plt.style.use('seaborn')
-    plt.figure(figsize=(10, 5))
-    n = len(dcf_price)
-    # plt.plot(
-    #     dcf_price,
-    #     linewidth=1,
-    # )
-    # plt.plot(
-    #     mkt_price,
-    #     linewidth=1,
-    #     alpha=0.75
-    # )
-    plt.scatter(x=mkt_price, y=dcf_price / mkt_price, linewidth=1, alpha=0.75)
-    plt.xscale('log')
-    # plt.yscale('log')
-    plt.title('DCF-WACC stock price to market quote \nN = ' + str(n))
-    plt.xlabel('DCF-WACC / Market quote')
-    plt.ylabel('Market quote')
-    plt.tight_layout()
-    plt.show()
-
-
-file_name = 'healthcare-20190616.csv'
-path_csv = '../reports/' + file_name
-
-data = pd.read_csv(path_csv)
-beta_asset = data['beta_asset']
-wacc = data['wacc']
-mkt_price = data.mkt_stock_price
-dcf_price = data.stock_price
-ratio = dcf_price / mkt_price
-
-plot_beta_wacc(beta=beta_asset, wacc=wacc)
-plot_dcf_mkt_price(dcf_price, mkt_price)
+"""
+Headless charts of valuation reports.
+
+Charts are drawn on the Agg canvas and written to files, no display or
+pyplot state is involved, so rendering runs on servers and in parallel
+processes. Universes larger than CONFIG["hexbinAbove"] are drawn as
+hexbin density with log counts instead of one marker per ticker;
+smaller ones as rasterized scatter, so vector formats stay light.
+
+python -m evkit.plot reports/healthcare-20190616.csv --output ./plots/
+"""
+
+import argparse
+import concurrent.futures
+import os
+
+import numpy as np
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "path": "./reports/plots/",
+    "format": "png",
+    "figsize": (10, 5),
+    "dpi": 100,
+    "hexbinAbove": 5_000,  # points drawn as density above
+    "gridsize": 80,  # hexagons across the x axis
+    "workers": os.cpu_count(),
+}
+
+
+# -------------------- Helper Functions --------------------
+def finite(*columns, positive=()):
+    """ Columns as float arrays, rows with missing values dropped """
+    columns = [np.asarray(column, dtype=float) for column in columns]
+    mask = np.logical_and.reduce([np.isfinite(column) for column in columns])
+    for i in positive:
+        mask &= columns[i] > 0
+    return [column[mask] for column in columns]
+
+
+def new_axes(title, xlabel, ylabel):
+    from matplotlib.figure import Figure
+    figure = Figure(figsize=CONFIG["figsize"], dpi=CONFIG["dpi"])
+    axes = figure.add_subplot()
+    axes.set_title(title)
+    axes.set_xlabel(xlabel)
+    axes.set_ylabel(ylabel)
+    axes.grid(True, alpha=0.3)
+    return figure, axes
+
+
+def draw_points(figure, axes, x, y, xscale="linear"):
+    """ Scatter for small universes, hexbin density for large ones """
+    if len(x) > CONFIG["hexbinAbove"]:
+        cells = axes.hexbin(x,
+                            y,
+                            gridsize=CONFIG["gridsize"],
+                            bins="log",
+                            mincnt=1,
+                            xscale=xscale,
+                            cmap="viridis")
+        figure.colorbar(cells, ax=axes, label="tickers, log")
+    else:
+        axes.scatter(x,
+                     y,
+                     s=16,
+                     edgecolor="black",
+                     linewidth=0.5,
+                     alpha=0.75,
+                     rasterized=True)
+        axes.set_xscale(xscale)
+
+
+def save(figure, path):
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    figure.tight_layout()
+    figure.savefig(path)
+    return path
+
+
+def chart_path(name, path=None):
+    path = path or CONFIG["path"]
+    return os.path.join(path, f"{name}.{CONFIG['format']}")
+
+
+# -------------------- Charts --------------------
+def beta_wacc(beta, wacc, path, title=""):
+    """ Asset beta against WACC, written to path """
+    beta, wacc = finite(beta, wacc)
+    figure, axes = new_axes(f"{title}\nAsset beta - WACC, N = {len(wacc)}",
+                            "Asset beta", "WACC")
+    draw_points(figure, axes, beta, wacc)
+    return save(figure, path)
+
+
+def dcf_mkt_price(dcf_price, mkt_price, path, title=""):
+    """ DCF-WACC price to market quote against market quote """
+    dcf_price, mkt_price = finite(dcf_price, mkt_price, positive=(1, ))
+    figure, axes = new_axes(
+        f"{title}\nDCF-WACC stock price to market quote, "
+        f"N = {len(dcf_price)}", "Market quote", "DCF-WACC / Market quote")
+    draw_points(figure, axes, mkt_price, dcf_price / mkt_price, xscale="log")
+    return save(figure, path)
+
+
+def plot_report(report_df, report_id, path=None):
+    """ Charts of a valuation report, returns paths of written files """
+    return [
+        beta_wacc(report_df["beta_asset"],
+                  report_df["wacc"],
+                  path=chart_path(f"{report_id}-beta_wacc", path),
+                  title=report_id),
+        dcf_mkt_price(report_df["stock_price"],
+                      report_df["mkt_stock_price"],
+                      path=chart_path(f"{report_id}-dcf_mkt_price", path),
+                      title=report_id),
+    ]
+
+
+def plot_reports(reports, path=None, workers=None):
+    """
+    Charts of several reports, e.g. per sector, rendered in parallel.
+    reports maps report ids to DataFrames; returns paths by report id.
+    """
+    workers = min(workers or CONFIG["workers"] or 1, len(reports) or 1)
+    if workers <= 1:
+        return {
+            report_id: plot_report(report_df, report_id, path)
+            for report_id, report_df in reports.items()
+        }
+    columns = ["beta_asset", "wacc", "stock_price", "mkt_stock_price"]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            report_id: pool.submit(plot_report, report_df[columns],
+                                   report_id, path)
+            for report_id, report_df in reports.items()
+        }
+        return {
+            report_id: future.result()
+            for report_id, future in futures.items()
+        }
+
+
+def main(argv=None):
+    import pandas as pd
+
+    parser = argparse.ArgumentParser(
+        description='Write charts of valuation reports.')
+    parser.add_argument('reports', nargs='+', help='csv valuation reports')
+    parser.add_argument('--output',
+                        default=CONFIG['path'],
+                        help='directory of charts')
+    parser.add_argument('--workers',
+                        type=int,
+                        default=CONFIG['workers'],
+                        help='parallel rendering processes')
+    args = parser.parse_args(argv)
+
+    reports = {
+        os.path.splitext(os.path.basename(report))[0]: pd.read_csv(report)
+        for report in args.reports
+    }
+    for paths in plot_reports(reports, args.output, args.workers).values():
+        for path in paths:
+            print(f'-> Chart saved to a file {path}')
+
+
+if __name__ == '__main__':
+    main()
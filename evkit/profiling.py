@@ -0,0 +1,291 @@
+"""
+Profiling mode of the batch runner and SEC ingest.
+
+Code paths are scoped to stages (profiling.stage / profiled); while a
+Profiler is active, every stage gets its own cProfile and writes:
+1/ <stage>.prof: pstats file, e.g. python -m pstats or snakeviz
+2/ <stage>.collapsed: sampled stacks, flamegraph-ready
+   (flamegraph.pl, speedscope, inferno)
+3/ tickers.collapsed, tickers.txt: stacks and wall time of the slowest
+   tickers, stack frames prefixed by ticker
+4/ memory.txt: tracemalloc peak of every stage, top allocating lines
+Outside of an active Profiler stages cost a global lookup.
+Profiles cover the threads of the profiled process.
+
+python -m evkit.profiling sec --output ./profiles/sec/
+"""
+
+import argparse
+import collections
+import contextlib
+import cProfile
+import functools
+import heapq
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "path": "./profiles/",
+    "interval": 0.005,  # seconds between stack samples
+    "tickers": 10,  # slowest tickers with sampled stacks
+    "memoryFrames": 10,  # traceback depth of tracemalloc
+    "memoryTop": 25,  # allocating lines in memory report
+}
+
+# profiler of the running process, None when not profiling
+ACTIVE = None
+
+
+# -------------------- Scopes --------------------
+def stage(name):
+    """ Context manager scoping a block to a stage of the active profiler """
+    if ACTIVE is None:
+        return contextlib.nullcontext()
+    return ACTIVE.stage(name)
+
+
+def ticker(name):
+    """ Context manager attributing a block to a ticker """
+    if ACTIVE is None:
+        return contextlib.nullcontext()
+    return ACTIVE.ticker(name)
+
+
+def profiled(name):
+    """ Decorator scoping every call of a function to a stage """
+
+    def decorator(func):
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if ACTIVE is None:
+                return func(*args, **kwargs)
+            with ACTIVE.stage(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def collapse(frame):
+    """ Collapsed stack of a frame, root first """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        module = os.path.splitext(os.path.basename(code.co_filename))[0]
+        names.append(f"{module}:{code.co_name}")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+# -------------------- Profiler --------------------
+class Profiler:
+    """
+    Class for per-stage CPU profiles, sampled stacks and memory peaks.
+    """
+
+    def __init__(self, path=None, sample=True, memory=False, tickers=None):
+        self.path = path or CONFIG["path"]
+        self.sample = sample
+        self.memory = memory
+        self.topTickers = CONFIG["tickers"] if tickers is None else tickers
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+        self.profiles = collections.defaultdict(list)  # stage -> profiles
+        self.stacks = collections.defaultdict(collections.Counter)
+        self.labels = {}  # thread id -> current stage
+        self.current = {}  # thread id -> current ticker
+        self.tickerStacks = collections.defaultdict(collections.Counter)
+        self.slowest = []  # heap of (seconds, ticker)
+        self.peaks = {}  # stage -> peak traced bytes
+        self.snapshots = {}  # stage -> snapshot at its peak
+
+        self.stopped = threading.Event()
+        self.sampler = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def start(self):
+        global ACTIVE
+        ACTIVE = self
+        if self.memory:
+            tracemalloc.start(CONFIG["memoryFrames"])
+        if self.sample:
+            self.sampler = threading.Thread(target=self.sample_stacks,
+                                            name="profiling-sampler",
+                                            daemon=True)
+            self.sampler.start()
+        return self
+
+    def stop(self):
+        global ACTIVE
+        ACTIVE = None
+        self.stopped.set()
+        if self.sampler is not None:
+            self.sampler.join()
+        self.write()
+        if self.memory:
+            tracemalloc.stop()
+
+    # -------------------- Scopes --------------------
+    @contextlib.contextmanager
+    def stage(self, name):
+        # nested stages pause the profile of the enclosing stage
+        stack = self.local.__dict__.setdefault("stack", [])
+        profiles = self.local.__dict__.setdefault("profiles", {})
+        if name not in profiles:
+            profiles[name] = cProfile.Profile()
+            with self.lock:
+                self.profiles[name].append(profiles[name])
+        ident = threading.get_ident()
+        if stack:
+            profiles[stack[-1]].disable()
+        stack.append(name)
+        self.labels[ident] = name
+        if self.memory:
+            tracemalloc.reset_peak()
+        profiles[name].enable()
+        try:
+            yield
+        finally:
+            profiles[name].disable()
+            if self.memory:
+                self.record_peak(name)
+            stack.pop()
+            if stack:
+                self.labels[ident] = stack[-1]
+                profiles[stack[-1]].enable()
+            else:
+                self.labels.pop(ident, None)
+
+    @contextlib.contextmanager
+    def ticker(self, name):
+        ident = threading.get_ident()
+        self.current[ident] = name
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.current.pop(ident, None)
+            with self.lock:
+                heapq.heappush(self.slowest, (elapsed, name))
+                if len(self.slowest) > self.topTickers:
+                    _, fastest = heapq.heappop(self.slowest)
+                    self.tickerStacks.pop(fastest, None)
+
+    def record_peak(self, name):
+        peak = tracemalloc.get_traced_memory()[1]
+        with self.lock:
+            previous = self.peaks.get(name, 0)
+            self.peaks[name] = max(previous, peak)
+            # snapshot on a new peak of the stage only, snapshots are slow
+            if peak <= previous * 1.1:
+                return
+        snapshot = tracemalloc.take_snapshot()
+        with self.lock:
+            self.snapshots[name] = snapshot
+
+    def sample_stacks(self):
+        interval = CONFIG["interval"]
+        while not self.stopped.wait(interval):
+            frames = sys._current_frames()
+            for ident, label in list(self.labels.items()):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = collapse(frame)
+                self.stacks[label][stack] += 1
+                name = self.current.get(ident)
+                if name is not None:
+                    self.tickerStacks[name][stack] += 1
+
+    # -------------------- Reports --------------------
+    def write(self):
+        if not os.path.exists(self.path):
+            os.makedirs(self.path)
+        for name, profiles in self.profiles.items():
+            profiles = [p for p in profiles if _has_stats(p)]
+            if not profiles:
+                continue
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(self.path + name + ".prof")
+        for name, stacks in self.stacks.items():
+            write_collapsed(self.path + name + ".collapsed", stacks)
+
+        slowest = sorted(self.slowest, reverse=True)
+        if slowest:
+            with open(self.path + "tickers.txt", "w") as file:
+                for elapsed, name in slowest:
+                    file.write(f"{name}\t{elapsed:.3f} s\n")
+            stacks = collections.Counter()
+            for _, name in slowest:
+                for stack, count in self.tickerStacks.get(name, {}).items():
+                    stacks[f"{name};{stack}"] += count
+            write_collapsed(self.path + "tickers.collapsed", stacks)
+
+        if self.memory:
+            self.write_memory(self.path + "memory.txt")
+
+    def write_memory(self, path):
+        with open(path, "w") as file:
+            file.write("Peak traced memory by stage\n")
+            for name, peak in sorted(self.peaks.items(),
+                                     key=lambda item: -item[1]):
+                file.write(f"{name:>20s}  {peak / 2**20:10.1f} MiB\n")
+            for name, snapshot in self.snapshots.items():
+                file.write(f"\nTop allocations at peak of {name}\n")
+                statistics = snapshot.statistics("lineno")
+                for stat in statistics[:CONFIG["memoryTop"]]:
+                    file.write(f"{stat}\n")
+
+
+def _has_stats(profile):
+    try:
+        profile.create_stats()
+    except Exception:
+        return False
+    return bool(profile.stats)
+
+
+def write_collapsed(path, stacks):
+    """ Write stack counts in collapsed format, one stack per line """
+    with open(path, "w") as file:
+        for stack, count in stacks.most_common():
+            file.write(f"{stack} {count}\n")
+
+
+# -------------------- Command Line --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Profile SEC Financial Statement Data Sets ingest.')
+    parser.add_argument('target', choices=['sec'])
+    parser.add_argument('--output',
+                        default=CONFIG['path'] + 'sec/',
+                        help='directory of profiles')
+    parser.add_argument('--memory',
+                        action='store_true',
+                        help='tracemalloc peaks of every stage')
+    args = parser.parse_args(argv)
+
+    from evkit import sec_datareader
+    with Profiler(path=args.output, memory=args.memory):
+        sec_datareader.main()
+    print(f"Profiles saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""
+Columnar store of valuation reports.
+
+Reports are partitioned by date and sector (report key):
+    <root>/date=<yyyymmdd>/sector=<key>/part-<n>.npz
+with one typed array per column (ticker and name as unicode, RESULTS as
+float64, date as int32). A json manifest lists every partition with its
+sector, date range, rows, ticker range and a bloom filter of its tickers,
+so the loader prunes partitions from the manifest and reads only the
+columns it needs; a ticker history reads the ticker column of candidate
+partitions first.
+Compaction merges the daily partitions of a sector into monthly ones:
+    <root>/month=<yyyymm>/sector=<key>/part-<n>.npz
+The store assumes a single writer.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import re
+
+import numpy as np
+
+from evkit import valuation
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "path": "./reports/store/",
+    "manifest": "manifest.json",
+    # bloom filter of partition tickers, ~1% false positives
+    "bloom": {
+        "bitsPerTicker": 10,
+        "minBits": 256,
+        "hashes": 7,
+    },
+}
+
+KEYS = ("date", "ticker", "name")
+COLUMNS = (*KEYS, *valuation.RESULTS)
+
+# legacy csv reports, e.g. healthcare-20190616.csv
+REPORT_NAME = re.compile(r"^(?P<sector>.+)-(?P<date>\d{8})$")
+
+
+# -------------------- Helper Functions --------------------
+def as_date(date=None):
+    """ yyyymmdd int of a date, string or int; today by default """
+    if date is None:
+        date = datetime.date.today()
+    if isinstance(date, (datetime.date, datetime.datetime)):
+        return int(date.strftime("%Y%m%d"))
+    return int(str(date).replace("-", ""))
+
+
+def to_columns(report_df, date):
+    """ Typed column arrays of a report DataFrame """
+    size = len(report_df)
+    columns = {
+        "date": np.full(size, as_date(date), dtype=np.int32),
+        "ticker": report_df["ticker"].astype(str).to_numpy(dtype=str),
+        "name": report_df["name"].fillna("").astype(str).to_numpy(dtype=str)
+        if "name" in report_df.columns else np.full(size, ""),
+    }
+    for key in valuation.RESULTS:
+        columns[key] = report_df[key].to_numpy(dtype=float, na_value=np.nan)
+    return columns
+
+
+def _bloom_positions(tickers, size):
+    """
+    Bit positions of tickers by double hashing of a blake2b digest,
+    stable across processes unlike hash()
+    """
+    digests = np.array([
+        np.frombuffer(hashlib.blake2b(ticker.encode(), digest_size=8).digest(),
+                      dtype=np.uint32) for ticker in map(str, tickers)
+    ], dtype=np.int64).reshape(-1, 2)
+    seeds = np.arange(CONFIG["bloom"]["hashes"])
+    return (digests[:, :1] + seeds * digests[:, 1:]) % size
+
+
+def bloom(tickers):
+    """ Hex bloom filter of a set of tickers """
+    size = max(CONFIG["bloom"]["minBits"],
+               CONFIG["bloom"]["bitsPerTicker"] * len(tickers))
+    size = -(-size // 8) * 8
+    bits = np.zeros(size, dtype=bool)
+    bits[_bloom_positions(tickers, size).ravel()] = True
+    return np.packbits(bits).tobytes().hex()
+
+
+def may_contain(bloom_hex, tickers):
+    """ False if none of tickers is in the set of a bloom filter """
+    bits = np.unpackbits(np.frombuffer(bytes.fromhex(bloom_hex),
+                                       dtype=np.uint8)).astype(bool)
+    return bool(bits[_bloom_positions(tickers, len(bits))].all(axis=1).any())
+
+
+# -------------------- Report Store --------------------
+class ReportStore:
+    """
+    Class for a date and sector partitioned store of valuation reports.
+    """
+
+    def __init__(self, path=None):
+        self.path = os.path.join(path or CONFIG["path"], "")
+        self.verbose = CONFIG["verbose"]
+        self.manifestFile = self.path + CONFIG["manifest"]
+        self.manifest = self.read_manifest()
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifestFile):
+            return []
+        with open(self.manifestFile, "r") as file:
+            return json.load(file)
+
+    def write_manifest(self):
+        # replace atomically, readers never see a partial manifest
+        temp = self.manifestFile + ".tmp"
+        with open(temp, "w") as file:
+            json.dump(self.manifest, file, indent=1)
+        os.replace(temp, self.manifestFile)
+
+    def _write_partition(self, directory, columns, sector):
+        directory = os.path.join(self.path, directory, f"sector={sector}")
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        part = len(os.listdir(directory))
+        while os.path.exists(os.path.join(directory, f"part-{part}.npz")):
+            part += 1
+        path = os.path.join(directory, f"part-{part}.npz")
+        np.savez(path, **columns)
+        tickers, dates = columns["ticker"], columns["date"]
+        empty = len(tickers) == 0
+        entry = {
+            "file": os.path.relpath(path, self.path),
+            "sector": sector,
+            "dateMin": 0 if empty else int(dates.min()),
+            "dateMax": 0 if empty else int(dates.max()),
+            "rows": len(tickers),
+            "tickerMin": "" if empty else str(min(tickers)),
+            "tickerMax": "" if empty else str(max(tickers)),
+            "tickerBloom": bloom(np.unique(tickers)),
+        }
+        self.manifest.append(entry)
+        return entry
+
+    def write(self, report_df, sector, date=None):
+        """
+        Add a report of a sector (report key) run on date, today by default.
+        Returns the manifest entry of the new partition.
+        """
+        date = as_date(date)
+        entry = self._write_partition(f"date={date}",
+                                      to_columns(report_df, date), sector)
+        self.write_manifest()
+        if self.verbose:
+            print(f'\n-> Report stored to {self.path}{entry["file"]}', end='')
+        return entry
+
+    def import_csv(self, path, sector=None, date=None):
+        """ Add a csv report named <sector>-<yyyymmdd>.csv """
+        import pandas as pd
+
+        name = os.path.splitext(os.path.basename(path))[0]
+        match = REPORT_NAME.match(name)
+        if match is not None:
+            sector = sector or match["sector"]
+            date = date or match["date"]
+        if sector is None or date is None:
+            raise ValueError(f"Sector and date of {path} are unknown")
+        return self.write(pd.read_csv(path), sector=sector, date=date)
+
+    # -------------------- Loader --------------------
+    def partitions(self, tickers=None, sectors=None, start=None, end=None):
+        """ Manifest entries that may hold the query, pruned by stats """
+        start = -np.inf if start is None else as_date(start)
+        end = np.inf if end is None else as_date(end)
+        sectors = None if sectors is None else set(sectors)
+        tickers = None if tickers is None else sorted(map(str, tickers))
+        entries = []
+        for entry in self.manifest:
+            if sectors is not None and entry["sector"] not in sectors:
+                continue
+            if entry["dateMax"] < start or entry["dateMin"] > end:
+                continue
+            if tickers is not None and (tickers[-1] < entry["tickerMin"] or
+                                        tickers[0] > entry["tickerMax"]):
+                continue
+            # partitions written before bloom filters are pruned by range
+            if tickers is not None and "tickerBloom" in entry and \
+                    not may_contain(entry["tickerBloom"], tickers):
+                continue
+            entries.append(entry)
+        return entries
+
+    def load(self,
+             tickers=None,
+             sectors=None,
+             start=None,
+             end=None,
+             columns=None):
+        """
+        Rows of stored reports matching the query, as a DataFrame with
+        a sector column; columns defaults to every column.
+        """
+        import pandas as pd
+
+        columns = list(COLUMNS if columns is None else columns)
+        start = None if start is None else as_date(start)
+        end = None if end is None else as_date(end)
+        wanted = None if tickers is None else np.array(
+            sorted(map(str, tickers)))
+
+        frames = []
+        for entry in self.partitions(tickers, sectors, start, end):
+            with np.load(self.path + entry["file"]) as part:
+                # filter columns first, read the others for matching rows
+                mask = np.ones(entry["rows"], dtype=bool)
+                if wanted is not None:
+                    mask &= np.isin(part["ticker"], wanted)
+                if start is not None or end is not None:
+                    date = part["date"]
+                    if start is not None:
+                        mask &= date >= start
+                    if end is not None:
+                        mask &= date <= end
+                if not mask.any():
+                    continue
+                frame = {column: part[column][mask] for column in columns}
+            frame = pd.DataFrame(frame)
+            frame.insert(0, "sector", entry["sector"])
+            frames.append(frame)
+
+        if not frames:
+            return pd.DataFrame(columns=["sector", *columns])
+        results = pd.concat(frames, ignore_index=True)
+        order = [key for key in ("date", "sector", "ticker")
+                 if key in results.columns]
+        return results.sort_values(order, kind="stable").reset_index(
+            drop=True)
+
+    def history(self, ticker, **query):
+        """ Valuation history of a ticker across runs and sectors """
+        return self.load(tickers=[ticker], **query)
+
+    # -------------------- Compaction --------------------
+    def compact(self, before=None):
+        """
+        Merge daily partitions of every sector and month into one,
+        months before the month of before (today) only.
+        Returns the number of partitions merged.
+        """
+        month = as_date(before) // 100
+        groups = {}
+        for entry in self.manifest:
+            daily = entry["file"].startswith("date=")
+            if daily and entry["dateMin"] // 100 < month:
+                key = (entry["sector"], entry["dateMin"] // 100)
+                groups.setdefault(key, []).append(entry)
+
+        merged = 0
+        for (sector, yyyymm), entries in sorted(groups.items()):
+            # an existing monthly partition is merged again with new days,
+            # in order of writing so that later rows win
+            entries = [
+                entry for entry in self.manifest
+                if entry in entries or (entry["sector"] == sector and
+                                        entry["file"].startswith(
+                                            f"month={yyyymm}/"))
+            ]
+            if len(entries) < 2:
+                continue
+            parts = []
+            for entry in entries:
+                with np.load(self.path + entry["file"]) as part:
+                    parts.append({key: part[key] for key in COLUMNS})
+            columns = {
+                key: np.concatenate([part[key] for part in parts])
+                for key in COLUMNS
+            }
+            columns = _latest_rows(columns)
+            self.manifest = [e for e in self.manifest if e not in entries]
+            self._write_partition(f"month={yyyymm}", columns, sector)
+            self.write_manifest()
+            for entry in entries:
+                _remove(self.path + entry["file"])
+            merged += len(entries)
+
+        if self.verbose:
+            print(f"Compacted {merged} partitions of {self.path}")
+        return merged
+
+
+def _latest_rows(columns):
+    """ Rows sorted by date and ticker, the last of repeated rows kept """
+    order = np.lexsort((columns["ticker"], columns["date"]))
+    columns = {key: value[order] for key, value in columns.items()}
+    date, ticker = columns["date"], columns["ticker"]
+    last = np.ones(len(date), dtype=bool)
+    last[:-1] = (date[:-1] != date[1:]) | (ticker[:-1] != ticker[1:])
+    return {key: value[last] for key, value in columns.items()}
+
+
+def _remove(path):
+    os.remove(path)
+    # drop directories left empty
+    directory = os.path.dirname(path)
+    while directory and not os.listdir(directory):
+        os.rmdir(directory)
+        directory = os.path.dirname(directory)
@@ -0,0 +1,469 @@
+"""
+Batch DCF-WACC valuation of a universe of tickers.
+
+Per-ticker work runs serially, or on a process or thread pool with a
+bounded number of tickers in flight; results are streamed in universe
+order or as soon as each ticker completes. Several universes run as
+their union, each ticker valued once, with a report per universe.
+"""
+
+import collections
+import concurrent.futures
+import gc
+import glob
+import os
+import time
+import warnings
+from datetime import datetime
+
+from evkit import (capital, financials, metrics, profiling, sink, utils,
+                   valuation)
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "assumptions": {
+        "horizon": 5,
+    },
+    "path": {
+        "reports": "./reports/",
+    },
+    # yahoo (summary page) or prices (regression on local prices, evkit.beta),
+    # inherited by spawned workers from the environment
+    "betaSource": os.environ.get('EVKIT_BETA_SOURCE') or "yahoo",
+    "executor": "process",  # process or thread
+    "workers": 1,  # serial run in the main process
+    "inflight": 4,  # tickers in flight per worker
+    "memory": {
+        "releasePages": True,  # free parsed pages once values are extracted
+        "rssLimit": None,  # MB of the process tree, throttles fetching above
+        "pollInterval": 0.1,
+    },
+}
+
+EXECUTORS = {
+    "process": concurrent.futures.ProcessPoolExecutor,
+    "thread": concurrent.futures.ThreadPoolExecutor,
+}
+
+
+# -------------------- Valuation --------------------
+def set_beta_source(source):
+    """ Beta source of this process and of pool workers started after """
+    CONFIG["betaSource"] = source
+    os.environ['EVKIT_BETA_SOURCE'] = source
+
+
+def init_worker(metered=False):
+    """
+    Silence numpy warnings of incomplete statements in workers;
+    metered process workers record metrics for the parent.
+    """
+    warnings.filterwarnings('ignore')
+    if metered:
+        # drop metrics of the parent copied to a forked worker
+        metrics.REGISTRY.reset()
+        metrics.enable()
+
+
+def metered(task, *args):
+    """ Results of a task in a process worker and metrics it recorded """
+    return task(*args), metrics.REGISTRY.drain()
+
+
+def unmetered(result):
+    """ Results of a metered task, its metrics merged into this process """
+    values, snapshot = result
+    metrics.REGISTRY.merge(snapshot)
+    return values
+
+
+@metrics.timed('ticker_seconds')
+def value_ticker(ticker, rf, mrp, horizon=5):
+    """
+    DCF-WACC valuation of a ticker from YahooFinance data.
+    Returns a dict of valuation.RESULTS, None values on missing data.
+    """
+    with profiling.ticker(ticker):
+        return _value_ticker(ticker, rf, mrp, horizon)
+
+
+def _value_ticker(ticker, rf, mrp, horizon):
+    # create instances of pro-forma financial statements and Cost of Capital
+    fin_is = financials.IncomeStatement(ticker)
+    fin_bs = financials.BalanceSheet(ticker)
+    fin_cf = financials.CashFlowStatement(ticker)
+    cap = capital.CostOfCapital(ticker=ticker, rf=rf, mrp=mrp)
+    release = CONFIG["memory"]["releasePages"]
+    # Web data extraction
+    with profiling.stage('trading'):
+        # extract beta of equity (levered beta), previous close
+        if CONFIG["betaSource"] == "prices":
+            beta_eq, mkt_price = cap.get_local_summary()
+        else:
+            beta_eq, mkt_price = cap.get_stock_summary(release=release)
+        # extract shares outstanding
+        num_shares = cap.get_shares_outstanding(release=release)
+
+    # web data integrity check
+    if None in [beta_eq, mkt_price, num_shares]:
+        return dict.fromkeys(valuation.RESULTS)
+    with profiling.stage('statements'):
+        # extract financial reports
+        fin_is.get_html_data()
+        fin_bs.get_html_data()
+        fin_cf.get_html_data()
+        # populate fin statements with actual data
+        fin_is.actual_statement()
+        fin_bs.actual_statement()
+        fin_cf.actual_statement()
+        if release:
+            for fs in (fin_is, fin_bs, fin_cf):
+                fs.release_html()
+    with profiling.stage('valuation'):
+        return value_statements(fin_is, fin_bs, fin_cf, cap, num_shares,
+                                horizon)
+
+
+def value_statements(fin_is, fin_bs, fin_cf, cap, num_shares, horizon=5):
+    """
+    DCF-WACC valuation of actual pro-forma statements.
+    """
+    # get effective tax rate
+    tax_rate = fin_is.get_tax_rate()
+
+    # Cost of Capital
+    # get cost of debt
+    rd = cap.get_cost_of_debt(debt=fin_bs.total_debt, interest=fin_is.interest)
+    # get debt beta
+    beta_debt = cap.get_debt_beta()
+    # get asset beta
+    beta_asset = cap.get_asset_beta(debt=fin_bs.lt_debt,
+                                    equity=fin_bs.equity,
+                                    tax_rate=tax_rate)
+    # get cost of equity
+    re = cap.get_cost_of_equity()
+    # get WACC
+    wacc = cap.get_wacc(debt=fin_bs.lt_debt,
+                        assets=fin_bs.total_assets,
+                        tax_rate=tax_rate)
+    # get discount factors
+    dt = capital.discount_factors(wacc=wacc, periods=horizon)
+
+    # DCF
+    # implement industry-specific estimates for LT growth rate
+    lt_growth = wacc * 0.5
+    # get ST growth rate from revenue
+    st_growth = fin_is.get_st_growth(fin_is.revenue)
+    # make financial projections
+    fin_is.forecast_statement(st_growth=st_growth, periods=horizon)
+    fin_bs.forecast_statement(st_growth=st_growth, periods=horizon)
+    fin_cf.forecast_statement(st_growth=st_growth, periods=horizon)
+    # Enterprise value
+    fcf, ev = financials.dcf(ebit=fin_is.ebit,
+                             dna=fin_cf.depreciation,
+                             nwc=fin_bs.nwc,
+                             capex=fin_cf.capex,
+                             tax_rate=tax_rate,
+                             lt_growth=lt_growth,
+                             wacc=wacc,
+                             dt=dt)
+    # Equity value
+    eq = ev - fin_bs.total_debt[3] + fin_bs.cash[3]
+    # Share price
+    stock_price = max(0, eq / num_shares)
+
+    return {
+        'beta_equity': cap.equity_beta,
+        'beta_asset': beta_asset,
+        'beta_debt': beta_debt,
+        're': re,
+        'rd': rd,
+        'wacc': wacc,
+        'enterprise_value, $B': ev / 1_000_000,
+        'equity_value, $B': eq / 1_000_000,
+        'stock_price': stock_price,
+        'mkt_stock_price': cap.mkt_price,
+    }
+
+
+def safe_value_ticker(ticker, rf, mrp, horizon=5):
+    """ Valuation of a ticker, None values on unexpected page layout """
+    try:
+        return value_ticker(ticker, rf, mrp, horizon)
+    except Exception as error:
+        return dict.fromkeys(valuation.RESULTS, None) | {'error': str(error)}
+
+
+# -------------------- Memory --------------------
+def rss():
+    """
+    Resident set size of this process and its children in MB,
+    0 where /proc is not available.
+    """
+    page = os.sysconf("SC_PAGE_SIZE") / 2**20
+    pids = {os.getpid()}
+    for path in glob.glob(f"/proc/{os.getpid()}/task/*/children"):
+        with open(path) as file:
+            pids.update(map(int, file.read().split()))
+    total = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/statm") as file:
+                total += int(file.read().split()[1]) * page
+        except (OSError, IndexError, ValueError):
+            continue
+    return total
+
+
+def over_memory_limit(limit=None):
+    """ True if RSS is above limit (MB) after a collection of garbage """
+    limit = limit or CONFIG["memory"]["rssLimit"]
+    if not limit or rss() <= limit:
+        return False
+    gc.collect()
+    return rss() > limit
+
+
+def wait_for_memory(busy, limit=None, stopped=None):
+    """
+    Backpressure: block while RSS is above limit and busy() tells that
+    work in flight may still free memory.
+    """
+    while over_memory_limit(limit) and busy():
+        if stopped is not None and stopped.is_set():
+            return
+        time.sleep(CONFIG["memory"]["pollInterval"])
+
+
+# -------------------- Results Stream --------------------
+def iter_valuations(tickers,
+                    rf,
+                    mrp,
+                    horizon=None,
+                    workers=None,
+                    executor=None,
+                    ordered=True,
+                    task=safe_value_ticker,
+                    skip=()):
+    """
+    Stream (position, ticker, results) of a universe of tickers,
+    tickers in skip are left out.
+
+    At most inflight * workers tickers are submitted at a time,
+    so memory does not grow with the size of the universe; above the
+    RSS limit, pending tickers complete before new ones are submitted.
+    """
+    horizon = horizon or CONFIG["assumptions"]["horizon"]
+    workers = workers or CONFIG["workers"]
+    executor = executor or CONFIG["executor"]
+    tickers = ((num, ticker) for num, ticker in enumerate(tickers)
+               if ticker not in skip)
+
+    if workers <= 1:
+        init_worker()
+        for num, ticker in tickers:
+            yield num, ticker, task(ticker, rf, mrp, horizon)
+        return
+
+    inflight = CONFIG["inflight"] * workers
+    # metrics of process workers come back with their results
+    meter = executor == "process" and metrics.CONFIG["enabled"]
+    with EXECUTORS[executor](max_workers=workers,
+                             initializer=init_worker,
+                             initargs=(meter, )) as pool:
+        pending = collections.deque()
+        for num, ticker in tickers:
+            while pending and over_memory_limit():
+                yield from _drain(pending, ordered, meter)
+            if meter:
+                future = pool.submit(metered, task, ticker, rf, mrp,
+                                     horizon)
+            else:
+                future = pool.submit(task, ticker, rf, mrp, horizon)
+            pending.append((num, ticker, future))
+            while len(pending) >= inflight:
+                yield from _drain(pending, ordered, meter)
+        while pending:
+            yield from _drain(pending, ordered, meter)
+
+
+def _drain(pending, ordered, meter=False):
+    """ Yield the next completed results of pending futures """
+    def result(future):
+        return unmetered(future.result()) if meter else future.result()
+
+    if ordered:
+        num, ticker, future = pending.popleft()
+        yield num, ticker, result(future)
+        return
+    done, _ = concurrent.futures.wait([future for _, _, future in pending],
+                                      return_when="FIRST_COMPLETED")
+    for item in [item for item in pending if item[2] in done]:
+        pending.remove(item)
+        num, ticker, future = item
+        yield num, ticker, result(future)
+
+
+# -------------------- Batch Run --------------------
+def outcome(values):
+    """ Outcome of a ticker: error, missing (trading information), valued """
+    if 'error' in values:
+        return 'error'
+    if values['beta_equity'] is None:
+        return 'missing'
+    return 'valued'
+
+
+def get_report_id(report_key):
+    """ Report ID of a stock pool, dated today """
+    # get date as id for report
+    date = datetime.today().strftime('-%Y%m%d')
+    return date.join([report_key, ''])
+
+
+def run_batch(tickers_df,
+              report_key,
+              rf=None,
+              mrp=None,
+              horizon=None,
+              output=None,
+              workers=None,
+              executor=None,
+              ordered=True,
+              task=safe_value_ticker,
+              sink_path=None,
+              resume=True,
+              stream=None,
+              store=None):
+    """
+    Value a universe of tickers, write results to csv report.
+
+    Results are streamed to a sink as each ticker completes; a run with
+    the same sink resumes by skipping tickers already valued. The sink is
+    removed once the report of a complete run is compacted from it.
+    stream replaces iter_valuations, e.g. pipeline.Pipeline().run.
+    A complete report is also added to store, a reports.ReportStore.
+    Returns the report DataFrame.
+    """
+    if rf is None or mrp is None:
+        # extract risk-free rate, market return, market risk premium
+        rf, mrp = utils.get_rf_mrp()
+    output = output or CONFIG["path"]["reports"]
+    report_id = get_report_id(report_key)
+    sink_path = sink_path or os.path.join(output, report_id + '.jsonl')
+
+    result_sink = sink.ResultSink(sink_path, resume=resume)
+    done = result_sink.completed()
+    sample_size = len(tickers_df)
+    complete = False
+    if done and CONFIG["verbose"]:
+        print(f'-> Resuming {sink_path}, {len(done)} tickers done', end='')
+
+    if stream is None:
+        stream = iter_valuations(tickers_df.ticker,
+                                 rf=rf,
+                                 mrp=mrp,
+                                 horizon=horizon,
+                                 workers=workers,
+                                 executor=executor,
+                                 ordered=ordered,
+                                 task=task,
+                                 skip=done)
+    else:
+        stream = stream(tickers_df.ticker,
+                        rf=rf,
+                        mrp=mrp,
+                        horizon=horizon,
+                        skip=done)
+    try:
+        with result_sink:
+            for count, (num, ticker, values) in enumerate(stream, len(done)):
+                result_sink.write(num, ticker, values)
+                metrics.inc('tickers_total', outcome=outcome(values))
+                if CONFIG["verbose"]:
+                    print(f'\n{count + 1}/{sample_size} Processing {ticker}',
+                          end=' ')
+                    if 'error' in values:
+                        print(f'-> {values["error"]}', end='')
+                    elif values['beta_equity'] is None:
+                        print('-> Missing trading information', end='')
+        complete = True
+    except KeyboardInterrupt:
+        print('\n-> Program interrupted by user', end='')
+    finally:
+        # write results to report
+        report_df = sink.compact(sink_path,
+                                 tickers_df,
+                                 report_id=report_id,
+                                 output=output)
+    if complete:
+        os.remove(sink_path)
+        if store is not None:
+            store.write(report_df, sector=report_key)
+    return report_df
+
+
+def run_universes(universes,
+                  report_key=None,
+                  rf=None,
+                  mrp=None,
+                  output=None,
+                  store=None,
+                  **kwargs):
+    """
+    Value the union of several universes, e.g. sector screeners.
+
+    Every ticker is valued once and market inputs are fetched once;
+    results are fanned out into a csv report per universe, in its order.
+    universes maps report keys to DataFrames of ticker and name.
+    Returns a dict of report DataFrames by key.
+    """
+    if rf is None or mrp is None:
+        # extract risk-free rate, market return, market risk premium
+        rf, mrp = utils.get_rf_mrp()
+    output = output or CONFIG["path"]["reports"]
+    report_key = report_key or "universe"
+
+    union_df = union(universes)
+    if CONFIG["verbose"]:
+        total = sum(len(tickers_df) for tickers_df in universes.values())
+        print(f'-> {len(universes)} universes, {len(union_df)} of {total} '
+              f'tickers unique', end='')
+    union_report = run_batch(union_df,
+                             report_key=report_key,
+                             rf=rf,
+                             mrp=mrp,
+                             output=output,
+                             **kwargs)
+    return fan_out(union_report, universes, output=output, store=store)
+
+
+def union(universes):
+    """ Tickers of several universes, each once, in order of first use """
+    import pandas as pd
+
+    union_df = pd.concat(list(universes.values()), ignore_index=True)
+    return union_df.drop_duplicates("ticker").reset_index(drop=True)
+
+
+def fan_out(union_report, universes, output=None, store=None):
+    """
+    csv report of every universe from the report of their union,
+    in universe order. Returns a dict of report DataFrames by key.
+    """
+    import pandas as pd
+
+    output = output or CONFIG["path"]["reports"]
+    results = union_report.set_index("ticker")[list(valuation.RESULTS)]
+    reports = {}
+    for key, tickers_df in universes.items():
+        tickers_df = tickers_df.reset_index(drop=True)
+        results_df = results.reindex(tickers_df.ticker).reset_index(drop=True)
+        reports[key] = pd.concat([tickers_df, results_df], axis=1)
+        utils.results_to_csv(data_df=reports[key],
+                             report_id=get_report_id(key),
+                             path=output)
+        if store is not None:
+            store.write(reports[key], sector=key)
+    return reports
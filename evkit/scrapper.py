@@ -1,40 +1,304 @@
-""" Script for downloading company filings from the SEC EDGAR database. """
+"""
+Bulk downloader of company filings from the SEC EDGAR database.
 
+Filings of many tickers or CIKs are downloaded on a pool of threads:
+1/ map tickers to CIKs with the EDGAR company tickers file
+2/ list recent filings of a form type from the submissions API
+3/ download primary documents not on disk yet
+Every request of the pool goes through one token bucket, so the job
+stays under the EDGAR fair access limit of 10 requests per second.
+Base urls are configurable to run against a local stand-in server.
+"""
+
+import concurrent.futures
 import json
-import pandas as pd
-import sec_edgar_downloader
+import os
+import threading
+import time
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "configFile": "evkit/config.json",
+    "path": "./data/filings/",
+    "formType": "10-K",
+    "numberDownload": 10,  # latest filings per company
+    "workers": 8,
+    "rateLimit": 10,  # requests per second, all workers
+    "retries": 3,
+    "timeout": 30,
+    "progressEvery": 25,  # filings between progress lines
+    # EDGAR requires a user agent with a contact
+    "userAgent": "evkit lialka.dev@protonamil.ch",
+    "url": {
+        "tickers": "https://www.sec.gov/files/company_tickers.json",
+        "submissions": "https://data.sec.gov/submissions/",
+        "archives": "https://www.sec.gov/Archives/edgar/data/",
+    },
+}
+
+
+def load_config(path=None):
+    """ Scrapper settings of config.json, read on first use """
+    path = path or CONFIG["configFile"]
+    if os.path.exists(path):
+        with open(path, "r") as configFile:
+            config = json.load(configFile)
+        CONFIG["verbose"] = config["global"]["verbose"]
+        CONFIG["formType"] = config["scrapper"]["formType"]
+        CONFIG["numberDownload"] = config["scrapper"]["numberDownload"]
+    return CONFIG
+
+
+# -------------------- Rate Limiter --------------------
+class RateLimiter:
+    """
+    Class for a thread-safe token bucket of requests per second.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """ Take a token, returns seconds until one is available or 0 """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """ Block until a request is allowed """
+        wait = self.take()
+        while wait:
+            time.sleep(wait)
+            wait = self.take()
+
+    def try_acquire(self):
+        """ Whether a request is allowed now, never blocks """
+        return self.take() == 0
+
+
+# -------------------- Downloader --------------------
+class FilingsDownloader:
+    """
+    Class for parallel, rate-limited download of EDGAR filings.
+    """
+
+    def __init__(self,
+                 path=None,
+                 form_type=None,
+                 number=None,
+                 workers=None,
+                 rate=None,
+                 url=None):
+        self.verbose = CONFIG["verbose"]
+        self.path = os.path.join(path or CONFIG["path"], "")
+        self.formType = form_type or CONFIG["formType"]
+        self.number = number or CONFIG["numberDownload"]
+        self.workers = workers or CONFIG["workers"]
+        self.url = {**CONFIG["url"], **(url or {})}
+        self.limiter = RateLimiter(rate or CONFIG["rateLimit"])
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.cikMap = None
+        self.cikLock = threading.Lock()
+        self.stats = {
+            "requests": 0,
+            "downloaded": 0,
+            "skipped": 0,
+            "failed": 0,
+            "bytes": 0,
+            "elapsed, s": 0.0,
+        }
 
-# Load configs
-with open("evkit/config.json", "r") as configFile:
-    config = json.load(configFile)
+    def _count(self, key, value=1):
+        with self.lock:
+            self.stats[key] += value
 
-# -------------------- Assumptions --------------------
-ticker = "AAPL"
-verbose = config["global"]["verbose"]
-separatorFS = "	"
+    def get(self, url):
+        """ Response content of a rate-limited request with retries """
+        import requests
+
+        # one keep-alive session per worker thread
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+            self.local.session.headers["User-Agent"] = CONFIG["userAgent"]
+        for attempt in range(CONFIG["retries"] + 1):
+            self.limiter.acquire()
+            self._count("requests")
+            response = self.local.session.get(url, timeout=CONFIG["timeout"])
+            # throttled or server error, back off and retry
+            if response.status_code in (429, 500, 502, 503, 504) and \
+                    attempt < CONFIG["retries"]:
+                time.sleep(2**attempt)
+                continue
+            response.raise_for_status()
+            return response.content
+
+    def cik(self, ticker_or_cik):
+        """ CIK of a ticker, CIKs are passed through """
+        value = str(ticker_or_cik).strip()
+        if value.isdigit():
+            return int(value)
+        # tickers file is fetched once for all workers
+        with self.cikLock:
+            if self.cikMap is None:
+                companies = json.loads(self.get(self.url["tickers"]))
+                self.cikMap = {
+                    company["ticker"].upper(): int(company["cik_str"])
+                    for company in companies.values()
+                }
+        return self.cikMap[value.upper()]
+
+    def filings(self, cik):
+        """ Latest filings of the form type of a company """
+        url = f'{self.url["submissions"]}CIK{cik:010d}.json'
+        recent = json.loads(self.get(url))["filings"]["recent"]
+        filings = []
+        for accession, form, date, document in zip(
+                recent["accessionNumber"], recent["form"],
+                recent["filingDate"], recent["primaryDocument"]):
+            if form != self.formType or not document:
+                continue
+            folder = accession.replace("-", "")
+            filings.append({
+                "cik": cik,
+                "accession": accession,
+                "form": form,
+                "date": date,
+                "url": f'{self.url["archives"]}{cik}/{folder}/{document}',
+                "file": os.path.join(self.path, str(cik),
+                                     form.replace("/", "-"), accession,
+                                     document),
+            })
+            if len(filings) == self.number:
+                break
+        return filings
+
+    def download(self, filing):
+        """ Save a filing unless it is on disk, returns its status """
+        # filing date and accession of the document, read by xbrl
+        metaFile = os.path.join(os.path.dirname(filing["file"]),
+                                "filing.json")
+        if os.path.exists(filing["file"]) and os.path.exists(metaFile):
+            self._count("skipped")
+            return "skipped"
+        content = self.get(filing["url"])
+        os.makedirs(os.path.dirname(filing["file"]), exist_ok=True)
+        # write to temporary files, the metadata before the document:
+        # an interrupted download is not skipped
+        temp = metaFile + ".part"
+        with open(temp, "w") as file:
+            json.dump({key: filing[key]
+                       for key in ("cik", "accession", "form", "date")},
+                      file)
+        os.replace(temp, metaFile)
+        temp = filing["file"] + ".part"
+        with open(temp, "wb") as file:
+            file.write(content)
+        os.replace(temp, filing["file"])
+        self._count("downloaded")
+        self._count("bytes", len(content))
+        return "downloaded"
+
+    def run(self, tickers):
+        """
+        Download filings of tickers or CIKs on the pool of workers.
+        Returns download stats.
+        """
+        if self.verbose:
+            print(f"Start downloading {self.formType} filings of "
+                  f"{len(tickers)} companies.")
+        start = time.perf_counter()
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.workers) as pool:
+            # list filings of every company
+            listings = {
+                pool.submit(lambda t: self.filings(self.cik(t)), ticker):
+                ticker
+                for ticker in tickers
+            }
+            downloads = []
+            for future in concurrent.futures.as_completed(listings):
+                try:
+                    for filing in future.result():
+                        downloads.append(pool.submit(self.download, filing))
+                except Exception as error:
+                    self._count("failed")
+                    if self.verbose:
+                        print(f"Failed listing {listings[future]}: {error}")
+
+            for done, future in enumerate(
+                    concurrent.futures.as_completed(downloads), 1):
+                try:
+                    future.result()
+                except Exception as error:
+                    self._count("failed")
+                    if self.verbose:
+                        print(f"Failed download: {error}")
+                if self.verbose and (done % CONFIG["progressEvery"] == 0 or
+                                     done == len(downloads)):
+                    self.progress(done, len(downloads), start)
+
+        self.stats["elapsed, s"] = time.perf_counter() - start
+        if self.verbose:
+            print(f'Complete {self.stats["downloaded"]} downloads, '
+                  f'{self.stats["skipped"]} on disk, '
+                  f'{self.stats["failed"]} failed.\n')
+        return self.stats
+
+    def progress(self, done, total, start):
+        elapsed = time.perf_counter() - start
+        print(f"{done}/{total} filings, "
+              f'{self.stats["requests"] / elapsed:.1f} requests/s, '
+              f'{self.stats["bytes"] / 2**20 / elapsed:.2f} MB/s')
 
 
 # -------------------- Scrapper Settings --------------------
-def scrap_sec_fillings(ticker, verbose=verbose):
+def scrap_sec_fillings(ticker, verbose=None):
     """ Retrieve SEC fillings for a ticker """
-    if verbose:
-        print(
-            f'Started scrapping {config["scrapper"]["formType"]} fillings for {ticker}'
-        )
-    # initialize scrapper
-    scrapper = sec_edgar_downloader.Downloader(
-        download_folder=config["path"]["data"])
-    # collect fillings
-    scrapper.get(filing_type=config["scrapper"]["formType"],
-                 ticker_or_cik=ticker,
-                 num_filings_to_download=config["scrapper"]["numberDownload"])
-
-
-def main():
-    # scrap_sec_fillings(ticker)
-    pathFS = "data/2020q2/num.txt"
-    df = pd.read_csv(pathFS, sep=separatorFS)
-    print(df.head())
+    load_config()
+    if verbose is not None:
+        CONFIG["verbose"] = verbose
+    return FilingsDownloader().run([ticker])
+
+
+def main(argv=None):
+    import argparse
+
+    load_config()
+    parser = argparse.ArgumentParser(
+        description='Download filings of companies from SEC EDGAR.')
+    parser.add_argument('tickers',
+                        nargs='+',
+                        help='tickers or CIKs, or a file with one per line')
+    parser.add_argument('--form', default=CONFIG['formType'])
+    parser.add_argument('--number',
+                        type=int,
+                        default=CONFIG['numberDownload'],
+                        help='latest filings per company')
+    parser.add_argument('--workers', type=int, default=CONFIG['workers'])
+    parser.add_argument('--output', default=CONFIG['path'])
+    args = parser.parse_args(argv)
+
+    tickers = args.tickers
+    if len(tickers) == 1 and os.path.isfile(tickers[0]):
+        with open(tickers[0], "r") as file:
+            tickers = [line.strip() for line in file if line.strip()]
+    FilingsDownloader(path=args.output,
+                      form_type=args.form,
+                      number=args.number,
+                      workers=args.workers).run(tickers)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,255 @@
+"""
+Universe-wide screening of SEC filers.
+
+Valuation inputs and multiples of every filer of a quarter are computed
+at once from SEC Financial Statement Data Sets, so the per-ticker
+valuation of launcher only has to run on a shortlist.
+"""
+
+import functools
+
+import numpy as np
+import pandas as pd
+
+from evkit import sec_datareader, shared, valuation
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "assumptions": {
+        "horizon": 5,
+        "riskFree": 0.025,
+        "marketPremium": 0.055,
+        "equityBeta": 1.0,
+    },
+    "unit": 1_000_000_000,  # SEC values are in dollars
+    "workers": 1,  # valuation processes, statements in shared memory
+}
+
+# balance sheet items, observed at the period end (qtrs == 0)
+STOCKS = tuple(sec_datareader.CONFIG["statementInstants"])
+
+# statement items of the screen, besides valuation.FIELDS
+EXTRA_FIELDS = ("net_income", )
+
+
+# -------------------- Helper Functions --------------------
+def quarter_dates(quarter):
+    """ First and last yyyymmdd date of a quarter labeled as 2019q4 """
+    year, q = int(quarter[:4]), int(quarter[-1])
+    return (year * 10000 + (3 * q - 2) * 100 + 1,
+            year * 10000 + 3 * q * 100 + 31)
+
+
+def annual_history(facts, ciks, periods=valuation.HISTORY):
+    """
+    Arrays of the latest fiscal years of every company, oldest first.
+
+    Fiscal years are the period ends of annual flows; balance sheet
+    items are read at the same dates.
+    """
+    flows = facts[(facts["qtrs"] == 4) & ~facts["field"].isin(STOCKS)]
+    years = flows[["cik", "ddate"]].drop_duplicates()
+    years = years.sort_values(["cik", "ddate"])
+    years["k"] = years.groupby("cik").cumcount(ascending=False)
+    years = years[years["k"] < periods]
+
+    stocks = facts[(facts["qtrs"] == 0) & facts["field"].isin(STOCKS)]
+    fields = (*valuation.FIELDS, *EXTRA_FIELDS)
+    items = pd.concat([flows, stocks]).merge(years, on=["cik", "ddate"])
+    items = items[items["field"].isin(fields)]
+    code = pd.Categorical(items["field"], categories=fields).codes
+    i = np.searchsorted(ciks, items["cik"])
+    t = periods - 1 - items["k"].to_numpy()
+
+    arrays = np.full((len(fields), len(ciks), periods), np.nan)
+    arrays[code, i, t] = items["value"].to_numpy()
+    return dict(zip(fields, arrays))
+
+
+# -------------------- Screener --------------------
+class Screener:
+    """
+    Class for screening all SEC filers of a quarter.
+    """
+
+    def __init__(self, finData, index, quarter=None, betas=None, prices=None):
+        self.verbose = CONFIG["verbose"]
+        self.horizon = CONFIG["assumptions"]["horizon"]
+        self.rf = CONFIG["assumptions"]["riskFree"]
+        self.mrp = CONFIG["assumptions"]["marketPremium"]
+
+        self.finData = finData
+        self.index = index
+        self.quarter = quarter  # e.g. 2019q4, all filings if None
+        self.betas = betas  # pd.Series of equity betas by cik
+        self.prices = prices  # pd.Series of market quotes by cik
+
+        self.companies = None
+        self.statements = None  # arrays of valuation inputs by field
+        self.screen = None
+
+    def get_companies(self):
+        """
+        Latest filing of every company filed in the quarter.
+        """
+        filings = self.index
+        if self.quarter is not None:
+            start, end = quarter_dates(self.quarter)
+            filings = filings[(filings["filed"] >= start) &
+                              (filings["filed"] <= end)]
+        filings = filings.sort_values(["cik", "filed"])
+        filings = filings.drop_duplicates("cik", keep="last")
+        columns = [
+            column for column in ("name", "sic", "form", "period", "fy")
+            if column in filings.columns
+        ]
+        self.companies = filings.set_index("cik")[columns].sort_index()
+        return self.companies
+
+    def compute(self):
+        """
+        Valuation inputs, multiples and DCF-WACC price of every company.
+        """
+        if self.verbose:
+            print("Start screening SEC filers.")
+
+        companies = self.get_companies()
+        ciks = companies.index.to_numpy()
+        # facts as of the quarter end: later filings are dropped before
+        # deduplication, as they restate earlier fiscal years
+        index = self.index
+        if self.quarter is not None:
+            index = index[index["filed"] <= quarter_dates(self.quarter)[1]]
+        facts = sec_datareader.statement_facts(self.finData, index)
+        facts = facts[facts["cik"].isin(ciks)]
+        fs = annual_history(facts, ciks)
+        self.statements = fs
+
+        shares = facts[facts["field"] == "shares"].sort_values("ddate")
+        shares = shares.drop_duplicates("cik", keep="last")
+        shares = shares.set_index("cik")["value"].reindex(ciks).to_numpy()
+        betas = np.full(len(ciks), CONFIG["assumptions"]["equityBeta"])
+        if self.betas is not None:
+            betas = self.betas.reindex(ciks).fillna(
+                CONFIG["assumptions"]["equityBeta"]).to_numpy()
+
+        value_universe = valuation.value_universe
+        if CONFIG["workers"] > 1:
+            value_universe = functools.partial(shared.value_universe,
+                                               workers=CONFIG["workers"])
+        results = value_universe(fs,
+                                 equity_beta=betas,
+                                 num_shares=shares,
+                                 mkt_price=None,
+                                 rf=self.rf,
+                                 mrp=self.mrp,
+                                 horizon=self.horizon,
+                                 unit=CONFIG["unit"])
+
+        latest = {
+            field: valuation.get_actual(values)[:, -1]
+            for field, values in fs.items()
+        }
+        revenue = latest["revenue"]
+        totalDebt = latest["st_debt"] + latest["lt_debt"]
+        nwc = latest["current_assets"] - latest["current_liabilities"]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            screen = {
+                "revenue": revenue,
+                "ebit": latest["ebit"],
+                "net_income": latest["net_income"],
+                "st_growth": valuation.get_st_growth(
+                    valuation.get_actual(fs["revenue"])),
+                "ebit_margin": latest["ebit"] / revenue,
+                "net_margin": latest["net_income"] / revenue,
+                "tax_rate": valuation.get_tax_rate(
+                    valuation.get_actual(fs["tax"]),
+                    valuation.get_actual(fs["ebit"])),
+                "nwc": nwc,
+                "nwc_to_revenue": nwc / revenue,
+                "capex_intensity": -latest["capex"] / revenue,
+                "debt_to_assets": totalDebt / latest["total_assets"],
+                "debt_to_equity": totalDebt / latest["equity"],
+                "shares": shares,
+                "wacc": results["wacc"],
+                "enterprise_value": results["enterprise_value, $B"],
+                "dcf_price": results["stock_price"],
+            }
+            if self.prices is not None:
+                price = self.prices.reindex(ciks).to_numpy(dtype=float)
+                marketCap = price * shares
+                screen["mkt_price"] = price
+                screen["upside"] = results["stock_price"] / price - 1
+                screen["market_cap"] = marketCap / CONFIG["unit"]
+                screen["ev_ebit"] = ((marketCap + totalDebt - latest["cash"]) /
+                                     latest["ebit"])
+                screen["pe"] = marketCap / latest["net_income"]
+
+        self.screen = companies.assign(**screen)
+        self.screen = self.screen.replace([np.inf, -np.inf], np.nan)
+
+        if self.verbose:
+            print(f"Complete screening of {len(self.screen)} companies.\n")
+        return self.screen
+
+    def filter(self, screen=None, query=None, **bounds):
+        """
+        Companies within (lower, upper) bounds of metrics,
+        e.g. filter(ebit_margin=(0.1, None), debt_to_assets=(None, 0.5)).
+        """
+        screen = self.screen if screen is None else screen
+        if query is not None:
+            screen = screen.query(query)
+        mask = np.ones(len(screen), dtype=bool)
+        for metric, (lower, upper) in bounds.items():
+            values = screen[metric].to_numpy(dtype=float)
+            if lower is not None:
+                mask &= values >= lower
+            if upper is not None:
+                mask &= values <= upper
+        return screen[mask]
+
+    def rank(self, by, ascending=False, top=None, screen=None):
+        """
+        Companies ordered by a metric or composite rank of metrics.
+        """
+        screen = self.screen if screen is None else screen
+        metrics = [by] if isinstance(by, str) else list(by)
+        if isinstance(ascending, bool):
+            ascending = [ascending] * len(metrics)
+        ranks = [
+            screen[metric].rank(ascending=not asc, pct=True)
+            for metric, asc in zip(metrics, ascending)
+        ]
+        score = pd.concat(ranks, axis=1).mean(axis=1, skipna=False)
+        ranked = screen.assign(score=score).dropna(subset=["score"])
+        ranked = ranked.sort_values("score", ascending=False, kind="stable")
+        return ranked if top is None else ranked.head(top)
+
+    def shortlist(self, by, top=25, ascending=False, query=None, **bounds):
+        """
+        Top ranked companies passing the filter.
+        """
+        if self.screen is None:
+            self.compute()
+        screen = self.filter(query=query, **bounds)
+        return self.rank(by, ascending=ascending, top=top, screen=screen)
+
+
+def main():
+    # load persisted SEC data
+    findata = sec_datareader.FinancialDataSEC()
+    index, finData = findata.load()
+
+    # screen profitable, moderately levered companies
+    screener = Screener(finData, index)
+    screener.compute()
+    shortlist = screener.shortlist(by=["ebit_margin", "st_growth"],
+                                   ebit_margin=(0.1, None),
+                                   debt_to_assets=(None, 0.5))
+    print(shortlist)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,12 @@ import os
 import shutil
 import zipfile
 
+import numpy as np
 import pandas as pd
 import requests
 
+from evkit import factpanel, metrics, profiling, secstore, symbols
+
 
 # -------------------- Helper Functions --------------------
 def sec_url(period):
@@ -37,6 +40,12 @@ CONFIG = {
         "temp": "data/temp/",
         "index": "data/sec_index.csv",
         "finData": "data/sec_findata.csv",
+        # latest filed value of every fact, as-filed history is kept
+        # in finData for point-in-time consumers
+        "latest": "data/sec_findata_latest.csv",
+        "symbols": "data/sec_symbols.npz",
+        "panel": "data/sec_panel/",
+        "store": "data/sec_store/",
     },
     "dataSource": {
         # sec_url("2020q2"),
@@ -50,8 +59,53 @@ CONFIG = {
         "separator": "\t",
         "indexColumn": "adsh",
         "fileIndex": "/sub.txt",
-        "fileData": "/num.txt"
-    }
+        "fileData": "/num.txt",
+        # identity of a fact repeated and restated across filings
+        "factKey": ["cik", "tag", "ddate", "qtrs", "uom", "coreg"],
+    },
+    # us-gaap tags of pro-forma statement items, in order of preference
+    "statementTags": {
+        "revenue": [
+            "Revenues", "RevenueFromContractWithCustomerExcludingAssessedTax",
+            "SalesRevenueNet"
+        ],
+        "ebit": ["OperatingIncomeLoss"],
+        "interest": ["InterestExpense", "InterestPaid"],
+        "tax": ["IncomeTaxExpenseBenefit"],
+        "net_income": ["NetIncomeLoss"],
+        "cash": ["CashAndCashEquivalentsAtCarryingValue"],
+        "current_assets": ["AssetsCurrent"],
+        "total_assets": ["Assets"],
+        "current_liabilities": ["LiabilitiesCurrent"],
+        "st_debt": ["DebtCurrent", "LongTermDebtCurrent"],
+        "lt_debt": ["LongTermDebtNoncurrent", "LongTermDebt"],
+        "equity": ["StockholdersEquity"],
+        "depreciation": [
+            "DepreciationDepletionAndAmortization",
+            "DepreciationAndAmortization"
+        ],
+        "capex": ["PaymentsToAcquirePropertyPlantAndEquipment"],
+        "shares": [
+            "EntityCommonStockSharesOutstanding",
+            "WeightedAverageNumberOfDilutedSharesOutstanding"
+        ],
+    },
+    # statement items observed at the period end (qtrs == 0),
+    # others are flows over the reported duration
+    "statementInstants": [
+        "cash", "current_assets", "total_assets", "current_liabilities",
+        "st_debt", "lt_debt", "equity", "shares"
+    ],
+    # tags of statement instants reported over a duration, read at the
+    # period end of their shortest duration
+    "statementDurationTags": [
+        "WeightedAverageNumberOfDilutedSharesOutstanding"
+    ],
+    # YahooFinance reports interest expense and capex as negative values
+    "statementSigns": {
+        "interest": -1,
+        "capex": -1
+    },
 }
 
 
@@ -70,14 +124,22 @@ class FinancialDataSEC:
 
         self.indexFile = CONFIG["path"]["index"]
         self.finDataFile = CONFIG["path"]["finData"]
+        self.latestFile = CONFIG["path"]["latest"]
+        self.symbolsFile = CONFIG["path"]["symbols"]
+        self.panelPath = CONFIG["path"]["panel"]
+        self.storePath = CONFIG["path"]["store"]
 
         self.index = None
         self.finData = None
+        self.symbols = None
+        self.panel = None
 
         # mkdir data/ if not exists
         if not os.path.exists(self.data):
             os.mkdir(self.data)
 
+    @metrics.timed('sec_stage_seconds', stage='download')
+    @profiling.profiled('sec_download')
     def download(self):
         """
         Download Financial Statement Data Sets archives from SEC.
@@ -94,6 +156,8 @@ class FinancialDataSEC:
             fileName = url.split("/")[-1]
             filePath = "".join([self.archives, fileName])
             archive = requests.get(url)
+            metrics.inc('sec_archives_total')
+            metrics.inc('sec_archive_bytes_total', len(archive.content))
 
             # save file
             open(filePath, 'wb').write(archive.content)
@@ -104,6 +168,8 @@ class FinancialDataSEC:
         if self.verbose:
             print("Complete all downloads.\n")
 
+    @metrics.timed('sec_stage_seconds', stage='extract')
+    @profiling.profiled('sec_extract')
     def extract(self):
         """
         Extract data from SEC archives.
@@ -132,6 +198,8 @@ class FinancialDataSEC:
         if self.verbose:
             print("Complete extracting all archives.\n")
 
+    @metrics.timed('sec_stage_seconds', stage='parse_index')
+    @profiling.profiled('sec_parse_index')
     def parse_index(self, to_csv=True):
         """
         Parse company name and report index to csv.
@@ -162,6 +230,31 @@ class FinancialDataSEC:
 
         return self.index
 
+    @metrics.timed('sec_stage_seconds', stage='symbols')
+    @profiling.profiled('sec_symbols')
+    def build_symbols(self, tickers=None, to_file=True):
+        """
+        Build ticker, CIK and company name index of parsed filings.
+        tickers defaults to the EDGAR company tickers file.
+        """
+        if self.verbose:
+            print("Start building symbol index.")
+
+        if tickers is None:
+            tickers = symbols.load_company_tickers()
+        self.symbols = symbols.SymbolIndex.from_filings(self.index, tickers)
+
+        # save index to npz
+        if to_file:
+            self.symbols.save(self.symbolsFile)
+
+        if self.verbose:
+            print(f"Complete symbol index of {len(self.symbols)} companies.\n")
+
+        return self.symbols
+
+    @metrics.timed('sec_stage_seconds', stage='parse_findata')
+    @profiling.profiled('sec_parse_findata')
     def parse_findata(self, to_csv=True):
         """
         Parse financial data to csv.
@@ -178,6 +271,7 @@ class FinancialDataSEC:
                              index_col=CONFIG["convention"]["indexColumn"],
                              low_memory=False)
             self.finData = pd.concat([self.finData, df])
+            metrics.inc('sec_facts_total', len(df))
 
             if self.verbose:
                 print(f"Parsed {dirName}")
@@ -192,6 +286,122 @@ class FinancialDataSEC:
 
         return self.finData
 
+    @metrics.timed('sec_stage_seconds', stage='deduplicate')
+    @profiling.profiled('sec_deduplicate')
+    def deduplicate(self, to_csv=True):
+        """
+        Keep the latest filed value of every fact.
+
+        Filings repeat prior period values and amendments restate them;
+        adsh of the kept row is the winning filing, versions counts
+        the filings that reported the fact. The csv is written next to
+        the as-filed data, which is left intact.
+        """
+        if self.verbose:
+            print("Start de-duplicating SEC financial data.")
+
+        indexColumn = CONFIG["convention"]["indexColumn"]
+        facts = self.finData.reset_index()
+        order = [
+            column for column in ("filed", "accepted")
+            if column in self.index.columns
+        ]
+        facts = facts.join(self.index[["cik", *order]], on=indexColumn)
+
+        # sort by fact key, then by filing time, the last row of a key wins
+        codes = [
+            pd.factorize(facts[column], use_na_sentinel=False)[0]
+            for column in CONFIG["convention"]["factKey"]
+        ]
+        filing = [
+            pd.factorize(facts[column], sort=True)[0]
+            for column in [*order, indexColumn]
+        ]
+        sortKeys = [*reversed(filing), *reversed(codes)]
+        sortOrder = np.lexsort(sortKeys)
+        key = np.stack(codes)[:, sortOrder]
+        last = np.ones(len(sortOrder), dtype=bool)
+        last[:-1] = (key[:, :-1] != key[:, 1:]).any(axis=0)
+        winners = sortOrder[last]
+        # number of filings that reported each fact
+        versions = np.diff(np.flatnonzero(last), prepend=-1)
+
+        nrows = len(facts)
+        rowOrder = np.argsort(winners)
+        self.finData = facts.iloc[winners[rowOrder]].assign(
+            versions=versions[rowOrder])
+        self.finData = self.finData.drop(columns=["cik", *order])
+        self.finData = self.finData.set_index(indexColumn)
+
+        # save data to csv
+        if to_csv:
+            self.finData.to_csv(self.latestFile)
+            print(f"De-duplicated data saved to {self.latestFile}")
+
+        if self.verbose:
+            print(f"Kept {len(self.finData)} of {nrows} facts.")
+            print("Complete de-duplicating SEC financial data.\n")
+
+        return self.finData
+
+    @metrics.timed('sec_stage_seconds', stage='panel')
+    @profiling.profiled('sec_panel')
+    def build_panel(self, to_file=True):
+        """
+        Build array panel of facts by company and tag.
+        """
+        if self.verbose:
+            print("Start building fact panel.")
+
+        self.panel = factpanel.FactPanel.from_facts(self.finData, self.index)
+
+        # save arrays to npy
+        if to_file:
+            self.panel.save(self.panelPath)
+
+        if self.verbose:
+            print("Complete fact panel.\n")
+
+        return self.panel
+
+    @metrics.timed('sec_stage_seconds', stage='store')
+    @profiling.profiled('sec_store')
+    def build_store(self):
+        """
+        Write extracted data sets to the quarter partitioned store,
+        one quarter in memory at a time.
+        """
+        if self.verbose:
+            print("Start writing SEC store.")
+
+        store = secstore.SECStore(self.storePath)
+        for dirName in sorted(os.listdir(self.temp)):
+            store.import_quarter("".join([self.temp, dirName]))
+
+        if self.verbose:
+            print(f"Complete SEC store of {len(store.quarters)} quarters.\n")
+
+        return store
+
+    def load(self, latest=False):
+        """
+        Load parsed index and financial data from csv,
+        the de-duplicated latest values if latest.
+        """
+        indexColumn = CONFIG["convention"]["indexColumn"]
+        finDataFile = self.latestFile if latest else self.finDataFile
+        self.index = pd.read_csv(self.indexFile,
+                                 index_col=indexColumn,
+                                 low_memory=False)
+        self.finData = pd.read_csv(finDataFile,
+                                   index_col=indexColumn,
+                                   low_memory=False)
+
+        if self.verbose:
+            print(f"Loaded {self.indexFile}, {finDataFile}\n")
+
+        return self.index, self.finData
+
     def cleanup(self):
         """
         Remove archives and extracted artifacts.
@@ -213,6 +423,54 @@ class FinancialDataSEC:
             print("Complete cleanup.\n")
 
 
+def statement_facts(finData, index, tags=None, first=False):
+    """
+    Select pro-forma statement items from SEC financial data.
+
+    Keeps one value per company, item, period end and duration:
+    the most preferred tag of the latest filing, or of the first filing
+    if first, i.e. the value as originally reported and the date it
+    became known, for point-in-time panels.
+    """
+    tags = tags or CONFIG["statementTags"]
+    mapping = pd.DataFrame(
+        [(tag, field, rank) for field, fieldTags in tags.items()
+         for rank, tag in enumerate(fieldTags)],
+        columns=["tag", "field", "rank"]).set_index("tag")
+
+    facts = finData if "adsh" in finData.columns else finData.reset_index()
+    facts = facts[facts["tag"].isin(mapping.index)]
+    if "coreg" in facts.columns:
+        # consolidated entity only
+        facts = facts[facts["coreg"].isna()]
+    facts = facts[["adsh", "tag", "ddate", "qtrs", "value"]].dropna()
+    durations = facts["tag"].isin(CONFIG["statementDurationTags"])
+    if durations.any():
+        fallback = facts[durations].sort_values("qtrs").drop_duplicates(
+            ["adsh", "tag", "ddate"])
+        facts = pd.concat([facts[~durations], fallback.assign(qtrs=0)])
+    facts = facts.join(mapping, on="tag")
+    facts = facts.join(index[["cik", "filed", "form"]], on="adsh")
+
+    # align signs to YahooFinance conventions of financials module
+    signs = facts["field"].map(CONFIG["statementSigns"]).fillna(1)
+    facts["value"] = facts["value"] * signs
+
+    if first:
+        facts = facts.sort_values(
+            ["cik", "field", "ddate", "qtrs", "filed", "rank"],
+            ascending=[True, True, True, True, False, False])
+    else:
+        facts = facts.sort_values(
+            ["cik", "field", "ddate", "qtrs", "rank", "filed"],
+            ascending=[True, True, True, True, False, True])
+    facts = facts.drop_duplicates(["cik", "field", "ddate", "qtrs"],
+                                  keep="last")
+    return facts[[
+        "cik", "field", "ddate", "qtrs", "value", "filed", "form", "adsh"
+    ]].reset_index(drop=True)
+
+
 def main():
     # initialize DataSEC instance
     findata = FinancialDataSEC()
@@ -223,7 +481,11 @@ def main():
 
     # Parse collected data
     findata.parse_index()
+    findata.build_symbols()
     findata.parse_findata()
+    findata.deduplicate()
+    findata.build_panel()
+    findata.build_store()
 
     # Cleanup redundant files
     findata.cleanup()
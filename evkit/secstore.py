@@ -0,0 +1,366 @@
+"""
+Quarter partitioned store of SEC facts with a scan query API.
+
+Every data set quarter is written as chunks of typed column arrays:
+    <root>/quarter=<yyyyqn>/chunk-<n>.npz
+rows of a quarter are sorted by tag, cik and period end before
+chunking, so chunks cover narrow tag ranges. String columns are stored
+as int32 codes of a sorted vocabulary of the chunk (<column>Vocab),
+chunks are compressed. A json manifest keeps
+min/max statistics of every chunk (tag, cik, fiscal year, period end,
+filing date, value) and its forms. A scan prunes quarters and chunks
+from the manifest, reads filter columns of the remaining chunks first,
+other columns of matching rows only, and yields one DataFrame per chunk;
+memory stays bounded by the chunk size.
+
+python -m evkit.secstore --tag LongTermDebt --form 10-K --fy 2015 2019
+"""
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "path": "data/sec_store/",
+    "manifest": "manifest.json",
+    "chunkRows": 250_000,
+    "compress": True,
+}
+
+# column types, num.txt facts joined with sub.txt filing attributes
+COLUMNS = {
+    "adsh": str,
+    "cik": np.int64,
+    "form": str,
+    "fy": np.int16,
+    "filed": np.int32,
+    "tag": str,
+    "ddate": np.int32,
+    "qtrs": np.int8,
+    "uom": str,
+    "value": np.float64,
+}
+# columns with min/max statistics in the manifest
+STATS = ("tag", "cik", "fy", "ddate", "filed", "value")
+
+
+# -------------------- Helper Functions --------------------
+def to_columns(facts):
+    """ Typed column arrays of a frame of facts, missing numbers as 0 """
+    columns = {}
+    for column, dtype in COLUMNS.items():
+        values = facts[column] if column in facts.columns else None
+        if dtype is str:
+            columns[column] = np.full(len(facts), "") if values is None \
+                else values.fillna("").astype(str).to_numpy(dtype=str)
+        elif dtype is np.float64:
+            columns[column] = values.to_numpy(dtype=dtype, na_value=np.nan)
+        else:
+            columns[column] = np.zeros(len(facts), dtype) if values is None \
+                else values.fillna(0).to_numpy(dtype=dtype)
+    return columns
+
+
+def encode(columns):
+    """ Arrays of a chunk to save, strings as codes of a vocabulary """
+    arrays = {}
+    for column, values in columns.items():
+        if COLUMNS[column] is str:
+            vocab, codes = np.unique(values, return_inverse=True)
+            arrays[column] = codes.astype(np.int32)
+            arrays[column + "Vocab"] = vocab
+        else:
+            arrays[column] = values
+    return arrays
+
+
+def read_column(arrays, column, mask=None):
+    """ Values of a column of a saved chunk, rows of mask only """
+    values = arrays[column]
+    if mask is not None:
+        values = values[mask]
+    if column + "Vocab" in arrays.files:
+        values = arrays[column + "Vocab"][values]
+    return values
+
+
+def isin(arrays, column, wanted):
+    """ Rows of a saved chunk with a value of a column in wanted """
+    if column + "Vocab" in arrays.files:
+        # match the vocabulary, then look up codes
+        return np.isin(arrays[column + "Vocab"], wanted)[arrays[column]]
+    return np.isin(arrays[column], wanted)
+
+
+def chunk_stats(columns):
+    """ Manifest statistics of a chunk of column arrays """
+    stats = {"rows": len(columns["tag"])}
+    for column in STATS:
+        values = columns[column]
+        if values.dtype.kind == "f":
+            values = values[np.isfinite(values)]
+        if not len(values):
+            stats[column] = None
+        elif values.dtype.kind == "U":
+            stats[column] = [str(min(values)), str(max(values))]
+        else:
+            stats[column] = [values.min().item(), values.max().item()]
+    stats["forms"] = sorted(set(columns["form"].tolist()))
+    return stats
+
+
+def as_range(bounds):
+    """ (low, high) of a value, a pair or None, None for open ends """
+    if bounds is None:
+        return None, None
+    if isinstance(bounds, (tuple, list)):
+        return bounds[0], bounds[1]
+    return bounds, bounds
+
+
+def overlaps(stats, low, high):
+    """ Whether a [min, max] statistic may hold values in [low, high] """
+    if low is None and high is None:
+        return True
+    if stats is None:
+        return False
+    return (low is None or stats[1] >= low) and \
+        (high is None or stats[0] <= high)
+
+
+# -------------------- SEC Store --------------------
+class SECStore:
+    """
+    Class for quarter partitioned SEC facts with pushdown scans.
+    """
+
+    def __init__(self, path=None):
+        self.path = os.path.join(path or CONFIG["path"], "")
+        self.verbose = CONFIG["verbose"]
+        self.chunkRows = CONFIG["chunkRows"]
+        self.manifestFile = self.path + CONFIG["manifest"]
+        self.manifest = self.read_manifest()
+
+    def read_manifest(self):
+        if not os.path.exists(self.manifestFile):
+            return {}
+        with open(self.manifestFile, "r") as file:
+            return json.load(file)
+
+    def write_manifest(self):
+        # replace atomically, readers never see a partial manifest
+        temp = self.manifestFile + ".tmp"
+        with open(temp, "w") as file:
+            json.dump(self.manifest, file, indent=1)
+        os.replace(temp, self.manifestFile)
+
+    @property
+    def quarters(self):
+        return sorted(self.manifest)
+
+    # -------------------- Writer --------------------
+    def write_quarter(self, quarter, finData, index):
+        """
+        Replace the partition of a data set quarter, e.g. 2019q4, with
+        facts of num.txt (finData) and filings of sub.txt (index).
+        Returns the number of chunks written.
+        """
+        facts = finData if "adsh" in finData.columns else \
+            finData.reset_index()
+        if "coreg" in facts.columns:
+            # consolidated entity only
+            facts = facts[facts["coreg"].isna()]
+        attributes = [c for c in ("cik", "form", "fy", "filed")
+                      if c in index.columns]
+        facts = facts.join(index[attributes], on="adsh")
+        columns = to_columns(facts)
+        order = np.lexsort((columns["ddate"], columns["cik"], columns["tag"]))
+
+        directory = os.path.join(self.path, f"quarter={quarter}")
+        self.remove_quarter(quarter)
+        os.makedirs(directory)
+        chunks = []
+        for n, start in enumerate(range(0, len(order), self.chunkRows)):
+            rows = order[start:start + self.chunkRows]
+            chunk = {column: array[rows] for column, array in columns.items()}
+            path = os.path.join(directory, f"chunk-{n}.npz")
+            save = np.savez_compressed if CONFIG["compress"] else np.savez
+            save(path, **encode(chunk))
+            chunks.append({
+                "file": os.path.relpath(path, self.path),
+                **chunk_stats(chunk)
+            })
+        self.manifest[quarter] = chunks
+        self.write_manifest()
+        if self.verbose:
+            print(f"Stored {len(order)} facts of {quarter} "
+                  f"in {len(chunks)} chunks")
+        return len(chunks)
+
+    def import_quarter(self, directory, quarter=None):
+        """ Add an extracted data set, a directory with sub.txt, num.txt """
+        import pandas as pd
+
+        quarter = quarter or os.path.basename(os.path.normpath(directory))
+        read = dict(sep="\t", low_memory=False)
+        index = pd.read_csv(os.path.join(directory, "sub.txt"),
+                            index_col="adsh",
+                            **read)
+        finData = pd.read_csv(os.path.join(directory, "num.txt"), **read)
+        return self.write_quarter(quarter, finData, index)
+
+    def remove_quarter(self, quarter):
+        directory = os.path.join(self.path, f"quarter={quarter}")
+        for chunk in self.manifest.pop(quarter, []):
+            os.remove(self.path + chunk["file"])
+        if os.path.exists(directory):
+            os.rmdir(directory)
+
+    # -------------------- Scan --------------------
+    def chunks(self,
+               tags=None,
+               forms=None,
+               fy=None,
+               value=None,
+               ddate=None,
+               ciks=None,
+               quarters=None):
+        """ Manifest entries of chunks that may hold matching rows """
+        first, last = as_range(quarters)
+        tags = None if tags is None else sorted(tags)
+        forms = None if forms is None else set(forms)
+        ciks = None if ciks is None else sorted(int(cik) for cik in ciks)
+        ranges = {
+            "fy": as_range(fy),
+            "value": as_range(value),
+            "ddate": as_range(ddate),
+        }
+        entries = []
+        for quarter in self.quarters:
+            if (first is not None and quarter < first) or \
+                    (last is not None and quarter > last):
+                continue
+            for chunk in self.manifest[quarter]:
+                if tags is not None and not overlaps(chunk["tag"], tags[0],
+                                                     tags[-1]):
+                    continue
+                if ciks is not None and not overlaps(chunk["cik"], ciks[0],
+                                                     ciks[-1]):
+                    continue
+                if forms is not None and forms.isdisjoint(chunk["forms"]):
+                    continue
+                if not all(
+                        overlaps(chunk[column], *bounds)
+                        for column, bounds in ranges.items()):
+                    continue
+                entries.append(chunk)
+        return entries
+
+    def scan(self,
+             tags=None,
+             forms=None,
+             fy=None,
+             value=None,
+             ddate=None,
+             ciks=None,
+             quarters=None,
+             columns=None):
+        """
+        Iterate over DataFrames of facts matching every filter:
+        tags, forms and ciks are collections, fy, value, ddate and
+        quarters are a value or an inclusive (low, high) range with
+        None for an open end. Yields one frame per chunk with matches.
+        """
+        import pandas as pd
+
+        columns = list(COLUMNS if columns is None else columns)
+        filters = {
+            "tag": None if tags is None else np.array(sorted(tags)),
+            "form": None if forms is None else np.array(sorted(forms)),
+            "cik": None if ciks is None else np.array(sorted(ciks)),
+        }
+        ranges = {
+            "fy": as_range(fy),
+            "value": as_range(value),
+            "ddate": as_range(ddate),
+        }
+        for chunk in self.chunks(tags, forms, fy, value, ddate, ciks,
+                                 quarters):
+            with np.load(self.path + chunk["file"]) as arrays:
+                # read filter columns first, stop at the first empty mask
+                mask = np.ones(chunk["rows"], dtype=bool)
+                for column, wanted in filters.items():
+                    if wanted is not None and mask.any():
+                        mask &= isin(arrays, column, wanted)
+                for column, (low, high) in ranges.items():
+                    if (low is None and high is None) or not mask.any():
+                        continue
+                    values = arrays[column]
+                    if low is not None:
+                        mask &= values >= low
+                    if high is not None:
+                        mask &= values <= high
+                if not mask.any():
+                    continue
+                yield pd.DataFrame({
+                    column: read_column(arrays, column, mask)
+                    for column in columns
+                })
+
+    def query(self, **filters):
+        """ Facts matching the filters of scan as one DataFrame """
+        import pandas as pd
+
+        frames = list(self.scan(**filters))
+        if not frames:
+            columns = filters.get("columns") or list(COLUMNS)
+            return pd.DataFrame(columns=columns)
+        return pd.concat(frames, ignore_index=True)
+
+
+# -------------------- Command Line --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Scan the quarter partitioned store of SEC facts.')
+    parser.add_argument('--path', default=CONFIG['path'])
+    parser.add_argument('--tag', nargs='+', help='us-gaap tags')
+    parser.add_argument('--form', nargs='+', help='e.g. 10-K 10-K/A')
+    parser.add_argument('--fy',
+                        nargs=2,
+                        type=int,
+                        metavar=('FIRST', 'LAST'),
+                        help='range of fiscal years')
+    parser.add_argument('--quarters',
+                        nargs=2,
+                        metavar=('FIRST', 'LAST'),
+                        help='range of data set quarters, e.g. 2015q1')
+    parser.add_argument('--min-value', type=float)
+    parser.add_argument('--max-value', type=float)
+    parser.add_argument('--output', help='csv file, stdout by default')
+    args = parser.parse_args(argv)
+
+    value = None
+    if args.min_value is not None or args.max_value is not None:
+        value = (args.min_value, args.max_value)
+    scan = SECStore(args.path).scan(tags=args.tag,
+                                    forms=args.form,
+                                    fy=args.fy,
+                                    value=value,
+                                    quarters=args.quarters)
+    output = open(args.output, "w") if args.output else None
+    header = True
+    for frame in scan:
+        text = frame.to_csv(output, index=False, header=header)
+        if text is not None:
+            print(text, end="")
+        header = False
+    if output is not None:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,541 @@
+"""
+Valuation service over a warm in-memory universe.
+
+Statement arrays and market inputs of a universe are loaded once and
+kept in memory; requests value slices of them with
+valuation.value_universe, without fetching pages:
+    GET  /value/<ticker>?wacc=0.09&lt_growth=0.02&horizon=5
+    POST /value        {"tickers": [...], "wacc": 0.09, ...}
+    GET  /sensitivity/<ticker>?wacc=0.07,0.08,0.09&lt_growth=0.01,0.02
+    GET  /health, /stats (json), /metrics (Prometheus text)
+Market inputs (rf, mrp, equity betas and closes) are refreshed by a
+background thread and swapped in at once, requests in flight keep the
+inputs they started with.
+
+python -m evkit.service --universe data/universe.npz --port 8050
+python -m evkit.service --build --universe data/universe.npz
+"""
+
+import argparse
+import collections
+import http.server
+import json
+import os
+import threading
+import time
+import urllib.parse
+
+import numpy as np
+
+from evkit import beta, metrics, utils, valuation
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "host": "127.0.0.1",
+    "port": 8050,
+    "path": {
+        "universe": "data/universe.npz",
+    },
+    "assumptions": {
+        "horizon": 5,
+        "riskFree": 0.025,
+        "marketPremium": 0.055,
+    },
+    "refreshInterval": 3600,  # seconds between refreshes of market inputs
+    "maxTickers": 10_000,  # tickers of a batch request
+    "maxGrid": 400,  # wacc x lt_growth points of a sensitivity request
+    "latencyWindow": 10_000,  # latest requests of latency percentiles
+}
+
+# results of the terminal value, undefined for wacc <= lt_growth
+TERMINAL = ("enterprise_value, $B", "equity_value, $B", "stock_price")
+
+
+# -------------------- Helper Functions --------------------
+def to_json(value):
+    """ json friendly value of numpy results, None for NaN and infinity """
+    if isinstance(value, dict):
+        return {key: to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, np.ndarray)):
+        return [to_json(item) for item in value]
+    if isinstance(value, (float, np.floating)):
+        return float(value) if np.isfinite(value) else None
+    return value
+
+
+def mask_terminal(results, wacc, lt_growth=None):
+    """ NaN results of rates without a terminal value, wacc <= lt_growth """
+    wacc = np.asarray(wacc, dtype=float)
+    growth = wacc * 0.5 if lt_growth is None else \
+        np.asarray(lt_growth, dtype=float)
+    invalid = wacc <= growth
+    for key in TERMINAL:
+        results[key] = np.where(invalid, np.nan, results[key])
+    return results
+
+
+def parse_rates(text):
+    """ Floats of a comma separated query value, None if it is empty """
+    if not text:
+        return None
+    return [float(rate) for rate in text.split(",")]
+
+
+def get_horizon(horizon=None):
+    """ Forecast periods, the default if None """
+    if horizon is None:
+        return CONFIG["assumptions"]["horizon"]
+    if isinstance(horizon, bool) or \
+            not isinstance(horizon, (int, np.integer)) or horizon < 1:
+        raise ValueError(f"horizon must be a positive integer, "
+                         f"got {horizon!r}")
+    return horizon
+
+
+# -------------------- Universe --------------------
+class Universe:
+    """
+    Class for statement arrays and market inputs of tickers.
+    """
+
+    def __init__(self, tickers, statements, equity_beta, num_shares,
+                 mkt_price=None, unit=1_000_000):
+        self.tickers = np.asarray(tickers, dtype=str)
+        self.statements = {
+            field: np.asarray(statements[field], dtype=float)
+            for field in valuation.FIELDS
+        }
+        size = len(self.tickers)
+        self.inputs = {
+            "equity_beta": np.asarray(equity_beta, dtype=float),
+            "num_shares": np.asarray(num_shares, dtype=float),
+            "mkt_price": np.full(size, np.nan) if mkt_price is None else
+            np.asarray(mkt_price, dtype=float),
+        }
+        self.unit = unit
+        self.rows = {ticker: row for row, ticker in enumerate(self.tickers)}
+
+    def __len__(self):
+        return len(self.tickers)
+
+    @classmethod
+    def from_screener(cls, screen, symbol_index=None):
+        """
+        Universe of SEC filers of a computed Screener, tickers of the
+        symbol index, CIK-<cik> for filers without a ticker.
+        """
+        from evkit import screener
+
+        ciks = screen.screen.index.to_numpy()
+        tickers = [
+            (symbol_index.ticker(cik) if symbol_index else None) or
+            f"CIK-{cik}" for cik in ciks
+        ]
+        default = screener.CONFIG["assumptions"]["equityBeta"]
+        betas = np.full(len(ciks), default)
+        if screen.betas is not None:
+            betas = screen.betas.reindex(ciks).fillna(default).to_numpy()
+        prices = None if screen.prices is None else \
+            screen.prices.reindex(ciks).to_numpy(dtype=float)
+        return cls(tickers,
+                   screen.statements,
+                   equity_beta=betas,
+                   num_shares=screen.screen["shares"].to_numpy(dtype=float),
+                   mkt_price=prices,
+                   unit=screener.CONFIG["unit"])
+
+    def save(self, path=None):
+        path = path or CONFIG["path"]["universe"]
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        np.savez(path,
+                 ticker=self.tickers,
+                 unit=self.unit,
+                 **self.statements,
+                 **self.inputs)
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        with np.load(path or CONFIG["path"]["universe"]) as arrays:
+            return cls(arrays["ticker"],
+                       {field: arrays[field]
+                        for field in valuation.FIELDS},
+                       equity_beta=arrays["equity_beta"],
+                       num_shares=arrays["num_shares"],
+                       mkt_price=arrays["mkt_price"],
+                       unit=arrays["unit"].item())
+
+    def select(self, tickers):
+        """ Rows of tickers, KeyError of the first unknown ticker """
+        return np.array([self.rows[ticker] for ticker in tickers],
+                        dtype=np.int64)
+
+
+def market_inputs(universe):
+    """
+    Latest rf, mrp of utils.get_rf_mrp and, with a local price history,
+    betas and closes of evkit.beta; missing sources are left out.
+    """
+    inputs = {}
+    rf, mrp = utils.get_rf_mrp()
+    if rf is not None and mrp is not None:
+        inputs.update(rf=rf, mrp=mrp)
+    if os.path.exists(beta.CONFIG["path"]["prices"]):
+        table = beta.BetaEngine().compute()
+        rows = {ticker: row for row, ticker in enumerate(table["ticker"])}
+        found = np.array([ticker in rows for ticker in universe.tickers])
+        index = [rows[t] for t in universe.tickers[found]]
+        for name, column in (("equity_beta", "beta"), ("mkt_price", "close")):
+            values = universe.inputs[name].copy()
+            values[found] = table[column][index]
+            inputs[name] = values
+    return inputs
+
+
+# -------------------- Service --------------------
+class ValuationService:
+    """
+    Class for valuation requests over a warm universe.
+    """
+
+    def __init__(self, universe, market=market_inputs, refresh=None):
+        self.verbose = CONFIG["verbose"]
+        self.universe = universe
+        self.market = market  # callable of the universe, dict of inputs
+        self.refreshInterval = CONFIG["refreshInterval"] if refresh is None \
+            else refresh
+        # inputs are replaced as a whole, never updated in place
+        self.inputs = {
+            "rf": CONFIG["assumptions"]["riskFree"],
+            "mrp": CONFIG["assumptions"]["marketPremium"],
+            **universe.inputs,
+            "refreshed": None,
+        }
+        self.lock = threading.Lock()
+        self.latencies = collections.deque(maxlen=CONFIG["latencyWindow"])
+        self.requests = collections.Counter()
+        self.started = time.monotonic()
+        self.stopped = threading.Event()
+        self.refresher = None
+        self.server = None
+        self.thread = None
+
+    # -------------------- Market Inputs --------------------
+    def refresh(self):
+        """ Swap in the latest market inputs, keep them on failure """
+        try:
+            with metrics.timer("service_refresh_seconds"):
+                update = self.market(self.universe) if self.market else {}
+        except Exception as error:
+            metrics.inc("service_refresh_errors_total")
+            if self.verbose:
+                print(f"Refresh of market inputs failed: {error}")
+            return False
+        self.inputs = {**self.inputs, **update, "refreshed": time.time()}
+        metrics.inc("service_refresh_total")
+        return True
+
+    def _refresh_loop(self):
+        while not self.stopped.wait(self.refreshInterval):
+            self.refresh()
+
+    # -------------------- Valuation --------------------
+    def value(self, tickers, wacc=None, lt_growth=None, horizon=None,
+              rf=None, mrp=None):
+        """ {ticker: results} of tickers, rates override the estimates """
+        if len(tickers) > CONFIG["maxTickers"]:
+            raise ValueError(f"More than {CONFIG['maxTickers']} tickers")
+        rows = self.universe.select(tickers)
+        inputs = self.inputs
+        results = valuation.value_universe(
+            {
+                field: values[rows]
+                for field, values in self.universe.statements.items()
+            },
+            equity_beta=inputs["equity_beta"][rows],
+            num_shares=inputs["num_shares"][rows],
+            mkt_price=None,
+            rf=inputs["rf"] if rf is None else rf,
+            mrp=inputs["mrp"] if mrp is None else mrp,
+            horizon=get_horizon(horizon),
+            unit=self.universe.unit,
+            wacc=wacc,
+            lt_growth=lt_growth)
+        if wacc is not None:
+            mask_terminal(results, wacc, lt_growth)
+        # quotes are reported, missing ones do not invalidate the value
+        results["mkt_stock_price"] = inputs["mkt_price"][rows]
+        return {
+            ticker: {key: values[i] for key, values in results.items()}
+            for i, ticker in enumerate(tickers)
+        }
+
+    def sensitivity(self, ticker, wacc, lt_growth=None, horizon=None):
+        """
+        Stock prices of a ticker on a grid of wacc (rows) and lt_growth
+        (columns), lt_growth of half the wacc if None.
+        """
+        wacc = np.asarray(wacc, dtype=float)
+        growth = None if lt_growth is None else \
+            np.asarray(lt_growth, dtype=float)
+        shape = (len(wacc), 1 if growth is None else len(growth))
+        if shape[0] * shape[1] > CONFIG["maxGrid"]:
+            raise ValueError(f"More than {CONFIG['maxGrid']} grid points")
+        row = self.universe.select([ticker])[0]
+        inputs = self.inputs
+        statements = {
+            field: np.broadcast_to(values[row], (*shape, valuation.HISTORY))
+            for field, values in self.universe.statements.items()
+        }
+        results = valuation.value_universe(
+            statements,
+            equity_beta=np.broadcast_to(inputs["equity_beta"][row], shape),
+            num_shares=np.broadcast_to(inputs["num_shares"][row], shape),
+            mkt_price=None,
+            rf=inputs["rf"],
+            mrp=inputs["mrp"],
+            horizon=get_horizon(horizon),
+            unit=self.universe.unit,
+            wacc=wacc[:, np.newaxis],
+            lt_growth=wacc[:, np.newaxis] * 0.5 if growth is None else
+            growth[np.newaxis, :])
+        mask_terminal(results, wacc[:, np.newaxis],
+                      None if growth is None else growth[np.newaxis, :])
+        return {
+            "ticker": ticker,
+            "wacc": wacc,
+            "lt_growth": growth,
+            "stock_price": results["stock_price"],
+            "mkt_stock_price": inputs["mkt_price"][row],
+        }
+
+    # -------------------- Metrics --------------------
+    def record(self, endpoint, status, seconds):
+        with self.lock:
+            self.latencies.append(seconds)
+            self.requests[status] += 1
+        metrics.inc("service_requests_total", endpoint=endpoint,
+                    status=status)
+        metrics.observe("service_request_seconds", seconds,
+                        endpoint=endpoint)
+
+    def stats(self):
+        """ Throughput and latency percentiles of the latest requests """
+        with self.lock:
+            latencies = np.array(self.latencies)
+            requests = dict(self.requests)
+        elapsed = time.monotonic() - self.started
+        total = sum(requests.values())
+        percentiles = {}
+        if len(latencies):
+            for q in (50, 90, 99):
+                percentiles[f"p{q}, ms"] = round(
+                    float(np.percentile(latencies, q)) * 1000, 3)
+        inputs = self.inputs
+        return {
+            "tickers": len(self.universe),
+            "requests": total,
+            "statuses": {str(k): v for k, v in sorted(requests.items())},
+            "requests/s": round(total / elapsed, 1) if elapsed else 0,
+            "latency": percentiles,
+            "rf": inputs["rf"],
+            "mrp": inputs["mrp"],
+            "refreshed": inputs["refreshed"],
+        }
+
+    # -------------------- Server --------------------
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def start(self, host=None, port=None, refresh=True):
+        """ Serve requests, and refresh inputs, on daemon threads """
+        # the registry backs /metrics
+        metrics.enable()
+        host = host or CONFIG["host"]
+        port = CONFIG["port"] if port is None else port
+        self.server = http.server.ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self.server.service = self
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name="service",
+                                       daemon=True)
+        self.thread.start()
+        if refresh and self.market is not None:
+            self.refresher = threading.Thread(target=self._refresh_loop,
+                                              name="refresh",
+                                              daemon=True)
+            self.refresher.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """ Request handler of the valuation service """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.handle_request()
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            body = None
+        self.handle_request(body)
+
+    def handle_request(self, body=None):
+        start = time.perf_counter()
+        url = urllib.parse.urlsplit(self.path)
+        parts = [
+            urllib.parse.unquote(part) for part in url.path.split("/")
+            if part
+        ]
+        endpoint = parts[0] if parts else ""
+        query = {
+            key: values[-1]
+            for key, values in urllib.parse.parse_qs(url.query).items()
+        }
+        try:
+            status, payload = self.route(parts, query, body)
+        except KeyError as error:
+            status, payload = 404, {"error": f"Unknown ticker {error}"}
+        except (TypeError, ValueError) as error:
+            status, payload = 400, {"error": str(error)}
+        except Exception as error:
+            # a failing request does not take down its handler thread
+            status, payload = 500, {
+                "error": f"{type(error).__name__}: {error}"
+            }
+        if endpoint == "metrics" and status == 200:
+            content, contentType = payload.encode(), "text/plain"
+        else:
+            content = json.dumps(to_json(payload)).encode()
+            contentType = "application/json"
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+        self.server.service.record(endpoint, status,
+                                   time.perf_counter() - start)
+
+    def route(self, parts, query, body):
+        service = self.server.service
+        endpoint = parts[0] if parts else ""
+        if self.command == "POST":
+            if endpoint != "value" or len(parts) != 1:
+                return 404, {"error": "Not Found"}
+            if not isinstance(body, dict) or \
+                    not isinstance(body.get("tickers"), list):
+                raise ValueError("Body must be json with a tickers list")
+            options = {
+                key: body[key]
+                for key in ("wacc", "lt_growth", "horizon", "rf", "mrp")
+                if body.get(key) is not None
+            }
+            return 200, service.value(body["tickers"], **options)
+        if endpoint == "value" and len(parts) == 2:
+            options = {
+                key: float(query[key])
+                for key in ("wacc", "lt_growth", "rf", "mrp") if key in query
+            }
+            if "horizon" in query:
+                options["horizon"] = int(query["horizon"])
+            return 200, service.value([parts[1]], **options)[parts[1]]
+        if endpoint == "sensitivity" and len(parts) == 2:
+            wacc = parse_rates(query.get("wacc"))
+            if wacc is None:
+                raise ValueError("wacc values are required")
+            horizon = int(query["horizon"]) if "horizon" in query else None
+            return 200, service.sensitivity(parts[1], wacc,
+                                            parse_rates(
+                                                query.get("lt_growth")),
+                                            horizon)
+        if endpoint == "health" and len(parts) == 1:
+            return 200, {"status": "ok", "tickers": len(service.universe)}
+        if endpoint == "stats" and len(parts) == 1:
+            return 200, service.stats()
+        if endpoint == "metrics" and len(parts) == 1:
+            return 200, metrics.REGISTRY.prometheus()
+        return 404, {"error": "Not Found"}
+
+    def log_message(self, *args):
+        pass
+
+
+# -------------------- Command Line --------------------
+def build_universe(path=None):
+    """ Universe of every SEC filer of the persisted data sets """
+    from evkit import screener, sec_datareader, symbols
+
+    index, finData = sec_datareader.FinancialDataSEC().load()
+    screen = screener.Screener(finData, index)
+    screen.compute()
+    symbolIndex = None
+    if os.path.exists(symbols.CONFIG["path"]):
+        symbolIndex = symbols.SymbolIndex.load()
+    return Universe.from_screener(screen, symbolIndex).save(path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve valuations of a warm universe over http.')
+    parser.add_argument('--universe',
+                        default=CONFIG['path']['universe'],
+                        help='npz of statement arrays and market inputs')
+    parser.add_argument('--build',
+                        action='store_true',
+                        help='build the universe of SEC filers and exit')
+    parser.add_argument('--host', default=CONFIG['host'])
+    parser.add_argument('--port', type=int, default=CONFIG['port'])
+    parser.add_argument('--refresh',
+                        type=float,
+                        default=CONFIG['refreshInterval'],
+                        help='seconds between refreshes of market inputs')
+    parser.add_argument('--offline',
+                        action='store_true',
+                        help='keep the market inputs of the universe file')
+    args = parser.parse_args(argv)
+
+    if args.build:
+        print(f"Universe saved to {build_universe(args.universe)}")
+        return
+
+    universe = Universe.load(args.universe)
+    service = ValuationService(universe,
+                               market=None if args.offline else
+                               market_inputs,
+                               refresh=args.refresh)
+    if not args.offline:
+        service.refresh()
+    service.start(args.host, args.port)
+    print(f"Serving valuations of {len(universe)} tickers on {service.url}")
+    try:
+        service.thread.join()
+    except KeyboardInterrupt:
+        print(json.dumps(to_json(service.stats()), indent=1))
+    finally:
+        service.stop()
+
+
+if __name__ == "__main__":
+    main()
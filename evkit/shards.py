@@ -0,0 +1,286 @@
+"""
+Sharded batch valuation across processes and nodes.
+
+A universe is split into shards by a stable hash of its tickers (crc32,
+unlike hash() the same in every process), so nodes agree on the shard
+of a ticker without coordination:
+1/ run_shard values the tickers of one shard into its own sink,
+   <output>/<run id>.shard-<i>-of-<n>.jsonl, resumed on restart as the
+   sink of run_batch; a .done.json marker is written once it completes.
+   The first shard saves the universes of the run to <run id>.plan.json,
+   later shards must run on the same universes
+2/ merge compacts the sinks of all shards into the csv reports of the
+   planned universes, in universe order, whatever order shards
+   completed in, or whenever screeners are scraped again
+Nodes write to a shared output directory, or their shard files are
+copied into one, and use the same run id (dated report id by default).
+
+python -m evkit.launcher all --shard 0/4 --run-id all-20200601
+python -m evkit.launcher all --merge 4 --run-id all-20200601
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+import zlib
+
+import numpy as np
+
+from evkit import metrics, runner, sink, utils
+
+
+# -------------------- Helper Functions --------------------
+def shard_of(tickers, shards):
+    """ Shard of every ticker, stable across processes and nodes """
+    return np.array(
+        [zlib.crc32(ticker.encode()) % shards for ticker in tickers],
+        dtype=np.int64)
+
+
+def split(tickers_df, shards):
+    """ DataFrames of tickers of every shard, universe index kept """
+    owners = shard_of(tickers_df.ticker, shards)
+    return [tickers_df[owners == shard] for shard in range(shards)]
+
+
+def parse_shard(text):
+    """ (shard, shards) of an I/N text, e.g. 0/4 """
+    shard, shards = (int(part) for part in text.split("/"))
+    if not 0 <= shard < shards:
+        raise ValueError(f"Shard {shard} of {shards} is out of range")
+    return shard, shards
+
+
+def sink_path(run_id, shard, shards, output=None):
+    output = output or runner.CONFIG["path"]["reports"]
+    return os.path.join(output, f"{run_id}.shard-{shard}-of-{shards}.jsonl")
+
+
+def done_path(path):
+    """ Marker of a complete shard next to its sink """
+    return path[:-len(".jsonl")] + ".done.json"
+
+
+def plan_path(run_id, output=None):
+    output = output or runner.CONFIG["path"]["reports"]
+    return os.path.join(output, f"{run_id}.plan.json")
+
+
+def universe_digest(universes):
+    """ Fingerprint of tickers and names of universes, in order """
+    digest = hashlib.md5()
+    for key, tickers_df in universes.items():
+        digest.update(
+            json.dumps([key, tickers_df.ticker.tolist(),
+                        tickers_df.name.tolist()]).encode())
+    return digest.hexdigest()
+
+
+def write_plan(universes, run_id, output=None):
+    """
+    Save the universes of a run, unless saved by another shard, whose
+    universes must be the same. Returns the digest of universes.
+    """
+    path = plan_path(run_id, output)
+    digest = universe_digest(universes)
+    if os.path.exists(path):
+        if read_plan(run_id, output)[1] != digest:
+            raise RuntimeError(f"Universes differ from those of run "
+                               f"{run_id} in {path}")
+        return digest
+    plan = {
+        "run_id": run_id,
+        "universe": digest,
+        "universes": {
+            key: {
+                "ticker": tickers_df.ticker.tolist(),
+                "name": tickers_df.name.tolist()
+            }
+            for key, tickers_df in universes.items()
+        },
+    }
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # nodes may save the plan at once, each to a file of its own
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".part",
+                                     delete=False) as file:
+        json.dump(plan, file)
+    os.replace(file.name, path)
+    return digest
+
+
+def read_plan(run_id, output=None):
+    """ Universes of a run by key and their digest """
+    import pandas as pd
+
+    with open(plan_path(run_id, output), "r") as file:
+        plan = json.load(file)
+    universes = {
+        key: pd.DataFrame(columns)
+        for key, columns in plan["universes"].items()
+    }
+    return universes, plan["universe"]
+
+
+# -------------------- Shards --------------------
+def run_shard(tickers_df,
+              report_key,
+              shard,
+              shards,
+              rf=None,
+              mrp=None,
+              horizon=None,
+              output=None,
+              run_id=None,
+              workers=None,
+              executor=None,
+              ordered=True,
+              task=runner.safe_value_ticker,
+              resume=True,
+              stream=None,
+              universes=None):
+    """
+    Value the tickers of one shard of a universe into the shard sink.
+    Tickers already in the sink are skipped; the sink is kept for merge.
+    universes of the union tickers_df are saved to the plan of the run,
+    {report_key: tickers_df} if None.
+    Returns the marker of a complete shard, None if interrupted.
+    """
+    if rf is None or mrp is None:
+        rf, mrp = utils.get_rf_mrp()
+    run_id = run_id or runner.get_report_id(report_key)
+    path = sink_path(run_id, shard, shards, output)
+    digest = write_plan(universes or {report_key: tickers_df}, run_id,
+                        output)
+    shard_df = split(tickers_df.reset_index(drop=True), shards)[shard]
+    # records keep the universe position of a ticker
+    positions = shard_df.index.to_numpy()
+
+    result_sink = sink.ResultSink(path, resume=resume)
+    if not resume and os.path.exists(done_path(path)):
+        os.remove(done_path(path))
+    done = result_sink.completed()
+    if runner.CONFIG["verbose"]:
+        print(f'-> Shard {shard}/{shards} of {run_id}: {len(shard_df)} of '
+              f'{len(tickers_df)} tickers, {len(done)} done', end='')
+
+    if stream is None:
+        stream = runner.iter_valuations(shard_df.ticker,
+                                        rf=rf,
+                                        mrp=mrp,
+                                        horizon=horizon,
+                                        workers=workers,
+                                        executor=executor,
+                                        ordered=ordered,
+                                        task=task,
+                                        skip=done)
+    else:
+        stream = stream(shard_df.ticker,
+                        rf=rf,
+                        mrp=mrp,
+                        horizon=horizon,
+                        skip=done)
+    try:
+        with result_sink:
+            for num, ticker, values in stream:
+                result_sink.write(int(positions[num]), ticker, values)
+                metrics.inc('tickers_total', outcome=runner.outcome(values))
+    except KeyboardInterrupt:
+        print('\n-> Program interrupted by user', end='')
+        return None
+
+    marker = {
+        "run_id": run_id,
+        "shard": shard,
+        "shards": shards,
+        "tickers": len(shard_df),
+        "universe": digest,
+        "rf": rf,
+        "mrp": mrp,
+        "completed": time.time(),
+    }
+    with open(done_path(path), "w") as file:
+        json.dump(marker, file, indent=1)
+    if runner.CONFIG["verbose"]:
+        print(f'\n-> Shard results saved to a file {path}', end='')
+    return marker
+
+
+def status(run_id, shards, output=None):
+    """ Markers of complete shards of a run, None for the others """
+    markers = []
+    for shard in range(shards):
+        path = done_path(sink_path(run_id, shard, shards, output))
+        if os.path.exists(path):
+            with open(path, "r") as file:
+                markers.append(json.load(file))
+        else:
+            markers.append(None)
+    return markers
+
+
+def merge(universes,
+          report_key,
+          shards,
+          output=None,
+          run_id=None,
+          store=None,
+          partial=False):
+    """
+    Reports of universes from the sinks of a sharded run of their union,
+    in universe order; the same for any completion order of shards.
+    Universes are those of the plan of the run if None, others raise
+    RuntimeError, as do incomplete shards, unless partial.
+    Returns a dict of report DataFrames by key.
+    """
+    output = output or runner.CONFIG["path"]["reports"]
+    run_id = run_id or runner.get_report_id(report_key)
+    if not os.path.exists(plan_path(run_id, output)):
+        raise RuntimeError(f"Run {run_id} has no plan of universes in "
+                           f"{output}")
+    planned, digest = read_plan(run_id, output)
+    if universes is None:
+        universes = planned
+    elif universe_digest(universes) != digest:
+        raise RuntimeError(f"Universes differ from those of run {run_id}")
+    markers = status(run_id, shards, output)
+    missing = [shard for shard, marker in enumerate(markers) if not marker]
+    if missing and not partial:
+        raise RuntimeError(f"Shards {missing} of {run_id} are not complete")
+    mismatched = [
+        shard for shard, marker in enumerate(markers)
+        if marker and marker.get("universe") != digest
+    ]
+    if mismatched:
+        raise RuntimeError(f"Shards {mismatched} of {run_id} ran on other "
+                           f"universes than its plan")
+    inputs = {(m["rf"], m["mrp"]) for m in markers if m}
+    if len(inputs) > 1 and runner.CONFIG["verbose"]:
+        print(f'-> Shards of {run_id} used different rf, mrp: '
+              f'{sorted(inputs)}', end='')
+
+    paths = [sink_path(run_id, shard, shards, output)
+             for shard in range(shards)]
+    union_df = runner.union(universes)
+    union_report = sink.compact(paths, union_df, report_id=run_id,
+                                output=output)
+    if len(universes) == 1:
+        [key] = universes
+        if store is not None:
+            store.write(union_report, sector=key)
+        return {key: union_report}
+    return runner.fan_out(union_report, universes, output=output,
+                          store=store)
+
+
+def cleanup(run_id, shards, output=None):
+    """ Remove sinks, markers and the plan of a merged run """
+    files = [plan_path(run_id, output)]
+    for shard in range(shards):
+        path = sink_path(run_id, shard, shards, output)
+        files.extend([path, done_path(path)])
+    for file in files:
+        if os.path.exists(file):
+            os.remove(file)
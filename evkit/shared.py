@@ -0,0 +1,266 @@
+"""
+Universe data shared by the processes of a pool.
+
+Statement arrays, market inputs and symbol maps of a loaded universe are
+published once, into a shared memory segment or a memory-mapped file,
+and workers attach to read-only numpy views instead of unpickling a
+copy per process:
+1/ SharedUniverse(arrays) copies the arrays into one segment and
+   describes their offsets, dtypes and shapes in a small picklable dict
+2/ attach(descriptor) maps the segment in a worker, zero-copy
+3/ the publisher removes the segment on close, also when a worker or
+   the run fails; segments of a crashed publisher are removed by the
+   multiprocessing resource tracker
+Arrays of numbers and fixed-width strings only, no object arrays.
+"""
+
+import atexit
+import concurrent.futures
+import functools
+import os
+import tempfile
+import uuid
+
+import numpy as np
+
+from evkit import valuation
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "backend": "memory",  # memory (shared memory) or file (np.memmap)
+    "path": None,  # directory of file segments, system temp by default
+    "align": 64,  # bytes, arrays start at cache line boundaries
+    "workers": os.cpu_count(),
+}
+
+# universe attached by the worker initializer
+UNIVERSE = None
+# segments attached by this process, name -> handle
+ATTACHED = {}
+
+
+# -------------------- Helper Functions --------------------
+def layout(arrays):
+    """ Offsets, dtypes and shapes of arrays packed in one buffer """
+    align = CONFIG["align"]
+    offset, entries = 0, {}
+    for key, array in arrays.items():
+        array = np.asarray(array)
+        if array.dtype.hasobject:
+            raise TypeError(f"Array {key} of objects can not be shared")
+        entries[key] = (offset, array.dtype.str, array.shape)
+        offset += -(-array.nbytes // align) * align
+    return entries, max(offset, 1)
+
+
+def views(buffer, entries):
+    """ Read-only arrays of a buffer laid out by entries """
+    arrays = {}
+    for key, (offset, dtype, shape) in entries.items():
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer,
+                           offset=offset)
+        array.flags.writeable = False
+        arrays[key] = array
+    return arrays
+
+
+# -------------------- Shared Universe --------------------
+class SharedUniverse:
+    """
+    Class for arrays published once for the workers of a pool.
+    """
+
+    def __init__(self, arrays, backend=None):
+        self.backend = backend or CONFIG["backend"]
+        self.entries, size = layout(arrays)
+        self.name = f"evkit-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.segment = None
+        if self.backend == "memory":
+            from multiprocessing import shared_memory
+            self.segment = shared_memory.SharedMemory(name=self.name,
+                                                      create=True,
+                                                      size=size)
+            buffer = self.segment.buf
+        elif self.backend == "file":
+            directory = CONFIG["path"] or tempfile.gettempdir()
+            self.name = os.path.join(directory, self.name + ".bin")
+            buffer = np.memmap(self.name, dtype=np.uint8, mode="w+",
+                               shape=(size, ))
+        else:
+            raise ValueError(f"Unknown backend {self.backend}")
+
+        for key, array in arrays.items():
+            offset, dtype, shape = self.entries[key]
+            target = np.ndarray(shape, dtype=np.dtype(dtype), buffer=buffer,
+                                offset=offset)
+            target[...] = array
+        if self.backend == "file":
+            buffer.flush()
+            del buffer
+        # remove the segment at exit if it is not closed before
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    @property
+    def descriptor(self):
+        """ Picklable description of the segment for attach """
+        return {
+            "backend": self.backend,
+            "name": self.name,
+            "entries": self.entries,
+        }
+
+    def arrays(self):
+        """ Read-only views of the publisher """
+        return attach(self.descriptor)
+
+    def close(self):
+        """ Detach views and remove the segment, safe to call twice """
+        detach(self.name)
+        if self.segment is not None:
+            try:
+                self.segment.close()
+            except BufferError:
+                # views of the publisher are still referenced
+                pass
+            try:
+                self.segment.unlink()
+            except FileNotFoundError:
+                pass
+            self.segment = None
+        elif self.backend == "file" and os.path.exists(self.name):
+            os.remove(self.name)
+        atexit.unregister(self.close)
+
+
+def attach(descriptor):
+    """ Read-only, zero-copy views of a published universe """
+    name = descriptor["name"]
+    if name not in ATTACHED:
+        if descriptor["backend"] == "memory":
+            from multiprocessing import shared_memory
+            segment = shared_memory.SharedMemory(name=name)
+            ATTACHED[name] = (segment, segment.buf)
+        else:
+            ATTACHED[name] = (None, np.memmap(name, dtype=np.uint8,
+                                              mode="r"))
+    return views(ATTACHED[name][1], descriptor["entries"])
+
+
+def detach(name):
+    """ Close the handle of an attached segment, views must be dropped """
+    segment, _ = ATTACHED.pop(name, (None, None))
+    if segment is not None:
+        try:
+            segment.close()
+        except BufferError:
+            # views are still referenced, the handle closes with them
+            pass
+
+
+# -------------------- Process Pool --------------------
+def init_worker(descriptor):
+    """ Attach the universe once per worker process """
+    global UNIVERSE
+    UNIVERSE = attach(descriptor)
+
+
+def _call(func, task):
+    return func(UNIVERSE, task)
+
+
+def map_universe(func, arrays, tasks, workers=None, backend=None):
+    """
+    Results of func(universe, task) of every task on a process pool,
+    in order of tasks; universe is a dict of read-only views of arrays,
+    published once for all workers. func must be importable.
+    """
+    workers = workers or CONFIG["workers"] or 1
+    with SharedUniverse(arrays, backend) as universe:
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=init_worker,
+                initargs=(universe.descriptor, )) as pool:
+            return list(pool.map(_call, [func] * len(tasks), tasks))
+
+
+def chunks(size, workers):
+    """ (start, stop) ranges splitting size rows over workers """
+    bounds = np.linspace(0, size, min(workers, size) + 1).astype(int)
+    return list(zip(bounds[:-1].tolist(), bounds[1:].tolist()))
+
+
+def _value_rows(universe, rows, fields, **assumptions):
+    """ valuation.value_universe of a range of companies """
+    start, stop = rows
+    statements = {field: universe[field][start:stop] for field in fields}
+    mkt_price = universe.get("mkt_price")
+    return valuation.value_universe(
+        statements,
+        equity_beta=universe["equity_beta"][start:stop],
+        num_shares=universe["num_shares"][start:stop],
+        mkt_price=None if mkt_price is None else mkt_price[start:stop],
+        **assumptions)
+
+
+def value_universe(statements,
+                   equity_beta,
+                   num_shares,
+                   mkt_price,
+                   rf,
+                   mrp,
+                   horizon=5,
+                   unit=1_000_000,
+                   workers=None):
+    """
+    valuation.value_universe over companies split across processes,
+    statement arrays shared instead of copied to every worker.
+    """
+    workers = workers or CONFIG["workers"] or 1
+    arrays = {
+        **statements,
+        "equity_beta": np.asarray(equity_beta, dtype=float),
+        "num_shares": np.asarray(num_shares, dtype=float),
+    }
+    if mkt_price is not None:
+        arrays["mkt_price"] = np.asarray(mkt_price, dtype=float)
+    size = len(arrays["equity_beta"])
+    if workers == 1 or size < 2:
+        return valuation.value_universe(statements, equity_beta, num_shares,
+                                        mkt_price, rf, mrp, horizon, unit)
+    func = functools.partial(_value_rows,
+                             fields=list(statements),
+                             rf=rf,
+                             mrp=mrp,
+                             horizon=horizon,
+                             unit=unit)
+    parts = map_universe(func, arrays, chunks(size, workers), workers)
+    return {
+        key: np.concatenate([part[key] for part in parts])
+        for key in parts[0]
+    }
+
+
+def remove_file_segments(path=None):
+    """ Remove file segments left by crashed publishers """
+    directory = path or CONFIG["path"] or tempfile.gettempdir()
+    for name in os.listdir(directory):
+        if name.startswith("evkit-") and name.endswith(".bin"):
+            pid = int(name.split("-")[1])
+            if not _alive(pid):
+                os.remove(os.path.join(directory, name))
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
@@ -0,0 +1,160 @@
+"""
+Append-only sink of valuation results.
+
+Every valued ticker is appended to a json lines file as soon as it
+completes, so a crashed or interrupted run keeps its partial results
+and a restarted run resumes by skipping tickers already in the sink;
+tickers that failed keep their error in the sink and are retried.
+The csv report is compacted from the sink.
+"""
+
+import json
+import math
+import os
+
+from evkit import utils, valuation
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "fsyncEvery": 16,  # records between fsync of the sink
+    "chunkSize": 10_000,  # records read at a time on compaction
+}
+
+
+class ResultSink:
+    """
+    Class for streaming valuation results to a json lines file.
+    """
+
+    def __init__(self, path, resume=True):
+        self.path = path
+        self.file = None
+        self.pending = 0  # records written since the last fsync
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        if not resume and os.path.exists(path):
+            os.remove(path)
+        self.repair()
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def repair(self):
+        """
+        Drop a partially written last record of a crashed run.
+        """
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as file:
+            file.seek(0, os.SEEK_END)
+            size = file.tell()
+            if size == 0:
+                return
+            file.seek(-1, os.SEEK_END)
+            if file.read(1) == b"\n":
+                return
+            # truncate after the last complete line
+            position = size
+            while position > 0:
+                step = min(4096, position)
+                position -= step
+                file.seek(position)
+                newline = file.read(step).rfind(b"\n")
+                if newline >= 0:
+                    file.truncate(position + newline + 1)
+                    return
+            file.truncate(0)
+
+    def completed(self):
+        """
+        Tickers already written to the sink, but for those whose latest
+        record is an error.
+        """
+        done = {}
+        if os.path.exists(self.path):
+            with open(self.path, "r") as file:
+                for line in file:
+                    record = json.loads(line)
+                    done[record["ticker"]] = "error" not in record
+        return {ticker for ticker, valued in done.items() if valued}
+
+    def open(self):
+        self.file = open(self.path, "a")
+        return self
+
+    def write(self, num, ticker, values):
+        """
+        Append results of a ticker.
+        """
+        record = {"num": num, "ticker": ticker}
+        for key in valuation.RESULTS:
+            value = values.get(key)
+            # json has no NaN, store missing values as null
+            if isinstance(value, float) and not math.isfinite(value):
+                value = None
+            record[key] = None if value is None else float(value)
+        if "error" in values:
+            record["error"] = str(values["error"])
+        self.file.write(json.dumps(record) + "\n")
+        self.file.flush()
+        self.pending += 1
+        if self.pending >= CONFIG["fsyncEvery"]:
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def close(self):
+        if self.file is not None:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.file.close()
+            self.file = None
+
+
+def read_sink(path):
+    """
+    Results of a sink, the latest record of every ticker.
+    """
+    import pandas as pd
+
+    chunks = pd.read_json(path,
+                          lines=True,
+                          chunksize=CONFIG["chunkSize"],
+                          dtype={key: float
+                                 for key in valuation.RESULTS})
+    results = pd.concat(chunks, ignore_index=True)
+    if results.empty:
+        return pd.DataFrame(columns=["num", "ticker", *valuation.RESULTS])
+    return results.drop_duplicates("ticker", keep="last")
+
+
+def compact(path, tickers_df, report_id, output="./reports/"):
+    """
+    Write csv report of a universe from its sink, in universe order.
+    path is a sink or a list of sinks, e.g. shards of a run; a ticker
+    in several sinks keeps the record of the last one.
+    Returns the report DataFrame.
+    """
+    import pandas as pd
+
+    paths = [path] if isinstance(path, str) else list(path)
+    frames = [
+        read_sink(path) for path in paths
+        if os.path.exists(path) and os.path.getsize(path) > 0
+    ]
+    if frames:
+        results = pd.concat(frames, ignore_index=True)
+        results = results.drop_duplicates("ticker", keep="last")
+        results = results.set_index("ticker")[list(valuation.RESULTS)]
+    else:
+        results = pd.DataFrame(columns=list(valuation.RESULTS), dtype=float)
+    tickers_df = tickers_df.reset_index(drop=True)
+    results_df = results.reindex(tickers_df.ticker).reset_index(drop=True)
+    report_df = pd.concat([tickers_df, results_df], axis=1)
+    utils.results_to_csv(data_df=report_df, report_id=report_id, path=output)
+    return report_df
@@ -0,0 +1,360 @@
+"""
+Local stand-in of YahooFinance and Morningstar pages.
+
+Serves summary, key statistics, statement and screener pages of
+synthetic companies, and the Morningstar index return page, with values
+at the td positions read by capital, financials and utils, so the
+scraping layer and launcher run end to end without leaving the host.
+Latency, error rate, throttling (429 above a request rate) and tickers
+with missing trading information are configurable; /stats returns
+counts of served requests.
+
+python -m evkit.standin --port 8000 --latency 0.05 --error-rate 0.01
+python -m evkit.launcher large_cap --yahoo-url http://127.0.0.1:8000/ \\
+    --morningstar-url http://127.0.0.1:8000/
+"""
+
+import argparse
+import collections
+import http.server
+import json
+import random
+import threading
+import time
+import urllib.parse
+import zlib
+
+from evkit import capital, financials, scrapper
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "host": "127.0.0.1",
+    "port": 8000,
+    "latency": 0.0,  # seconds added to every response
+    "jitter": 0.0,  # seconds, uniform on top of latency
+    "errorRate": 0.0,  # share of 500 and 503 responses
+    "missingRate": 0.05,  # share of tickers without beta
+    "rateLimit": None,  # requests per second, 429 above
+    "universe": 1_000,  # tickers of every screener
+    "seed": 0,
+    "riskFree": 1.85,  # ^TNX yield, %
+    "marketReturn": 9.75,  # 1Y US market return, %
+}
+
+# td positions of values on Morningstar and screener pages, as read by utils
+MARKET_RETURN_ID = 43
+SCREENER_COLUMNS = 10  # tds of a screener row, ticker and name first
+PAGE_SIZE = 250  # screener rows per page
+
+# statement items and YahooFinance sign conventions, ratio to revenue
+ITEMS = {
+    "ebit": (0.05, 0.3),
+    "interest": (-0.03, -0.005),
+    "tax": (0.01, 0.06),
+    "cash": (0.05, 0.3),
+    "current_assets": (0.3, 0.8),
+    "total_assets": (1.0, 3.0),
+    "current_liabilities": (0.2, 0.6),
+    "st_debt": (0.02, 0.2),
+    "lt_debt": (0.1, 0.8),
+    "equity": (0.5, 1.5),
+    "depreciation": (0.02, 0.08),
+    "capex": (-0.1, -0.02),
+}
+
+
+# -------------------- Pages --------------------
+def company(ticker, seed=None):
+    """ Deterministic statements (in thousands) and quotes of a ticker """
+    seed = CONFIG["seed"] if seed is None else seed
+    rng = random.Random(zlib.crc32(ticker.encode()) ^ seed)
+    revenue = rng.lognormvariate(13, 1.5)
+    growth = rng.gauss(0.05, 0.1)
+    data = {
+        # latest period first, as on YahooFinance
+        "revenue": [revenue / (1 + growth)**t for t in range(4)],
+        "price": rng.lognormvariate(3.5, 1),
+        "beta": None if rng.random() < CONFIG["missingRate"] else
+        rng.uniform(0.3, 2.0),
+        "shares": revenue * rng.uniform(0.01, 0.1),
+    }
+    for item, (low, high) in ITEMS.items():
+        ratio = rng.uniform(low, high)
+        data[item] = [
+            value * ratio * rng.gauss(1, 0.05) for value in data["revenue"]
+        ]
+    return data
+
+
+def render(title, cells, size=None):
+    """ html page of tds with text of cells at their positions """
+    if size is None:
+        size = max(cells, default=-1) + 5
+    tds = [cells.get(i, f"Row {i}") for i in range(size)]
+    rows = "".join("<tr>" + "".join(f"<td>{td}</td>"
+                                    for td in tds[i:i + 5]) + "</tr>"
+                   for i in range(0, size, 5))
+    return (f"<html><head><title>{title}</title></head><body>"
+            f"<table>{rows}</table></body></html>")
+
+
+def number(value):
+    return f"{value:,.0f}"
+
+
+def statement_cells(data, statement):
+    """ tds of a statement page, 4 periods from the item position """
+    cells = {}
+    for item in statement.elements:
+        position = getattr(statement, f"{item}_id")
+        for k, value in enumerate(data[item]):
+            cells[position + k] = number(value)
+    return cells
+
+
+def summary_page(ticker, data):
+    if ticker == "^TNX":
+        return render(ticker, {
+            capital.CostOfCapital.mkt_price_id: f'{CONFIG["riskFree"]:.3f}'
+        })
+    beta = "N/A" if data["beta"] is None else f'{data["beta"]:.2f}'
+    return render(
+        ticker, {
+            capital.CostOfCapital.mkt_price_id: f'{data["price"]:,.2f}',
+            capital.CostOfCapital.beta_id: beta,
+        })
+
+
+def statistics_page(ticker, data):
+    # shares in thousands, shown in billions or millions
+    shares = data["shares"]
+    shares = f"{shares / 1e6:.2f}B" if shares >= 1e6 else \
+        f"{shares / 1e3:.2f}M"
+    return render(ticker,
+                  {capital.CostOfCapital.shares_outstanding_id: shares})
+
+
+def screener_page(screener, offset, size):
+    """ Rows of ticker, name and filler columns of a screener page """
+    prefix = "".join(c for c in screener.upper() if c.isalpha())[:2] or "S"
+    cells = {}
+    for row, i in enumerate(range(offset, min(offset + PAGE_SIZE, size))):
+        ticker = f"{prefix}{i:04d}"
+        cells[row * SCREENER_COLUMNS] = ticker
+        cells[row * SCREENER_COLUMNS + 1] = f"{ticker} Synthetic Corp"
+        for column in range(2, SCREENER_COLUMNS):
+            cells[row * SCREENER_COLUMNS + column] = f"{column}.00"
+    rows = len(cells) // SCREENER_COLUMNS
+    return render(f"Screener {screener}", cells, rows * SCREENER_COLUMNS)
+
+
+STATEMENTS = {
+    financials.IncomeStatement.fin_statement_url_id.split("?")[0]:
+    financials.IncomeStatement,
+    financials.BalanceSheet.fin_statement_url_id.split("?")[0]:
+    financials.BalanceSheet,
+    financials.CashFlowStatement.fin_statement_url_id.split("?")[0]:
+    financials.CashFlowStatement,
+}
+
+
+def page(path, query):
+    """ html of a url path, None if it is unknown """
+    parts = [part for part in path.split("/") if part]
+    if parts[:1] == ["quote"] and len(parts) in (2, 3):
+        ticker = parts[1]
+        data = company(ticker)
+        if len(parts) == 2:
+            return summary_page(ticker, data)
+        if "/" + parts[2] == capital.CostOfCapital.statistics_url_id.split(
+                "?")[0]:
+            return statistics_page(ticker, data)
+        statement = STATEMENTS.get("/" + parts[2])
+        if statement is not None:
+            return render(ticker, statement_cells(data, statement))
+    elif parts[:2] == ["screener", "unsaved"] and len(parts) == 3:
+        offset = int(query.get("offset", ["0"])[0])
+        return screener_page(parts[2], offset, CONFIG["universe"])
+    elif path == "/index/indexReturn.html":
+        return render("Index Returns", {
+            MARKET_RETURN_ID: f'{CONFIG["marketReturn"]:.2f}'
+        })
+    return None
+
+
+# -------------------- Server --------------------
+class Handler(http.server.BaseHTTPRequestHandler):
+    """ Request handler of the stand-in pages """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        standin = self.server.standin
+        url = urllib.parse.urlsplit(self.path)
+        path = urllib.parse.unquote(url.path)
+        if path == "/stats":
+            return self.reply(200, json.dumps(standin.stats()),
+                              "application/json", count=False)
+
+        delay = standin.latency + standin.random.uniform(0, standin.jitter)
+        if delay:
+            time.sleep(delay)
+        if not standin.allow():
+            return self.reply(429,
+                              "Too Many Requests",
+                              headers={"Retry-After": "1"})
+        if standin.random.random() < standin.errorRate:
+            status = standin.random.choice([500, 503])
+            return self.reply(status, "Server Error")
+        html = page(path, urllib.parse.parse_qs(url.query))
+        if html is None:
+            return self.reply(404, "Not Found")
+        return self.reply(200, html)
+
+    def reply(self, status, body, content_type="text/html", headers=None,
+              count=True):
+        content = body.encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        # counted before the client can read the reply and ask for stats
+        if count:
+            self.server.standin.count(status, len(content))
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandIn:
+    """
+    Class for a threaded stand-in server of scrapped sites.
+    """
+
+    def __init__(self,
+                 host=None,
+                 port=None,
+                 latency=None,
+                 jitter=None,
+                 error_rate=None,
+                 rate_limit=None):
+        self.host = host or CONFIG["host"]
+        self.port = CONFIG["port"] if port is None else port
+        self.latency = CONFIG["latency"] if latency is None else latency
+        self.jitter = CONFIG["jitter"] if jitter is None else jitter
+        self.errorRate = CONFIG["errorRate"] if error_rate is None \
+            else error_rate
+        rate_limit = rate_limit or CONFIG["rateLimit"]
+        # throttling shares the token bucket of the EDGAR downloader
+        self.limiter = None if rate_limit is None else \
+            scrapper.RateLimiter(rate_limit, burst=max(1, rate_limit))
+        self.random = random.Random(CONFIG["seed"])
+        self.lock = threading.Lock()
+        self.statuses = collections.Counter()
+        self.bytes = 0
+        self.started = None
+        self.server = None
+        self.thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}/"
+
+    def start(self):
+        self.server = http.server.ThreadingHTTPServer((self.host, self.port),
+                                                      Handler)
+        self.server.daemon_threads = True
+        self.server.standin = self
+        self.port = self.server.server_address[1]
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       name="standin",
+                                       daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    def allow(self):
+        """ Whether a request is under the rate limit, never waits """
+        return self.limiter is None or self.limiter.try_acquire()
+
+    def count(self, status, size):
+        with self.lock:
+            self.statuses[status] += 1
+            self.bytes += size
+
+    def stats(self):
+        with self.lock:
+            elapsed = time.monotonic() - (self.started or time.monotonic())
+            requests = sum(self.statuses.values())
+            return {
+                "requests": requests,
+                "statuses": {str(k): v for k, v in self.statuses.items()},
+                "bytes": self.bytes,
+                "elapsed, s": round(elapsed, 3),
+                "requests/s": round(requests / elapsed, 1) if elapsed else 0,
+            }
+
+
+# -------------------- Command Line --------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Serve stand-in YahooFinance and Morningstar pages.')
+    parser.add_argument('--host', default=CONFIG['host'])
+    parser.add_argument('--port', type=int, default=CONFIG['port'])
+    parser.add_argument('--latency',
+                        type=float,
+                        default=CONFIG['latency'],
+                        help='seconds added to every response')
+    parser.add_argument('--jitter', type=float, default=CONFIG['jitter'])
+    parser.add_argument('--error-rate',
+                        type=float,
+                        default=CONFIG['errorRate'],
+                        help='share of 500 and 503 responses')
+    parser.add_argument('--missing-rate',
+                        type=float,
+                        default=CONFIG['missingRate'],
+                        help='share of tickers without trading information')
+    parser.add_argument('--rate-limit',
+                        type=float,
+                        help='requests per second, 429 above')
+    parser.add_argument('--universe',
+                        type=int,
+                        default=CONFIG['universe'],
+                        help='tickers of every screener')
+    args = parser.parse_args(argv)
+
+    CONFIG['missingRate'] = args.missing_rate
+    CONFIG['universe'] = args.universe
+    standin = StandIn(host=args.host,
+                      port=args.port,
+                      latency=args.latency,
+                      jitter=args.jitter,
+                      error_rate=args.error_rate,
+                      rate_limit=args.rate_limit)
+    with standin:
+        print(f"Serving stand-in pages on {standin.url}\n"
+              f"python -m evkit.launcher large_cap "
+              f"--yahoo-url {standin.url} --morningstar-url {standin.url}")
+        try:
+            standin.thread.join()
+        except KeyboardInterrupt:
+            print(json.dumps(standin.stats(), indent=1))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""
+Symbol index of tickers, CIKs and company names.
+
+Scrapped data is keyed by ticker, SEC data sets by CIK; the index links
+them with exact lookups by ticker, CIK or name and prefix lookups by
+normalized name, and keeps names of a company across quarters:
+1/ names and filing dates of every CIK from the index of filings (sub.txt),
+   former names with their change dates
+2/ tickers of the EDGAR company tickers file
+The index is written as one npz of sorted arrays, normalized name keys
+included, and loaded without pickles; exact lookups go through dicts
+built on load.
+"""
+
+import json
+import os
+import re
+
+import numpy as np
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "path": "data/sec_symbols.npz",
+    "tickers": "data/company_tickers.json",
+    # legal form words dropped from normalized names
+    "suffixes": [
+        "INC", "INCORPORATED", "CORP", "CORPORATION", "CO", "COMPANY", "LTD",
+        "LIMITED", "PLC", "LLC", "LP", "NV", "SA", "AG", "HOLDINGS", "GROUP",
+        "THE"
+    ],
+}
+
+PUNCTUATION = re.compile(r"[^A-Z0-9 ]+")
+
+# arrays of normalized names, saved with the index so load skips normalize
+DERIVED = ("keys", "keyRows", "nameKey", "nameCik")
+
+
+# -------------------- Helper Functions --------------------
+def normalize(name):
+    """ Upper case words of a company name, legal forms dropped """
+    words = PUNCTUATION.sub(" ", str(name).upper().replace("&", " AND "))
+    words = words.split()
+    suffixes = set(CONFIG["suffixes"])
+    # drop leading "THE" and trailing legal forms, keep at least one word
+    if len(words) > 1 and words[0] == "THE":
+        words = words[1:]
+    while len(words) > 1 and words[-1] in suffixes:
+        words = words[:-1]
+    return " ".join(words)
+
+
+def normalize_ticker(ticker):
+    """ Ticker in EDGAR notation, e.g. BRK.B -> BRK-B """
+    return str(ticker).strip().upper().replace(".", "-")
+
+
+def name_history(index):
+    """
+    Names of every CIK with the first and last date it was used,
+    from an index of filings with cik, name, filed and optionally
+    former, changed (sub.txt) columns.
+    """
+    import pandas as pd
+
+    filings = index[["cik", "name", "filed"]].dropna()
+    history = filings.groupby(["cik", "name"])["filed"].agg(["min", "max"])
+    history = history.reset_index()
+    history.columns = ["cik", "name", "start", "end"]
+    if {"former", "changed"}.issubset(index.columns):
+        # former names used until the date of change
+        former = index[["cik", "former", "changed"]].dropna()
+        former = former.groupby(["cik", "former"])["changed"].max()
+        former = former.reset_index()
+        former.columns = ["cik", "name", "end"]
+        former = former.assign(start=0)
+        known = history.set_index(["cik", "name"]).index
+        former = former[~former.set_index(["cik", "name"]).index.isin(known)]
+        history = pd.concat([history, former], ignore_index=True)
+    history = history.astype({"cik": np.int64, "start": np.int64,
+                              "end": np.int64})
+    return history.sort_values(["cik", "start", "end"]).reset_index(
+        drop=True)
+
+
+# -------------------- Symbol Index --------------------
+class SymbolIndex:
+    """
+    Class for lookups between tickers, CIKs and company names.
+    """
+
+    def __init__(self, arrays=None, derived=None):
+        self.verbose = CONFIG["verbose"]
+        empty = np.array([], dtype=np.int64)
+        self.arrays = {
+            # names: cik, name, start, end sorted by cik and start
+            "cik": empty,
+            "name": np.array([], dtype=str),
+            "start": empty,
+            "end": empty,
+            # tickers: ticker, tickerCik sorted by ticker
+            "ticker": np.array([], dtype=str),
+            "tickerCik": empty,
+            **(arrays or {}),
+        }
+        self.derived = derived or self._derive()
+        self._build()
+
+    def _derive(self):
+        """ Normalized names sorted for prefix search and exact names """
+        cik, name = self.arrays["cik"], self.arrays["name"]
+        keys = np.array([normalize(value) for value in name.tolist()],
+                        dtype=str)
+        order = np.argsort(keys, kind="stable")
+        # exact names map to the CIK that used the name last
+        byName = {}
+        for row in np.argsort(self.arrays["end"], kind="stable").tolist():
+            byName[keys[row]] = int(cik[row])
+        return {
+            "keys": keys[order],
+            "keyRows": order,
+            "nameKey": np.array(list(byName), dtype=str),
+            "nameCik": np.array(list(byName.values()), dtype=np.int64),
+        }
+
+    def _build(self):
+        """ Lookup dicts of the arrays """
+        cik, name = self.arrays["cik"], self.arrays["name"]
+        self.keys = self.derived["keys"]
+        self.keyRows = self.derived["keyRows"]
+        self.byName = dict(
+            zip(self.derived["nameKey"].tolist(),
+                self.derived["nameCik"].tolist()))
+        # the latest name of a CIK is the last row of the CIK
+        last = np.ones(len(cik), dtype=bool)
+        last[:-1] = cik[:-1] != cik[1:]
+        self.current = dict(
+            zip(cik[last].tolist(), name[last].tolist()))
+        self.byTicker = dict(
+            zip(self.arrays["ticker"].tolist(),
+                self.arrays["tickerCik"].tolist()))
+        self.byCik = {}
+        for ticker, value in zip(self.arrays["ticker"].tolist(),
+                                 self.arrays["tickerCik"].tolist()):
+            self.byCik.setdefault(value, []).append(ticker)
+
+    def __len__(self):
+        return len(self.current)
+
+    # -------------------- Builders --------------------
+    @classmethod
+    def from_filings(cls, index, tickers=None):
+        """
+        Index of names of a filings index (sub.txt), with tickers of
+        an EDGAR company tickers dict or a ticker -> CIK mapping.
+        """
+        history = name_history(index.reset_index())
+        symbols = cls({
+            "cik": history["cik"].to_numpy(dtype=np.int64),
+            "name": history["name"].to_numpy(dtype=str),
+            "start": history["start"].to_numpy(dtype=np.int64),
+            "end": history["end"].to_numpy(dtype=np.int64),
+        })
+        if tickers is not None:
+            symbols.add_tickers(tickers)
+        return symbols
+
+    def add_tickers(self, tickers):
+        """
+        Add tickers of an EDGAR company tickers dict
+        ({"0": {"cik_str": ..., "ticker": ..., "title": ...}, ...})
+        or of a ticker -> CIK mapping.
+        """
+        pairs = {}
+        for key, value in tickers.items():
+            if isinstance(value, dict):
+                key, value = value["ticker"], value["cik_str"]
+            pairs[normalize_ticker(key)] = int(value)
+        pairs = {**self.byTicker, **pairs}
+        ticker = np.array(sorted(pairs), dtype=str)
+        self.arrays["ticker"] = ticker
+        self.arrays["tickerCik"] = np.array(
+            [pairs[value] for value in ticker.tolist()], dtype=np.int64)
+        self._build()
+        return self
+
+    # -------------------- Persistence --------------------
+    def save(self, path=None):
+        path = path or CONFIG["path"]
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        # np.savez appends .npz to other names
+        temp = path + ".tmp.npz"
+        np.savez(temp, **self.arrays, **self.derived)
+        os.replace(temp, path)
+        if self.verbose:
+            print(f"Symbol index saved to {path}")
+        return path
+
+    @classmethod
+    def load(cls, path=None):
+        with np.load(path or CONFIG["path"]) as arrays:
+            derived = None
+            # indexes saved without normalized names are normalized again
+            if set(DERIVED).issubset(arrays.files):
+                derived = {key: arrays[key] for key in DERIVED}
+            return cls(
+                {
+                    key: arrays[key]
+                    for key in arrays.files if key not in DERIVED
+                }, derived)
+
+    # -------------------- Lookups --------------------
+    def cik(self, query):
+        """ CIK of a ticker, CIK or exact company name, None if unknown """
+        if isinstance(query, (int, np.integer)) or str(query).isdigit():
+            value = int(query)
+            return value if value in self.current or value in self.byCik \
+                else None
+        value = self.byTicker.get(normalize_ticker(query))
+        if value is None:
+            value = self.byName.get(normalize(query))
+        return value
+
+    def tickers(self, cik):
+        """ Tickers of a CIK, e.g. classes of shares """
+        return list(self.byCik.get(int(cik), []))
+
+    def ticker(self, cik):
+        """ First ticker of a CIK, None if it has none """
+        tickers = self.byCik.get(int(cik))
+        return tickers[0] if tickers else None
+
+    def name(self, cik, date=None):
+        """ Latest company name, or the name used at date (yyyymmdd) """
+        cik = int(cik)
+        if date is None:
+            return self.current.get(cik)
+        rows = self.history_rows(cik)
+        used = rows[self.arrays["start"][rows] <= int(date)]
+        if not len(used):
+            return None
+        return str(self.arrays["name"][used[-1]])
+
+    def history_rows(self, cik):
+        ciks = self.arrays["cik"]
+        first, last = np.searchsorted(ciks, [cik, cik + 1])
+        return np.arange(first, last)
+
+    def names(self, cik):
+        """ Names of a CIK as (name, first date, last date), oldest first """
+        rows = self.history_rows(int(cik))
+        return [(str(self.arrays["name"][row]), int(self.arrays["start"][row]),
+                 int(self.arrays["end"][row])) for row in rows]
+
+    def search(self, prefix, limit=10):
+        """
+        Companies with a current or former name starting with prefix,
+        as (cik, latest name) in name order.
+        """
+        prefix = normalize(prefix)
+        first = np.searchsorted(self.keys, prefix, side="left")
+        found = {}
+        for position in range(first, len(self.keys)):
+            if not self.keys[position].startswith(prefix) or \
+                    len(found) == limit:
+                break
+            cik = int(self.arrays["cik"][self.keyRows[position]])
+            found.setdefault(cik, self.current[cik])
+        return list(found.items())
+
+    def map_tickers(self, tickers):
+        """ CIKs of tickers (e.g. a screener), None for unknown tickers """
+        return [self.byTicker.get(normalize_ticker(t)) for t in tickers]
+
+    def match(self, stocks_df):
+        """
+        CIKs of a DataFrame of ticker and name (utils.get_tickers),
+        by ticker and by exact normalized name otherwise.
+        """
+        import pandas as pd
+
+        ciks = self.map_tickers(stocks_df["ticker"])
+        if "name" in stocks_df.columns:
+            ciks = [
+                cik if cik is not None else self.byName.get(normalize(name))
+                for cik, name in zip(ciks, stocks_df["name"])
+            ]
+        return stocks_df.assign(
+            cik=pd.Series(ciks, index=stocks_df.index, dtype="Int64"))
+
+
+def load_company_tickers(path=None, url=None):
+    """
+    EDGAR company tickers dict, read from path or downloaded to path.
+    """
+    path = path or CONFIG["tickers"]
+    if not os.path.exists(path):
+        import requests
+        from evkit import scrapper
+
+        response = requests.get(
+            url or scrapper.CONFIG["url"]["tickers"],
+            headers={"User-Agent": scrapper.CONFIG["userAgent"]},
+            timeout=scrapper.CONFIG["timeout"])
+        response.raise_for_status()
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path, "wb") as file:
+            file.write(response.content)
+    with open(path, "r") as file:
+        return json.load(file)
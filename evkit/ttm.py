@@ -0,0 +1,194 @@
+"""
+Trailing-twelve-month flows of SEC Financial Statement Data Sets.
+
+num.txt reports flows over quarterly, year-to-date and annual durations
+(qtrs 1 to 4). TTM values are derived for every company and tag with
+sorted, vectorized lookups over the whole fact table:
+1/ keep the latest filed value of every fact (amendments restate facts)
+2/ derive discrete quarters from quarterly values and YTD differences
+3/ TTM from annual value, YTD + prior FY - prior YTD, or 4 quarters
+"""
+
+import numpy as np
+import pandas as pd
+
+from evkit import sec_datareader, valuation
+
+# -------------------- Global Variables --------------------
+# TTM sources in order of preference
+SOURCES = ("annual", "ytd", "quarters")
+
+
+# -------------------- Helper Functions --------------------
+def month_ordinal(dates):
+    """
+    Month ordinal of yyyymmdd period ends, rounded to the nearest month end
+    to align 52-53 week fiscal calendars.
+    """
+    dates = np.asarray(dates, dtype=np.int64)
+    year, month, day = dates // 10000, dates // 100 % 100, dates % 100
+    return year * 12 + month - 1 - (day < 15)
+
+
+def fact_key(group, month, qtrs):
+    """ Integer key of a fact for hash lookups """
+    return (np.asarray(group, dtype=np.int64) * 100_000 +
+            np.asarray(month, dtype=np.int64)) * 8 + np.asarray(qtrs)
+
+
+def lookup(keys, values, query):
+    """ Values at query keys, NaN where the key is absent """
+    position = pd.Index(keys).get_indexer(query)
+    found = position >= 0
+    return np.where(found, values[position], np.nan), found
+
+
+def latest_filed(group, month, qtrs, filed):
+    """ Mask of the latest filed value of every fact """
+    order = np.lexsort((filed, qtrs, month, group))
+    key = fact_key(group, month, qtrs)[order]
+    last = np.ones(len(order), dtype=bool)
+    last[:-1] = key[:-1] != key[1:]
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order[last]] = True
+    return mask
+
+
+def first_of(group, month, priority):
+    """ Mask of the most preferred candidate of every (group, month) """
+    order = np.lexsort((priority, month, group))
+    key = fact_key(group, month, 0)[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = key[1:] != key[:-1]
+    mask = np.zeros(len(order), dtype=bool)
+    mask[order[first]] = True
+    return mask
+
+
+# -------------------- TTM Builder --------------------
+def ttm_flows(facts, keys):
+    """
+    Trailing-twelve-month values of flow facts.
+
+    facts has the key columns and ddate, qtrs, value, filed;
+    returns key columns, ddate, month, ttm and source of the value.
+    """
+    facts = facts[facts["qtrs"].between(1, 4)].dropna(subset=["value"])
+    grouped = facts.groupby(keys, sort=False, dropna=False)
+    group = grouped.ngroup().to_numpy()
+    month = month_ordinal(facts["ddate"])
+    qtrs = facts["qtrs"].to_numpy(dtype=np.int64)
+    value = facts["value"].to_numpy(dtype=float)
+    ddate = facts["ddate"].to_numpy(dtype=np.int64)
+    filed = facts["filed"].to_numpy(dtype=np.int64)
+
+    # 1/ amendments and repeated facts
+    mask = latest_filed(group, month, qtrs, filed)
+    group, month, qtrs = group[mask], month[mask], qtrs[mask]
+    value, ddate = value[mask], ddate[mask]
+    factKeys = fact_key(group, month, qtrs)
+
+    # 2/ discrete quarters: reported, or YTD less the prior YTD
+    prior, found = lookup(factKeys, value, fact_key(group, month - 3,
+                                                    qtrs - 1))
+    derived = (qtrs > 1) & found
+    isQuarter = (qtrs == 1) | derived
+    quarter = np.where(qtrs == 1, value, value - prior)[isQuarter]
+    qGroup, qMonth = group[isQuarter], month[isQuarter]
+    best = first_of(qGroup, qMonth, (qtrs > 1)[isQuarter])
+    quarter, qGroup, qMonth = quarter[best], qGroup[best], qMonth[best]
+    qDate = ddate[isQuarter][best]
+    quarterKeys = fact_key(qGroup, qMonth, 1)
+
+    # 3/ TTM candidates, in order of SOURCES
+    annual = qtrs == 4
+    ytd = qtrs < 4
+    fy, fyFound = lookup(factKeys, value,
+                         fact_key(group, month - 3 * qtrs, 4)[ytd])
+    prevYtd, prevFound = lookup(factKeys, value,
+                                fact_key(group, month - 12, qtrs)[ytd])
+    ytdValid = fyFound & prevFound
+    total = quarter.copy()
+    sumValid = np.ones(len(quarter), dtype=bool)
+    for lagged in (3, 6, 9):
+        previous, found = lookup(quarterKeys, quarter,
+                                 fact_key(qGroup, qMonth - lagged, 1))
+        total += previous
+        sumValid &= found
+
+    group = np.concatenate(
+        [group[annual], group[ytd][ytdValid], qGroup[sumValid]])
+    month = np.concatenate(
+        [month[annual], month[ytd][ytdValid], qMonth[sumValid]])
+    ddate = np.concatenate(
+        [ddate[annual], ddate[ytd][ytdValid], qDate[sumValid]])
+    ttm = np.concatenate([
+        value[annual], (value[ytd] + fy - prevYtd)[ytdValid], total[sumValid]
+    ])
+    source = np.repeat(
+        np.arange(len(SOURCES)),
+        [annual.sum(), ytdValid.sum(), sumValid.sum()])
+    best = first_of(group, month, source)
+
+    # map groups back to key values
+    keyValues = grouped.size().reset_index()[keys]
+    result = keyValues.iloc[group[best]].reset_index(drop=True)
+    result["ddate"] = ddate[best]
+    result["month"] = month[best]
+    result["ttm"] = ttm[best]
+    result["source"] = pd.Categorical.from_codes(source[best],
+                                                 categories=SOURCES)
+    return result.sort_values([*keys, "month"]).reset_index(drop=True)
+
+
+def ttm_facts(finData, index, tags=None):
+    """
+    TTM values of every company, tag and unit of SEC financial data.
+    """
+    facts = finData if "adsh" in finData.columns else finData.reset_index()
+    if tags is not None:
+        facts = facts[facts["tag"].isin(tags)]
+    if "coreg" in facts.columns:
+        facts = facts[facts["coreg"].isna()]
+    facts = facts[["adsh", "tag", "uom", "ddate", "qtrs", "value"]]
+    facts = facts.join(index[["cik", "filed"]], on="adsh")
+    return ttm_flows(facts, keys=["cik", "tag", "uom"])
+
+
+def statement_panel(finData, index):
+    """
+    Compact panel of pro-forma statement items indexed by (cik, month):
+    TTM of flows and period end values of balance sheet items.
+    """
+    facts = sec_datareader.statement_facts(finData, index)
+    instants = facts["field"].isin(
+        sec_datareader.CONFIG["statementInstants"])
+
+    flows = ttm_flows(facts[~instants], keys=["cik", "field"])
+    flows = flows.rename(columns={"ttm": "value"})
+    stocks = facts[instants & (facts["qtrs"] == 0)]
+    stocks = stocks.assign(month=month_ordinal(stocks["ddate"]))
+    stocks = stocks.sort_values("ddate").drop_duplicates(
+        ["cik", "field", "month"], keep="last")
+
+    items = pd.concat([
+        flows[["cik", "month", "field", "value"]],
+        stocks[["cik", "month", "field", "value"]]
+    ])
+    panel = items.set_index(["cik", "month", "field"])["value"]
+    panel = panel.unstack("field").sort_index()
+    panel.columns = panel.columns.astype(str)
+    return panel
+
+
+def statement_data(panel, cik, month=None, periods=valuation.HISTORY):
+    """
+    Yearly statement items of a company for set_actual of statements,
+    oldest period first; the latest month with revenue by default.
+    """
+    company = panel.loc[cik]
+    if month is None:
+        month = company["revenue"].last_valid_index()
+    months = [month - 12 * k for k in reversed(range(periods))]
+    company = company.reindex(months)
+    return {field: company[field].to_numpy() for field in company.columns}
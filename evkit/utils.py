@@ -20,20 +20,53 @@
 #  OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 #  SOFTWARE.
 
+# pandas, requests, bs4 and matplotlib are imported on first use,
+# so that the valuation core of financials and capital loads with numpy only
+import os
+
 import numpy as np
-import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-import matplotlib.pyplot as plt
 
+from evkit import metrics
 
-def get_html(ticker, url_id, YahooFinance=True, show_page=False):
+# base urls of scrapped sites, e.g. of the evkit.standin server;
+# environment variables reach the workers of process pools
+BASE_URLS = {
+    'yahoo': ('EVKIT_YAHOO_URL', 'https://finance.yahoo.com/'),
+    'morningstar': ('EVKIT_MORNINGSTAR_URL', 'http://news.morningstar.com/'),
+}
+
+
+def base_url(site):
+    variable, default = BASE_URLS[site]
+    return os.environ.get(variable) or default
+
+
+def set_base_urls(yahoo=None, morningstar=None):
+    for site, url in (('yahoo', yahoo), ('morningstar', morningstar)):
+        if url is not None:
+            os.environ[BASE_URLS[site][0]] = url.rstrip('/') + '/'
+
+
+def get_url(ticker, url_id, YahooFinance=True):
     if YahooFinance:
-        url = ticker.join(['https://finance.yahoo.com/quote/', url_id, ''])
-    else:
-        # treat url_symbol as url link
-        url = url_id
-    source = requests.get(url).text
+        return ticker.join([base_url('yahoo') + 'quote/', url_id, ''])
+    # treat url_symbol as url link
+    return url_id
+
+
+def fetch_page(url, session=None):
+    import requests
+    # download raw html page
+    with metrics.timer('http_request_seconds'):
+        source = (session or requests).get(url).text
+    metrics.inc('http_requests_total')
+    metrics.observe('http_response_bytes', len(source))
+    return source
+
+
+@metrics.timed('html_parse_seconds')
+def parse_page(source, show_page=False):
+    from bs4 import BeautifulSoup
     html_page = BeautifulSoup(source, 'html5lib')
     data = html_page.findAll('td')
     # display structured html page
@@ -45,6 +78,22 @@ def get_html(ticker, url_id, YahooFinance=True, show_page=False):
     return data
 
 
+def get_html(ticker, url_id, YahooFinance=True, show_page=False):
+    url = get_url(ticker, url_id, YahooFinance)
+    source = fetch_page(url)
+    return parse_page(source, show_page=show_page)
+
+
+def release_page(html_page):
+    # break reference cycles of the parse tree, so that it is freed
+    # as soon as extracted values are out, without waiting for gc
+    if html_page:
+        root = html_page[0]
+        while root.parent is not None:
+            root = root.parent
+        root.decompose()
+
+
 def get_value(html_page, value_index):
     try:
         value_text = html_page[value_index].text
@@ -64,35 +113,39 @@ def get_value(html_page, value_index):
     return value_float
 
 
-def get_tickers_url():
-    tickers_dict = {
-        'mega_cap': 'fa45388d-9752-4201-974f-93c0fffdaf2e',
-        'large_cap': 'fd702086-e634-4b39-81e8-3326f43373f6',
-        'basic_materials': 'b7a89332-49c1-4c36-aa21-0e5dea8c0a4e',
-        'healthcare': 'b5bd835a-1f78-4dd3-a22d-14a97f62e2c4',
-        'utilities': 'cea6e52c-0be5-4600-a302-c737e9b7f274',
-        'financial_services': 'f48ad0e4-430a-41b5-b42d-9b84ded67143',
-        'consumer_defensive': '27c9d45d-6ae9-4404-9c29-977dc249b8fe',
-        'consumer_cyclical': '2e4f67d2-c4f2-4e6e-9a88-99084a489809h',
-        'technology': '8f642d7d-11b7-435a-aa30-b1570a7d9d26',
-        'energy': '238a84a7-d96d-4b87-a1b9-090191c412e3',
-        'real_estate': '33d68532-22eb-4ca5-aaab-a2c4e45e6337',
-        'communication_services': '17bcd658-1187-431d-8dbb-38d4967e1981',
-        'industrials': '64550c05-f55d-4620-9f5d-95143b31e9ed'
-    }
-    # display available stock pools
-    print('ID | Industry')
-    for num, key in enumerate(tickers_dict.keys()):
-        print(f'{num:>2d} | {key}')
-    select = input('Enter Industry ID: ')
-    # render selection (int) into dict key
-    tickers_key = list(tickers_dict.keys())[int(select)]
+SCREENERS = {
+    'mega_cap': 'fa45388d-9752-4201-974f-93c0fffdaf2e',
+    'large_cap': 'fd702086-e634-4b39-81e8-3326f43373f6',
+    'basic_materials': 'b7a89332-49c1-4c36-aa21-0e5dea8c0a4e',
+    'healthcare': 'b5bd835a-1f78-4dd3-a22d-14a97f62e2c4',
+    'utilities': 'cea6e52c-0be5-4600-a302-c737e9b7f274',
+    'financial_services': 'f48ad0e4-430a-41b5-b42d-9b84ded67143',
+    'consumer_defensive': '27c9d45d-6ae9-4404-9c29-977dc249b8fe',
+    'consumer_cyclical': '2e4f67d2-c4f2-4e6e-9a88-99084a489809h',
+    'technology': '8f642d7d-11b7-435a-aa30-b1570a7d9d26',
+    'energy': '238a84a7-d96d-4b87-a1b9-090191c412e3',
+    'real_estate': '33d68532-22eb-4ca5-aaab-a2c4e45e6337',
+    'communication_services': '17bcd658-1187-431d-8dbb-38d4967e1981',
+    'industrials': '64550c05-f55d-4620-9f5d-95143b31e9ed'
+}
+
+
+def get_tickers_url(tickers_key=None):
+    tickers_dict = SCREENERS
+    if tickers_key is None:
+        # display available stock pools
+        print('ID | Industry')
+        for num, key in enumerate(tickers_dict.keys()):
+            print(f'{num:>2d} | {key}')
+        select = input('Enter Industry ID: ')
+        # render selection (int) into dict key
+        tickers_key = list(tickers_dict.keys())[int(select)]
     print(f'Selected collection of securities: {tickers_key}')
     # collect urls with page offset
     url_offset = 0
     tickers_urls = []
     tickers_url_id = [
-        'https://finance.yahoo.com/screener/unsaved/', '?count=250&offset='
+        base_url('yahoo') + 'screener/unsaved/', '?count=250&offset='
     ]
     for i in range(6):
         url = tickers_dict[tickers_key].join(tickers_url_id) + str(url_offset)
@@ -106,7 +159,7 @@ def get_rf_mrp():
     # vars
     summary_url_id = '?p='
     rf_ticker = '^TNX'  # Treasury Yield 10 Years
-    market_url = 'http://news.morningstar.com/index/indexReturn.html'
+    market_url = base_url('morningstar') + 'index/indexReturn.html'
     rf_id = 1
     market_id = 43  # 1Y US market return value id
 
@@ -128,6 +181,7 @@ def get_rf_mrp():
 
 
 def get_tickers(url_list):
+    import pandas as pd
     collection = {'ticker': [], 'name': []}
     # open urls from the offset collection
     for url in url_list:
@@ -152,7 +206,12 @@ def get_tickers(url_list):
     return stocks_df
 
 
-def plot_beta_wacc(beta, wacc):
+def plot_beta_wacc(beta, wacc, path=None):
+    if path is not None:
+        # headless, write chart to file
+        from evkit import plot
+        return plot.beta_wacc(beta=beta, wacc=wacc, path=path)
+    import matplotlib.pyplot as plt
     plt.style.use('ggplot')
     plt.figure(figsize=(10, 5))
     n = len(wacc)
@@ -164,7 +223,14 @@ def plot_beta_wacc(beta, wacc):
     plt.show()
 
 
-def plot_dcf_mkt_price(dcf_price, mkt_price):
+def plot_dcf_mkt_price(dcf_price, mkt_price, path=None):
+    if path is not None:
+        # headless, write chart to file
+        from evkit import plot
+        return plot.dcf_mkt_price(dcf_price=dcf_price,
+                                  mkt_price=mkt_price,
+                                  path=path)
+    import matplotlib.pyplot as plt
     plt.style.use('seaborn')
     plt.figure(figsize=(10, 5))
     n = len(dcf_price)
@@ -208,9 +274,9 @@ def get_shares_num(html_page, value_index):
     return value_float
 
 
-def results_to_csv(data_df, report_id):
+def results_to_csv(data_df, report_id, path='./reports/'):
     # save results to csv
-    path = report_id.join(['./reports/', '.csv'])
+    path = os.path.join(path, report_id + '.csv')
     data_df.to_csv(path_or_buf=path, index=False)
     print(f'\n-> Results saved to a file {path}')
     return None
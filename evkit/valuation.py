@@ -0,0 +1,186 @@
+"""
+Vectorized DCF-WACC valuation of a universe of companies.
+
+Mirrors the per-ticker algorithm of financials, capital and launcher.
+Statement arrays carry the actual periods on the last axis, oldest first,
+as written by IncomeStatement.get_actual; leading axes are free
+(tickers, quarters x tickers, ...), scalars broadcast against them.
+"""
+
+import numpy as np
+
+# number of actual periods in pro-forma statements
+HISTORY = 4
+
+# statement line items consumed by value_universe
+FIELDS = ("revenue", "ebit", "interest", "tax", "cash", "current_assets",
+          "total_assets", "current_liabilities", "st_debt", "lt_debt",
+          "equity", "depreciation", "capex")
+
+# columns of the valuation report, as written by launcher
+RESULTS = ("beta_equity", "beta_asset", "beta_debt", "re", "rd", "wacc",
+           "enterprise_value, $B", "equity_value, $B", "stock_price",
+           "mkt_stock_price")
+
+
+# -------------------- Pro-forma Statements --------------------
+def get_actual(values):
+    """ Zero out series with missing periods, as get_actual does on None """
+    values = np.array(values, dtype=float)
+    values[np.isnan(values).any(axis=-1)] = 0
+    return values
+
+
+def get_st_growth(revenue):
+    """ Short-term growth rate, mean of period-over-period changes """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        changes = revenue[..., 1:] / revenue[..., :-1] - 1
+        growth = changes.sum(axis=-1) / changes.shape[-1]
+    return np.where(np.any(revenue, axis=-1), growth, 0)
+
+
+def get_tax_rate(tax, ebit, default=0.21):
+    """ Effective tax rate, default rate for incomplete statements """
+    tax = tax[..., :HISTORY]
+    ebit = ebit[..., :HISTORY]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.mean(tax / ebit, axis=-1)
+    valid = np.any(tax, axis=-1) & np.any(ebit, axis=-1)
+    return np.where(valid, rate, default)
+
+
+def get_projections(values, periods, growth_rate):
+    """ Append projected periods at a constant growth rate """
+    growth = 1 + np.asarray(growth_rate, dtype=float)[..., np.newaxis]
+    projected = [values]
+    last = values[..., -1:]
+    for t in range(periods):
+        last = last * growth
+        projected.append(last)
+    return np.concatenate(projected, axis=-1)
+
+
+def get_nwc(current_assets, current_liabilities):
+    """ Change in net working capital, zero for the first period """
+    wc = current_assets - current_liabilities
+    nwc = np.zeros_like(wc)
+    nwc[..., 1:] = np.diff(wc, axis=-1)
+    return nwc
+
+
+# -------------------- Cost of Capital --------------------
+def get_cost_of_debt(debt, interest):
+    """ Mean interest to total debt, zero when any period has no debt """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rd = np.mean(-interest / debt, axis=-1)
+    return np.where(np.any(debt == 0, axis=-1), 0, rd)
+
+
+def discount_factors(wacc, periods=3):
+    """ Discount factors of the forecast and terminal value periods """
+    t = np.arange(1, periods + 2)
+    wacc = np.asarray(wacc, dtype=float)[..., np.newaxis]
+    return 1 / (1 + wacc)**t
+
+
+def dcf(ebit, dna, nwc, capex, tax_rate, lt_growth, wacc, dt):
+    """ Enterprise value from discounted FCF and terminal value """
+    tax_rate = np.asarray(tax_rate)[..., np.newaxis]
+    fcf = ebit * (1 - tax_rate) + dna - nwc + capex
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tv = fcf[..., -1] * (1 + lt_growth) / (wacc - lt_growth)
+    fcf_tv = np.concatenate([fcf[..., HISTORY:], tv[..., np.newaxis]],
+                            axis=-1)
+    ev = np.sum(fcf_tv * dt, axis=-1)
+    return fcf_tv, ev
+
+
+# -------------------- Valuation --------------------
+def value_universe(statements,
+                   equity_beta,
+                   num_shares,
+                   mkt_price,
+                   rf,
+                   mrp,
+                   horizon=5,
+                   unit=1_000_000,
+                   wacc=None,
+                   lt_growth=None):
+    """
+    Value every company of the universe at once.
+
+    statements maps FIELDS to arrays of shape (..., HISTORY);
+    equity_beta, num_shares and mkt_price have the leading shape;
+    with mkt_price None, companies are valued regardless of a quote.
+    unit is the number of statement units per $B of the report.
+    wacc and lt_growth replace the estimated rates, e.g. in sensitivity
+    analyses; they broadcast against the leading shape.
+    Returns a dict of RESULTS columns.
+    """
+    fs = {field: get_actual(statements[field]) for field in FIELDS}
+    equity_beta = np.asarray(equity_beta, dtype=float)
+    num_shares = np.asarray(num_shares, dtype=float)
+    quoted = mkt_price is not None
+    mkt_price = np.asarray(mkt_price if quoted else np.nan, dtype=float)
+    total_debt = fs["st_debt"] + fs["lt_debt"]
+    tax_rate = get_tax_rate(fs["tax"], fs["ebit"])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # cost of capital
+        rd = get_cost_of_debt(total_debt, fs["interest"])
+        beta_debt = (rd - rf) / mrp
+        de = fs["lt_debt"][..., -1] / fs["equity"][..., -1]
+        beta_asset = ((equity_beta + beta_debt * (1 - tax_rate) * de) /
+                      (1 + (1 - tax_rate) * de))
+        re = rf + beta_asset * mrp
+        dv = fs["lt_debt"][..., -1] / fs["total_assets"][..., -1]
+        if wacc is None:
+            wacc = re * (1 - dv) + (1 - tax_rate) * rd * dv
+        wacc = np.asarray(wacc, dtype=float)
+        dt = discount_factors(wacc, periods=horizon)
+
+        # projections
+        if lt_growth is None:
+            lt_growth = wacc * 0.5
+        st_growth = get_st_growth(fs["revenue"])
+        ebit = get_projections(fs["ebit"], horizon, st_growth)
+        nwc = get_nwc(
+            get_projections(fs["current_assets"], horizon, st_growth),
+            get_projections(fs["current_liabilities"], horizon, st_growth))
+        dna = get_projections(fs["depreciation"], horizon, st_growth)
+        capex = get_projections(fs["capex"], horizon, st_growth)
+
+        # enterprise value, equity value, share price
+        fcf, ev = dcf(ebit=ebit,
+                      dna=dna,
+                      nwc=nwc,
+                      capex=capex,
+                      tax_rate=tax_rate,
+                      lt_growth=lt_growth,
+                      wacc=wacc,
+                      dt=dt)
+        eq = ev - total_debt[..., -1] + fs["cash"][..., -1]
+        stock_price = np.fmax(0, eq / num_shares)
+
+    # missing trading information invalidates the whole record
+    missing = np.isnan(equity_beta) | np.isnan(num_shares)
+    if quoted:
+        missing = missing | np.isnan(mkt_price)
+    results = {
+        "beta_equity": equity_beta,
+        "beta_asset": beta_asset,
+        "beta_debt": beta_debt,
+        "re": re,
+        "rd": rd,
+        "wacc": wacc,
+        "enterprise_value, $B": ev / unit,
+        "equity_value, $B": eq / unit,
+        "stock_price": stock_price,
+        "mkt_stock_price": mkt_price,
+    }
+    shape = np.broadcast_shapes(missing.shape, wacc.shape)
+    for key, value in results.items():
+        value = np.broadcast_to(value, shape).astype(float)
+        value[np.broadcast_to(missing, shape)] = np.nan
+        results[key] = value
+    return results
@@ -0,0 +1,391 @@
+"""
+Streaming extraction of XBRL facts from downloaded filings.
+
+Filings saved by scrapper, XBRL instances (.xml) or inline XBRL
+documents (.htm), are read with incremental XML parsing: elements are
+cleared as soon as they are processed, and only contexts, units and
+facts of the configured us-gaap tags are kept, so memory does not grow
+with the size of a document. Facts are written in the schema of SEC
+Financial Statement Data Sets (num.txt and sub.txt), ready for
+sec_datareader.statement_facts, ttm and screener, before the quarterly
+bulk archive is published.
+"""
+
+import concurrent.futures
+import datetime
+import glob
+import html.entities
+import json
+import os
+import re
+import xml.etree.ElementTree as ET
+
+from evkit import sec_datareader
+
+# -------------------- Global Variables --------------------
+CONFIG = {
+    "verbose": True,
+    "path": "./data/filings/",
+    "workers": os.cpu_count(),
+    "patterns": ("*.htm", "*.html", "*.xml"),
+    "metadata": "filing.json",  # written next to documents by scrapper
+}
+
+# columns of num.txt and sub.txt of SEC data sets
+FACT_COLUMNS = ("adsh", "tag", "version", "coreg", "ddate", "qtrs", "uom",
+                "value")
+INDEX_COLUMNS = ("adsh", "cik", "name", "form", "period", "fy", "fp",
+                 "filed")
+
+NS = {
+    "xbrli": "http://www.xbrl.org/2003/instance",
+    "xsi": "http://www.w3.org/2001/XMLSchema-instance",
+}
+# elements processed at their end, children are kept until then
+COMPOSITE = {"context", "unit", "nonFraction", "nonNumeric"}
+DEI = {
+    "EntityRegistrantName": "name",
+    "DocumentType": "form",
+    "DocumentPeriodEndDate": "period",
+    "DocumentFiscalYearFocus": "fy",
+    "DocumentFiscalPeriodFocus": "fp",
+}
+ACCESSION = re.compile(r"^\d{10}-\d{2}-\d{6}$")
+ENTITY = re.compile(rb"&([A-Za-z][A-Za-z0-9]*);")
+XML_ENTITIES = {b"amp", b"lt", b"gt", b"quot", b"apos"}
+
+
+def default_tags():
+    """ us-gaap tags of pro-forma statement items """
+    return {
+        tag
+        for tags in sec_datareader.CONFIG["statementTags"].values()
+        for tag in tags
+    }
+
+
+# -------------------- Helper Functions --------------------
+class EntityStream:
+    """
+    Binary stream replacing named HTML entities of inline XBRL documents
+    (&nbsp; etc.) with character references an XML parser accepts.
+    """
+
+    def __init__(self, file):
+        self.file = file
+        self.tail = b""
+
+    def _replace(self, match):
+        name = match.group(1)
+        codepoint = html.entities.name2codepoint.get(name.decode())
+        if name in XML_ENTITIES or codepoint is None:
+            return match.group(0)
+        return b"&#%d;" % codepoint
+
+    def read(self, size=-1):
+        chunk = self.file.read(size)
+        data, self.tail = self.tail + chunk, b""
+        # hold back an entity cut at the end of the chunk
+        cut = data.rfind(b"&", max(0, len(data) - 32))
+        if chunk and cut >= 0 and b";" not in data[cut:]:
+            data, self.tail = data[:cut], data[cut:]
+        return ENTITY.sub(self._replace, data)
+
+
+def local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def namespace(tag):
+    return tag[1:].split("}", 1)[0] if tag.startswith("{") else ""
+
+
+def as_ddate(text):
+    """ yyyymmdd of an ISO date or a date in words, e.g. June 27, 2020 """
+    text = text.strip()
+    for fmt in ("%Y-%m-%d", "%B %d, %Y", "%b %d, %Y", "%d %B %Y"):
+        try:
+            date = datetime.datetime.strptime(text[:10] if fmt == "%Y-%m-%d"
+                                              else text, fmt)
+            return int(date.strftime("%Y%m%d"))
+        except ValueError:
+            continue
+    return None
+
+
+def duration_qtrs(start, end):
+    """ Number of quarters of a duration, as qtrs of num.txt """
+    days = (datetime.date.fromisoformat(end.strip()[:10]) -
+            datetime.date.fromisoformat(start.strip()[:10])).days
+    return round(days / 91.31)
+
+
+def inline_value(text, attrib):
+    """ Numeric value of an ix:nonFraction fact """
+    fmt = attrib.get("format", "")
+    text = text.strip()
+    if "zero" in fmt or text in ("", "-", "—"):
+        value = 0.0
+    else:
+        if "numcommadecimal" in fmt:
+            text = text.replace(".", "").replace(" ", "").replace(",", ".")
+        text = re.sub(r"[^0-9.]", "", text)
+        value = float(text) if text else 0.0
+    value *= 10**int(attrib.get("scale", 0))
+    if attrib.get("sign") == "-":
+        value = -value
+    return value
+
+
+def fact_value(text, attrib=None):
+    """ Numeric value of a fact, of ix:nonFraction if attrib; None if bad """
+    try:
+        if attrib is None:
+            return float(text.strip())
+        return inline_value(text, attrib)
+    except ValueError:
+        return None
+
+
+def filing_metadata(path):
+    """ Accession, filing date, form and CIK of a document on disk """
+    meta = {}
+    metaFile = os.path.join(os.path.dirname(path), CONFIG["metadata"])
+    if os.path.exists(metaFile):
+        with open(metaFile, "r") as file:
+            meta = json.load(file)
+    folder = os.path.basename(os.path.dirname(path))
+    if "accession" not in meta and ACCESSION.match(folder):
+        meta["accession"] = folder
+    return meta
+
+
+# -------------------- Extraction --------------------
+def extract_filing(path, tags=None):
+    """
+    Facts of a filing in num.txt schema and its sub.txt index record;
+    facts with malformed values are skipped and counted in the record.
+    Returns (index dict, list of fact dicts).
+    """
+    tags = default_tags() if tags is None else set(tags)
+    meta = filing_metadata(path)
+    adsh = meta.get("accession") or os.path.splitext(
+        os.path.basename(path))[0]
+
+    contexts = {}  # id -> (cik, ddate, qtrs) of contexts without segment
+    units = {}  # id -> uom
+    facts = []  # (tag, version, contextRef, unitRef, value)
+    dei = {}
+    ciks = set()
+    skipped = 0  # facts with malformed values
+
+    depth = 0
+    open_composites = 0
+    root = None
+    with open(path, "rb") as file:
+        events = ET.iterparse(EntityStream(file), events=("start", "end"))
+        for event, elem in events:
+            uri, name = namespace(elem.tag), local_name(elem.tag)
+            if event == "start":
+                if root is None:
+                    root = elem
+                depth += 1
+                open_composites += name in COMPOSITE
+                continue
+            depth -= 1
+            open_composites -= name in COMPOSITE
+            inline = "inlineXBRL" in uri
+
+            if uri == NS["xbrli"] and name == "context":
+                context = parse_context(elem)
+                if context is not None:
+                    contexts[elem.get("id")] = context
+                    ciks.add(context[0])
+            elif uri == NS["xbrli"] and name == "unit":
+                units[elem.get("id")] = parse_unit(elem)
+            elif inline and name in ("nonFraction", "nonNumeric"):
+                prefix, _, tag = elem.get("name", "").partition(":")
+                if prefix == "dei" and tag in DEI:
+                    dei[DEI[tag]] = "".join(elem.itertext()).strip()
+                elif prefix == "us-gaap" and tag in tags and \
+                        name == "nonFraction" and \
+                        elem.get("{%s}nil" % NS["xsi"]) != "true":
+                    value = fact_value("".join(elem.itertext()),
+                                       elem.attrib)
+                    if value is None:
+                        skipped += 1
+                    else:
+                        facts.append((tag, None, elem.get("contextRef"),
+                                      elem.get("unitRef"), value))
+            elif "fasb.org/us-gaap" in uri and name in tags:
+                if elem.text and elem.text.strip():
+                    value = fact_value(elem.text)
+                    if value is None:
+                        skipped += 1
+                    else:
+                        facts.append((name, uri, elem.get("contextRef"),
+                                      elem.get("unitRef"), value))
+            elif "xbrl.sec.gov/dei" in uri and name in DEI:
+                dei[DEI[name]] = (elem.text or "").strip()
+
+            # drop processed elements, the tree does not grow with the file
+            if open_composites == 0:
+                elem.clear()
+                if depth == 1:
+                    root.clear()
+
+    index, records = build_records(adsh, meta, dei, ciks, contexts, units,
+                                   facts)
+    index["skipped"] = skipped
+    return index, records
+
+
+def parse_context(elem):
+    """ (cik, ddate, qtrs) of a context, None for dimensional contexts """
+    if elem.find(".//{%s}segment" % NS["xbrli"]) is not None:
+        return None
+    identifier = elem.find(".//{%s}identifier" % NS["xbrli"])
+    cik = int(identifier.text.strip()) if identifier is not None and \
+        identifier.text.strip().isdigit() else None
+    instant = elem.find(".//{%s}instant" % NS["xbrli"])
+    if instant is not None:
+        return cik, as_ddate(instant.text), 0
+    start = elem.find(".//{%s}startDate" % NS["xbrli"])
+    end = elem.find(".//{%s}endDate" % NS["xbrli"])
+    if start is None or end is None:
+        return None
+    return cik, as_ddate(end.text), duration_qtrs(start.text, end.text)
+
+
+def parse_unit(elem):
+    """ uom of a unit as in num.txt, e.g. USD, shares """
+    measures = [
+        (measure.text or "").strip().split(":")[-1]
+        for measure in elem.iter("{%s}measure" % NS["xbrli"])
+    ]
+    return "/".join(measures)
+
+
+def build_records(adsh, meta, dei, ciks, contexts, units, facts):
+    ciks = sorted(cik for cik in ciks if cik is not None)
+    cik = meta.get("cik") or (ciks[0] if ciks else None)
+    version = next((uri for _, uri, *_ in facts if uri), "")
+    year = re.search(r"us-gaap/(\d{4})", version)
+    version = f"us-gaap/{year.group(1)}" if year else "us-gaap"
+
+    records = {}
+    for tag, _, contextRef, unitRef, value in facts:
+        context = contexts.get(contextRef)
+        if context is None:
+            continue
+        _, ddate, qtrs = context
+        key = (tag, ddate, qtrs, units.get(unitRef, unitRef))
+        # inline documents repeat facts, keep the first
+        if key not in records:
+            records[key] = {
+                "adsh": adsh,
+                "tag": tag,
+                "version": version,
+                "coreg": None,
+                "ddate": ddate,
+                "qtrs": qtrs,
+                "uom": key[3],
+                "value": value,
+            }
+
+    filed = meta.get("date") or dei.get("period")
+    index = {
+        "adsh": adsh,
+        "cik": cik,
+        "name": dei.get("name"),
+        "form": meta.get("form") or dei.get("form"),
+        "period": as_ddate(dei["period"]) if dei.get("period") else None,
+        "fy": dei.get("fy"),
+        "fp": dei.get("fp"),
+        "filed": as_ddate(filed) if filed else None,
+    }
+    return index, list(records.values())
+
+
+def find_filings(path=None):
+    """ Documents of filings under a scrapper download folder """
+    path = path or CONFIG["path"]
+    files = set()
+    for pattern in CONFIG["patterns"]:
+        files.update(
+            glob.glob(os.path.join(path, "**", pattern), recursive=True))
+    return sorted(files)
+
+
+def extract_filings(paths, tags=None, workers=None):
+    """
+    Facts of many filings on a process pool.
+    Returns (index, finData) DataFrames indexed by adsh, as
+    FinancialDataSEC.load.
+    """
+    import pandas as pd
+
+    workers = workers or CONFIG["workers"] or 1
+    tags = default_tags() if tags is None else set(tags)
+    results = {}
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(extract_filing, path, tags): path
+            for path in paths
+        }
+        for future in concurrent.futures.as_completed(futures):
+            path = futures[future]
+            try:
+                results[path] = future.result()
+            except (ET.ParseError, ValueError) as error:
+                # a bad document does not abort the run
+                if CONFIG["verbose"]:
+                    print(f"Skipped {path}: {error}")
+                continue
+            if CONFIG["verbose"] and results[path][0]["skipped"]:
+                print(f"Skipped {results[path][0]['skipped']} malformed "
+                      f"facts of {path}")
+
+    indexRows, factRows = [], []
+    for path in paths:
+        if path in results:
+            indexRows.append(results[path][0])
+            factRows.extend(results[path][1])
+
+    index = pd.DataFrame(indexRows, columns=INDEX_COLUMNS)
+    finData = pd.DataFrame(factRows, columns=FACT_COLUMNS)
+    # a document of a filing per adsh, in order of files; documents of
+    # a filing repeat facts, e.g. an instance next to its inline html
+    index = index.drop_duplicates("adsh").set_index("adsh").sort_index()
+    finData = finData.drop_duplicates(["adsh", "tag", "ddate", "qtrs", "uom"])
+    finData = finData.sort_values(["adsh", "tag", "ddate", "qtrs"],
+                                  kind="stable")
+    return index, finData.set_index("adsh")
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description='Extract XBRL facts of downloaded filings.')
+    parser.add_argument('path',
+                        nargs='?',
+                        default=CONFIG['path'],
+                        help='download folder of scrapper')
+    parser.add_argument('--output',
+                        default=sec_datareader.CONFIG['path']['data'],
+                        help='directory of index and findata csv')
+    parser.add_argument('--workers', type=int, default=CONFIG['workers'])
+    args = parser.parse_args(argv)
+
+    paths = find_filings(args.path)
+    index, finData = extract_filings(paths, workers=args.workers)
+    os.makedirs(args.output, exist_ok=True)
+    index.to_csv(os.path.join(args.output, "filings_index.csv"))
+    finData.to_csv(os.path.join(args.output, "filings_findata.csv"))
+    print(f"Extracted {len(finData)} facts of {len(index)} filings "
+          f"to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
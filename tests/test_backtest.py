@@ -0,0 +1,151 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evkit import backtest, sec_datareader
+
+
+def synthetic_sec(ciks, years, seed=0):
+    """ SEC index and financial data of yearly 10-K filings """
+    rng = np.random.default_rng(seed)
+    tags = {
+        field: tags[0]
+        for field, tags in sec_datareader.CONFIG["statementTags"].items()
+    }
+    subs, nums = [], []
+    for cik in ciks:
+        scale = rng.uniform(1e8, 1e10)
+        for year in years:
+            adsh = f"{cik:010d}-{year}"
+            ddate = year * 10000 + 1231
+            subs.append((adsh, cik, (year + 1) * 10000 + 215, "10-K"))
+            revenue = scale * (1 + 0.05 * (year - years[0]))
+            values = {
+                "revenue": revenue,
+                "ebit": revenue * 0.2,
+                "interest": revenue * 0.01,
+                "tax": revenue * 0.04,
+                "cash": revenue * 0.1,
+                "current_assets": revenue * 0.5,
+                "total_assets": revenue * 2,
+                "current_liabilities": revenue * 0.3,
+                "st_debt": revenue * 0.1,
+                "lt_debt": revenue * 0.4,
+                "equity": revenue,
+                "depreciation": revenue * 0.05,
+                "capex": revenue * 0.06,
+                "shares": scale / 50,
+            }
+            for field, value in values.items():
+                qtrs = 0 if field in backtest.STOCKS else 4
+                nums.append((adsh, tags[field], ddate, qtrs, "USD", value))
+                # prior year comparatives are repeated in every filing
+                nums.append((adsh, tags[field], ddate - 10000, qtrs, "USD",
+                             value * 0.95))
+    index = pd.DataFrame(subs, columns=["adsh", "cik", "filed", "form"])
+    finData = pd.DataFrame(
+        nums, columns=["adsh", "tag", "ddate", "qtrs", "uom", "value"])
+    finData["coreg"] = np.nan
+    return index.set_index("adsh"), finData.set_index("adsh")
+
+
+def synthetic_prices(ciks, quarters, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.02, 0.1, size=(len(quarters), len(ciks)))
+    prices = 50 * np.cumprod(1 + returns, axis=0)
+    return pd.DataFrame(prices, index=quarters, columns=ciks)
+
+
+class TestBacktest(unittest.TestCase):
+    """
+    Tests for vectorized backtest of the DCF-WACC signal.
+    """
+    def setUp(self):
+        self.cache = tempfile.mkdtemp()
+        self.config = {"path": dict(backtest.CONFIG["path"]),
+                       "verbose": backtest.CONFIG["verbose"]}
+        backtest.CONFIG["path"]["cache"] = self.cache + "/"
+        backtest.CONFIG["verbose"] = False
+        self.ciks = [320193, 789019, 1018724, 1652044]
+        self.index, self.finData = synthetic_sec(self.ciks,
+                                                 list(range(2009, 2020)))
+        quarters = np.arange(2010 * 4, 2021 * 4)
+        self.prices = synthetic_prices(self.ciks, quarters)
+        self.backtest = backtest.Backtest(self.finData, self.index,
+                                          self.prices)
+        return super().setUp()
+
+    def tearDown(self):
+        backtest.CONFIG.update(self.config)
+        shutil.rmtree(self.cache)
+        return super().tearDown()
+
+    def test_panel_is_point_in_time(self):
+        panel = self.backtest.build_panel()
+        self.assertEqual(panel["revenue"].shape, (44, 4))
+        # 2009 annual report is filed in 2010q1
+        self.assertFalse(np.isnan(panel["revenue"][0]).any())
+        # 2010 annual report is not known until 2011q1
+        np.testing.assert_array_equal(panel["revenue"][3],
+                                      panel["revenue"][0])
+        self.assertTrue((panel["revenue"][4] > panel["revenue"][3]).all())
+        self.assertTrue((panel["interest"] < 0).all())
+
+    def test_panel_as_first_reported(self):
+        panel = self.backtest.build_panel()
+        revenue = self.finData[self.finData["tag"] == "Revenues"]
+        for i, cik in enumerate(self.ciks):
+            # FY2009 of the 2009 annual report, not the restated
+            # comparative FY2008 nor FY2009 of the 2010 report
+            reported = revenue.loc[f"{cik:010d}-2009"]
+            fy2009 = reported[reported["ddate"] == 20091231]["value"]
+            self.assertEqual(panel["revenue"][0, i], fy2009.iloc[0])
+            reported = revenue.loc[f"{cik:010d}-2010"]
+            fy2010 = reported[reported["ddate"] == 20101231]["value"]
+            self.assertEqual(panel["revenue"][4, i], fy2010.iloc[0])
+
+    def test_history_lags_yearly(self):
+        panel = self.backtest.build_panel()
+        revenue = backtest.history(panel["revenue"])
+        np.testing.assert_array_equal(revenue[-1, :, 2], panel["revenue"][-5])
+        self.assertTrue(np.isnan(revenue[:12, :, 0]).all())
+
+    def test_run(self):
+        performance = self.backtest.run()
+        self.assertIsInstance(performance, (pd.DataFrame, ))
+        self.assertGreater(len(performance), 0)
+        self.assertTrue(np.isfinite(self.backtest.valuation["wacc"][-1]).all())
+        self.assertTrue(np.isfinite(self.backtest.summary["mean_ic"]))
+
+    def test_cached_panels(self):
+        self.backtest.run()
+        cached = sorted(os.listdir(self.cache))
+        self.assertEqual(len(cached), 2)
+        rerun = backtest.Backtest(self.finData, self.index, self.prices)
+        rerun.run()
+        self.assertEqual(sorted(os.listdir(self.cache)), cached)
+        pd.testing.assert_frame_equal(rerun.performance,
+                                      self.backtest.performance)
+
+    def test_cache_key(self):
+        key = self.backtest._key()
+        # restated fact, same number of rows
+        restated = self.finData.copy()
+        restated.iloc[0, restated.columns.get_loc("value")] *= 1.1
+        self.assertNotEqual(
+            backtest.Backtest(restated, self.index, self.prices)._key(), key)
+        prices = self.prices.copy()
+        prices.iloc[-1, 0] += 1
+        self.assertNotEqual(
+            backtest.Backtest(self.finData, self.index, prices)._key(), key)
+        self.assertEqual(
+            backtest.Backtest(self.finData.copy(), self.index.copy(),
+                              self.prices.copy())._key(), key)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,102 @@
+import contextlib
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+from benchmarks import suite, synthetic
+from evkit import valuation
+
+
+class TestBenchmarks(unittest.TestCase):
+    """
+    Tests for the benchmark suite of the valuation engine.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        self.minTime = suite.CONFIG["minTime"]
+        suite.CONFIG["minTime"] = 0.001
+        return super().setUp()
+
+    def tearDown(self):
+        suite.CONFIG["minTime"] = self.minTime
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def test_synthetic_universe(self):
+        data = synthetic.universe(100)
+        self.assertEqual(set(data["statements"]), set(valuation.FIELDS))
+        self.assertEqual(data["statements"]["revenue"].shape,
+                         (100, valuation.HISTORY))
+        self.assertTrue((data["statements"]["capex"] < 0).all())
+        np.testing.assert_array_equal(synthetic.universe(100)["mkt_price"],
+                                      data["mkt_price"])
+
+    def test_per_ticker_path_matches_batch(self):
+        data = synthetic.universe(20)
+        batch = suite.value_universe(data)
+        for i, row in enumerate(synthetic.rows(data, 20)):
+            with np.errstate(all="ignore"):
+                result = suite.value_ticker(data, i, row)
+            self.assertAlmostEqual(result["wacc"], batch["wacc"][i])
+            self.assertAlmostEqual(result["stock_price"],
+                                   batch["stock_price"][i])
+
+    def test_regressions(self):
+        cases = ["financials.dcf", "valuation.value_universe"]
+        results = suite.run_size(10, cases=cases, repeat=1)
+        self.assertEqual([r["case"] for r in results], cases)
+        self.assertTrue(all(r["throughput"] > 0 for r in results))
+        self.assertGreater(results[1]["peak"], 0)
+
+        path = suite.save_baselines(results, self.path + "baselines.json")
+        baselines = suite.load_baselines(path)
+        suite.compare(results, baselines)
+        self.assertEqual([r["regression"] for r in results], [[], []])
+
+        baselines["financials.dcf@10"]["throughput"] *= 10
+        baselines["valuation.value_universe@10"]["peak"] //= 100
+        suite.compare(results, baselines, tolerance=0.25)
+        self.assertEqual(results[0]["regression"], ["throughput"])
+        self.assertAlmostEqual(results[0]["speedup"], 0.1, delta=0.01)
+        # small peaks within slack
+        self.assertEqual(results[1]["regression"], [])
+
+    def test_command_line(self):
+        """ Exit status of the regression gate, on injected results """
+        path = self.path + "baselines.json"
+        results = [{
+            "case": "financials.dcf",
+            "size": 10,
+            "tickers": 10,
+            "seconds": 0.01,
+            "throughput": 1000.0,
+            "peak": 1000,
+        }]
+        argv = ["--sizes", "10", "--cases", "financials.dcf", "--repeat",
+                "1", "--baselines", path]
+
+        def run_size(size, cases=None, repeat=None):
+            return [dict(result) for result in results]
+
+        with mock.patch.object(suite, "run_size", run_size), \
+                contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(suite.main([*argv, "--update"]), 0)
+            self.assertTrue(os.path.exists(path))
+            self.assertEqual(suite.main(argv), 0)
+            with open(path) as file:
+                baselines = json.load(file)
+            baselines["results"]["financials.dcf@10"]["throughput"] *= 10
+            with open(path, "w") as file:
+                json.dump(baselines, file)
+            self.assertEqual(suite.main(argv), 1)
+            self.assertEqual(suite.main([*argv, "--tolerance", "0.95"]), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+import concurrent.futures
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evkit import beta, capital, runner
+
+BETAS = {"AAA": 0.5, "BBB": 1.0, "CCC": 1.8}
+
+
+def price_history(days=800, seed=0):
+    """ Daily closes of the market and of tickers with known betas """
+    rng = np.random.default_rng(seed)
+    dates = pd.bdate_range("2017-01-02", periods=days)
+    market = rng.normal(0.0004, 0.01, size=days)
+    frames = [pd.DataFrame({
+        "date": dates.strftime("%Y-%m-%d"),
+        "ticker": "^GSPC",
+        "close": 2000 * np.cumprod(1 + market),
+    })]
+    for ticker, value in BETAS.items():
+        returns = value * market + rng.normal(0, 0.002, size=days)
+        frames.append(pd.DataFrame({
+            "date": dates.strftime("%Y-%m-%d"),
+            "ticker": ticker,
+            "close": 50 * np.cumprod(1 + returns),
+        }))
+    return pd.concat(frames, ignore_index=True)
+
+
+def worker_lookup(ticker):
+    """ Beta source and lookup of a spawned pool worker """
+    return runner.CONFIG["betaSource"], beta.lookup(ticker)
+
+
+class TestRollingBeta(unittest.TestCase):
+
+    def test_ols(self):
+        rng = np.random.default_rng(1)
+        market = rng.normal(size=30)
+        returns = rng.normal(size=(30, 4))
+        returns[3, 2] = np.nan
+        betas = beta.rolling_beta(returns, market, window=10, min_periods=5)
+        for i in range(4):
+            slope = np.polyfit(market[20:], returns[20:, i], 1)[0]
+            self.assertAlmostEqual(betas[-1, i], slope)
+        # incomplete windows
+        self.assertTrue(np.isnan(betas[:4]).all())
+
+
+class TestBetaEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.path = os.path.join(self.folder, "prices.csv")
+        self.prices = price_history()
+        self.prices.to_csv(self.path, index=False)
+        self.config = {"path": dict(beta.CONFIG["path"]),
+                       "table": beta.CONFIG["table"],
+                       "verbose": beta.CONFIG["verbose"]}
+        beta.CONFIG["path"]["cache"] = os.path.join(self.folder, "betas", "")
+        beta.CONFIG["verbose"] = False
+
+    def tearDown(self):
+        beta.CONFIG.update(self.config)
+        beta.TABLES.clear()
+        os.environ.pop(beta.TABLE_VARIABLE, None)
+        runner.set_beta_source("yahoo")
+        os.environ.pop("EVKIT_BETA_SOURCE")
+        shutil.rmtree(self.folder)
+
+    def test_compute(self):
+        engine = beta.BetaEngine(self.path, window=52, frequency="W",
+                                 min_periods=26)
+        table = engine.compute()
+        self.assertEqual(table["ticker"].tolist(), sorted(BETAS))
+        np.testing.assert_allclose(table["beta"], list(BETAS.values()),
+                                   atol=0.05)
+        last = self.prices.groupby("ticker")["close"].last()
+        np.testing.assert_allclose(table["close"], last[sorted(BETAS)])
+        self.assertEqual(str(table["date"]), self.prices["date"].max())
+
+    def test_as_of_date(self):
+        engine = beta.BetaEngine(self.path, window=60, frequency="D",
+                                 min_periods=60)
+        table = engine.compute("2017-02-15")
+        self.assertEqual(str(table["date"]), "2017-02-15")
+        # fewer quotes than min_periods
+        self.assertTrue(np.isnan(table["beta"]).all())
+
+    def test_cache(self):
+        engine = beta.BetaEngine(self.path, window=12, frequency="M",
+                                 min_periods=6)
+        first = engine.compute()
+        cached = beta.BetaEngine(self.path, window=12, frequency="M",
+                                 min_periods=6)
+        second = cached.compute()
+        # read from the cache, prices are not loaded
+        self.assertIsNone(cached.closes)
+        np.testing.assert_array_equal(first["beta"], second["beta"])
+        other = beta.BetaEngine(self.path, window=24, frequency="M",
+                                min_periods=6)
+        other.compute()
+        self.assertEqual(len(os.listdir(beta.CONFIG["path"]["cache"])), 2)
+
+    def test_equal_weighted_market(self):
+        engine = beta.BetaEngine(self.path, market="^NONE", window=52,
+                                 min_periods=26)
+        tickers, dates, betas = engine.history()
+        self.assertIn("^GSPC", tickers)
+        self.assertEqual(betas.shape, (len(dates), len(tickers)))
+
+    def test_cost_of_capital(self):
+        beta.BetaEngine(self.path, window=52, frequency="W",
+                        min_periods=26).compute()
+        cap = capital.CostOfCapital("CCC", rf=0.02, mrp=0.05)
+        equity_beta, mkt_price = cap.get_local_summary()
+        self.assertAlmostEqual(equity_beta, BETAS["CCC"], delta=0.05)
+        self.assertGreater(mkt_price, 0)
+        self.assertEqual(
+            capital.CostOfCapital("MISSING", 0.02, 0.05).get_local_summary(),
+            (None, None))
+
+    def test_spawned_workers(self):
+        # prices of a non default path, not known to a fresh process
+        beta.BetaEngine(self.path, window=52, frequency="W",
+                        min_periods=26).compute()
+        runner.set_beta_source("prices")
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=1, mp_context=context) as pool:
+            source, values = pool.submit(worker_lookup, "CCC").result()
+        self.assertEqual(source, "prices")
+        self.assertEqual(values, beta.lookup("CCC"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evkit import factpanel, sec_datareader
+from tests.test_backtest import synthetic_sec
+
+
+class TestFactPanel(unittest.TestCase):
+    """
+    Tests for the company and tag panel of SEC facts.
+    """
+    def setUp(self):
+        factpanel.CONFIG["verbose"] = False
+        self.path = tempfile.mkdtemp() + "/"
+        self.ciks = [789019, 320193, 1652044]
+        self.index, self.finData = synthetic_sec(self.ciks,
+                                                 list(range(2012, 2020)))
+        self.facts = self.finData.reset_index().join(
+            self.index[["cik", "filed"]], on="adsh")
+        self.panel = factpanel.FactPanel.from_facts(self.finData, self.index)
+        return super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def expected(self, cik, tag):
+        """ Series of boolean filtering, latest filed fact wins """
+        facts = self.facts[(self.facts["cik"] == cik) &
+                           (self.facts["tag"] == tag)]
+        facts = facts.sort_values(["ddate", "qtrs", "filed"])
+        return facts.drop_duplicates(["ddate", "qtrs"], keep="last")
+
+    def test_series_slices(self):
+        self.assertEqual(list(self.panel.cik), sorted(self.ciks))
+        for cik in self.ciks:
+            for tag in ("Revenues", "Assets", "StockholdersEquity"):
+                ddate, value = self.panel.series(cik, tag)
+                expected = self.expected(cik, tag)
+                np.testing.assert_array_equal(ddate, expected["ddate"])
+                np.testing.assert_array_equal(value, expected["value"])
+        # restated comparatives of later filings are not kept
+        _, value = self.panel.series(320193, "Revenues")
+        self.assertEqual(len(value), 9)
+        self.assertTrue(np.shares_memory(value, self.panel.value))
+
+    def test_units(self):
+        # a later filing reports FY2019 revenue in another currency
+        index = pd.concat([
+            self.index,
+            pd.DataFrame({"cik": [320193], "filed": [20210215],
+                          "form": ["20-F"]},
+                         index=pd.Index(["0000320193-2020f"], name="adsh"))
+        ])
+        foreign = pd.DataFrame(
+            {"tag": ["Revenues"] * 2, "ddate": [20191231] * 2,
+             "qtrs": [4] * 2, "uom": ["EUR", "USD"], "value": [1.0, 2.0],
+             "coreg": [np.nan] * 2},
+            index=pd.Index(["0000320193-2020f"] * 2, name="adsh"))
+        expected = self.expected(320193, "Revenues")["value"].iloc[-1]
+        panel = factpanel.FactPanel.from_facts(
+            pd.concat([self.finData, foreign.iloc[:1]]), index)
+        self.assertEqual(panel.series(320193, "Revenues", qtrs=4)[1][-1],
+                         expected)
+        panel = factpanel.FactPanel.from_facts(
+            pd.concat([self.finData, foreign]), index)
+        self.assertEqual(panel.series(320193, "Revenues", qtrs=4)[1][-1], 2.0)
+
+    def test_unknown_keys(self):
+        self.assertEqual(len(self.panel.series(1, "Revenues")[0]), 0)
+        self.assertEqual(len(self.panel.series(320193, "Goodwill")[0]), 0)
+        tags = self.panel.company_tags(320193)
+        self.assertEqual(tags, sorted(tags))
+        self.assertIn("Revenues", tags)
+
+    def test_memory_mapped(self):
+        self.panel.save(self.path)
+        loaded = factpanel.FactPanel.load(self.path)
+        self.assertIsInstance(loaded.value, np.memmap)
+        self.assertEqual(len(loaded), len(self.panel))
+        np.testing.assert_array_equal(
+            loaded.series(1652044, "Assets", qtrs=0)[1],
+            self.panel.series(1652044, "Assets", qtrs=0)[1])
+
+    def test_latest(self):
+        revenue = self.panel.latest([320193, 1, 789019], "Revenues",
+                                    qtrs=4, periods=3)
+        self.assertEqual(revenue.shape, (3, 3))
+        self.assertTrue(np.isnan(revenue[1]).all())
+        expected = self.expected(789019, "Revenues")["value"].to_numpy()
+        np.testing.assert_array_equal(revenue[2], expected[-3:])
+
+    def test_statement_fields(self):
+        facts = sec_datareader.statement_facts(self.finData, self.index)
+        panel = factpanel.FactPanel.from_frame(facts, key="field")
+        _, interest = panel.series(320193, "interest", qtrs=4)
+        self.assertTrue((interest < 0).all())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import json
+import os
+import subprocess
+import sys
+import unittest
+
+# modules of the valuation core, imported by short-lived workers
+CORE = ("evkit.valuation", "evkit.financials", "evkit.capital",
+        "evkit.runner")
+# loaded on first use only
+LAZY = ("pandas", "matplotlib", "bs4", "requests", "html5lib")
+# seconds to import the core on top of numpy
+BUDGET = 0.5
+
+SCRIPT = f"""
+import json, sys, time
+import numpy
+start = time.perf_counter()
+for module in {CORE!r}:
+    __import__(module)
+elapsed = time.perf_counter() - start
+print(json.dumps({{
+    "elapsed": elapsed,
+    "loaded": [m for m in {LAZY!r} if m in sys.modules],
+}}))
+"""
+
+
+class TestImports(unittest.TestCase):
+    """
+    Import-time guard of the valuation core.
+    """
+    def test_core_imports(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.run([sys.executable, "-c", SCRIPT],
+                                cwd=root,
+                                capture_output=True,
+                                text=True,
+                                check=True).stdout
+        result = json.loads(output)
+        self.assertEqual(result["loaded"], [])
+        self.assertLess(result["elapsed"], BUDGET)
+
+
+if __name__ == '__main__':
+    unittest.main()
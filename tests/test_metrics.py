@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from evkit import financials, metrics, runner
+from tests.test_runner import fake_valuation
+
+
+def timed_valuation(ticker=None, rf=0.02, mrp=0.05, horizon=5):
+    """ Stand-in valuation recording the dcf timer """
+    financials.dcf(ebit=np.ones(9),
+                   dna=np.ones(9),
+                   nwc=np.zeros(9),
+                   capex=-np.ones(9),
+                   tax_rate=0.21,
+                   lt_growth=0.02,
+                   wacc=0.08,
+                   dt=np.ones(6))
+    return fake_valuation(ticker or "T000", rf, mrp, horizon)
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Tests for instrumentation of valuation runs.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        metrics.REGISTRY.reset()
+        metrics.enable()
+        return super().setUp()
+
+    def tearDown(self):
+        metrics.enable(False)
+        metrics.REGISTRY.reset()
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def test_disabled(self):
+        metrics.enable(False)
+        metrics.inc("requests_total")
+        with metrics.timer("block_seconds"):
+            pass
+        summary = metrics.REGISTRY.summary()
+        self.assertEqual(summary["counters"], [])
+        self.assertEqual(summary["histograms"], [])
+
+    def test_instrumented_dcf(self):
+        for _ in range(3):
+            timed_valuation()
+        metrics.inc("tickers_total", outcome="valued")
+        metrics.inc("tickers_total", 2, outcome="valued")
+        metrics.observe("http_response_bytes", 50_000)
+
+        summary = metrics.REGISTRY.summary()
+        [dcf] = [h for h in summary["histograms"] if h["name"] == "dcf_seconds"]
+        self.assertEqual(dcf["count"], 3)
+        self.assertEqual(sum(dcf["buckets"].values()), 3)
+        self.assertEqual(summary["counters"][0]["value"], 3)
+
+        text = metrics.REGISTRY.prometheus()
+        self.assertIn('evkit_tickers_total{outcome="valued"} 3', text)
+        self.assertIn("# TYPE evkit_dcf_seconds histogram", text)
+        self.assertIn('evkit_dcf_seconds_bucket{le="+Inf"} 3', text)
+        self.assertIn('evkit_http_response_bytes_bucket{le="100000"} 1',
+                      text)
+        self.assertIn('evkit_http_response_bytes_bucket{le="10000"} 0', text)
+
+        metrics.to_prometheus(self.path + "run.prom")
+        metrics.to_json(self.path + "run.json", universe="test")
+        with open(self.path + "run.json") as file:
+            report = json.load(file)
+        self.assertEqual(report["run"], {"universe": "test"})
+        self.assertEqual(len(report["histograms"]), 2)
+        self.assertTrue(os.path.getsize(self.path + "run.prom") > 0)
+
+    def test_process_workers(self):
+        # recorded by the parent, not copied into forked workers
+        timed_valuation()
+        tickers = [f"T{i:03d}" for i in range(12)]
+        for executor in ("process", "thread"):
+            results = list(
+                runner.iter_valuations(tickers, 0.02, 0.05, workers=2,
+                                       executor=executor,
+                                       task=timed_valuation))
+            self.assertEqual([ticker for _, ticker, _ in results], tickers)
+        summary = metrics.REGISTRY.summary()
+        [timer] = [h for h in summary["histograms"]
+                   if h["name"] == "dcf_seconds"]
+        self.assertEqual(timer["count"], 1 + 2 * len(tickers))
+        self.assertEqual(sum(timer["buckets"].values()), timer["count"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import pandas as pd
+
+from evkit import pipeline, runner, valuation
+from tests.test_runner import fake_valuation
+
+
+def fake_fetch(ticker):
+    """ Stand-in pages of a ticker """
+    if ticker.endswith("9"):
+        raise ConnectionError("timed out")
+    return {"summary": ticker}
+
+
+def fake_decode(ticker, pages, rf, mrp):
+    """ Stand-in decoded statements, valued by fake_valuation """
+    return fake_valuation(pages["summary"], rf, mrp)
+
+
+class TestPipeline(unittest.TestCase):
+    """
+    Tests for pipelined fetch, decode and valuation of tickers.
+    """
+    def setUp(self):
+        runner.CONFIG["verbose"] = False
+        pipeline.CONFIG["verbose"] = False
+        self.output = tempfile.mkdtemp() + "/"
+        self.tickers = [f"T{i:03d}" for i in range(60)]
+        self.patches = [
+            mock.patch.object(pipeline, "fetch_ticker", fake_fetch),
+            mock.patch.object(pipeline, "decode_ticker", fake_decode),
+        ]
+        for patch in self.patches:
+            patch.start()
+        return super().setUp()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        shutil.rmtree(self.output)
+        return super().tearDown()
+
+    def test_run(self):
+        """ Every ticker comes out once, failures as None results """
+        pipe = pipeline.Pipeline(fetch=4, decode=2, value=1)
+        results = {
+            ticker: (num, values)
+            for num, ticker, values in pipe.run(self.tickers, 0.02, 0.05,
+                                                skip={"T001"})
+        }
+        self.assertEqual(len(results), len(self.tickers) - 1)
+        self.assertNotIn("T001", results)
+        for ticker, (num, values) in results.items():
+            self.assertEqual(self.tickers[num], ticker)
+            if ticker.endswith("9"):
+                self.assertIn("fetch", values["error"])
+                self.assertIsNone(values["wacc"])
+            else:
+                self.assertEqual(values, fake_valuation(ticker, 0.02, 0.05))
+
+        stats = {stats["stage"]: stats for stats in pipe.stats()}
+        self.assertEqual(stats["fetch"]["errors"], 6)
+        self.assertEqual(stats["value"]["items"], len(self.tickers) - 1)
+
+    def test_early_stop(self):
+        """ Closing the stream stops every stage """
+        pipe = pipeline.Pipeline(fetch=2, decode=1, value=1)
+        stream = pipe.run(self.tickers, 0.02, 0.05)
+        next(stream)
+        stream.close()
+        for stage in pipe.stages:
+            for thread in stage.threads:
+                thread.join(timeout=5)
+                self.assertFalse(thread.is_alive())
+
+    def test_stage_failure(self):
+        """ A worker failing outside a ticker ends the stream """
+        observe = pipeline.metrics.observe
+
+        def failing(name, value, stage=None):
+            if stage == "decode":
+                raise RuntimeError("decode failed")
+            observe(name, value, stage=stage)
+
+        pipe = pipeline.Pipeline(fetch=2, decode=2, value=1)
+        with mock.patch.object(pipeline.metrics, "observe", failing):
+            with self.assertRaisesRegex(RuntimeError, "decode failed"):
+                list(pipe.run(self.tickers, 0.02, 0.05))
+
+        def tickers():
+            yield from self.tickers[:5]
+            raise OSError("universe unavailable")
+
+        with self.assertRaisesRegex(OSError, "universe unavailable"):
+            list(pipe.run(tickers(), 0.02, 0.05))
+
+    def test_run_batch(self):
+        """ Pipeline is a drop-in stream of run_batch """
+        tickers_df = pd.DataFrame({
+            "ticker": self.tickers,
+            "name": self.tickers
+        })
+        report_df = runner.run_batch(tickers_df,
+                                     "pipe",
+                                     rf=0.02,
+                                     mrp=0.05,
+                                     output=self.output,
+                                     stream=pipeline.Pipeline().run)
+        self.assertEqual(list(report_df.ticker), self.tickers)
+        expected = fake_valuation("T000", 0.02, 0.05)
+        for key in valuation.RESULTS:
+            self.assertAlmostEqual(report_df[key][0], expected[key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evkit import plot
+
+
+def synthetic_report(size, seed=0):
+    rng = np.random.default_rng(seed)
+    mkt_price = rng.lognormal(3, 1, size)
+    report = pd.DataFrame({
+        "beta_asset": rng.normal(1, 0.3, size),
+        "wacc": rng.normal(0.08, 0.02, size),
+        "stock_price": mkt_price * rng.lognormal(0, 0.5, size),
+        "mkt_stock_price": mkt_price,
+    })
+    # missing trading information
+    report.iloc[::10] = np.nan
+    return report
+
+
+class TestPlot(unittest.TestCase):
+    """
+    Tests for headless charts of valuation reports.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        return super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def test_large_universe(self):
+        """ 100k points render as density in seconds """
+        start = time.perf_counter()
+        paths = plot.plot_report(synthetic_report(100_000), "large",
+                                 self.path)
+        self.assertLess(time.perf_counter() - start, 10)
+        for path in paths:
+            self.assertTrue(os.path.getsize(path) > 0)
+
+    def test_per_sector(self):
+        reports = {
+            sector: synthetic_report(200, seed)
+            for seed, sector in enumerate(["energy", "utilities", "tech"])
+        }
+        charts = plot.plot_reports(reports, self.path, workers=2)
+        self.assertEqual(sorted(charts), sorted(reports))
+        self.assertEqual(len(os.listdir(self.path)), 6)
+        self.assertIn(self.path + "energy-beta_wacc.png", charts["energy"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import pstats
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from evkit import profiling
+
+
+def busy(seconds):
+    """ Spin for a number of seconds """
+    end = time.perf_counter() + seconds
+    total = 0
+    while time.perf_counter() < end:
+        total += sum(range(100))
+    return total
+
+
+def allocate(size):
+    return [bytearray(1000) for _ in range(size)]
+
+
+def value(ticker, seconds):
+    with profiling.ticker(ticker):
+        with profiling.stage("statements"):
+            busy(seconds)
+            with profiling.stage("valuation"):
+                allocate(1000)
+
+
+class TestProfiling(unittest.TestCase):
+    """
+    Tests for per-stage profiles, sampled stacks and memory peaks.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp() + "/"
+        return super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def test_inactive(self):
+        self.assertIsNone(profiling.ACTIVE)
+        value("T000", 0.001)
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_stage_profiles(self):
+        with profiling.Profiler(path=self.path, memory=True, tickers=2):
+            threads = [
+                threading.Thread(target=value, args=(f"T{i:03d}", 0.05 * i))
+                for i in range(1, 5)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertIsNone(profiling.ACTIVE)
+
+        files = set(os.listdir(self.path))
+        for name in ["statements.prof", "valuation.prof",
+                     "statements.collapsed", "tickers.collapsed",
+                     "tickers.txt", "memory.txt"]:
+            self.assertIn(name, files)
+
+        stats = pstats.Stats(self.path + "statements.prof")
+        functions = {func for _, _, func in stats.stats}
+        self.assertIn("busy", functions)
+        # nested stage is profiled on its own
+        self.assertNotIn("allocate", functions)
+        stats = pstats.Stats(self.path + "valuation.prof")
+        self.assertIn("allocate", {func for _, _, func in stats.stats})
+
+        with open(self.path + "statements.collapsed") as file:
+            stack, count = file.readline().rsplit(" ", 1)
+        self.assertIn("test_profiling:busy", stack)
+        self.assertTrue(int(count) > 0)
+
+        with open(self.path + "tickers.txt") as file:
+            slowest = [line.split("\t")[0] for line in file]
+        self.assertEqual(slowest, ["T004", "T003"])
+        with open(self.path + "tickers.collapsed") as file:
+            tickers = {line.split(";")[0] for line in file}
+        self.assertTrue(tickers <= {"T004", "T003"})
+
+        with open(self.path + "memory.txt") as file:
+            report = file.read()
+        self.assertIn("valuation", report)
+        self.assertIn("test_profiling.py", report)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evkit import reports, valuation
+
+
+def synthetic_report(tickers, seed):
+    rng = np.random.default_rng(seed)
+    report = pd.DataFrame({
+        "ticker": tickers,
+        "name": [f"Company {ticker}" for ticker in tickers],
+    })
+    for key in valuation.RESULTS:
+        report[key] = rng.normal(size=len(tickers))
+    # missing trading information
+    report.loc[0, list(valuation.RESULTS)] = np.nan
+    return report
+
+
+class TestReportStore(unittest.TestCase):
+    """
+    Tests for the date and sector partitioned report store.
+    """
+    def setUp(self):
+        reports.CONFIG["verbose"] = False
+        self.path = tempfile.mkdtemp() + "/"
+        self.store = reports.ReportStore(self.path)
+        self.runs = {}
+        for day in range(1, 6):
+            date = 20200100 + day
+            for sector, tickers in [("energy", ["XOM", "CVX", "BP"]),
+                                    ("large_cap", ["AAPL", "XOM", "MSFT"])]:
+                report = synthetic_report(tickers, seed=day)
+                self.store.write(report, sector=sector, date=date)
+                self.runs[date, sector] = report
+        return super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def test_history(self):
+        history = reports.ReportStore(self.path).history("XOM")
+        self.assertEqual(len(history), 10)
+        self.assertEqual(history["date"].dtype, np.int32)
+        first = history.iloc[0]
+        expected = self.runs[20200101, "energy"].iloc[0]
+        self.assertEqual(first["sector"], "energy")
+        for key in valuation.RESULTS:
+            self.assertTrue(np.isnan(first[key]) and np.isnan(expected[key]))
+
+        history = self.store.history("CVX", start="2020-01-03", end=20200104)
+        self.assertEqual(list(history["date"]), [20200103, 20200104])
+        row = self.runs[20200104, "energy"].set_index("ticker").loc["CVX"]
+        self.assertAlmostEqual(history["wacc"].iloc[-1], row["wacc"])
+
+    def test_pruning(self):
+        # partitions without a ticker in range are not read
+        self.assertEqual(len(self.store.partitions(tickers=["AAPL"])), 5)
+        # in range, but not in the ticker set
+        self.assertEqual(len(self.store.partitions(tickers=["MSFT"])), 5)
+        self.assertEqual(self.store.partitions(tickers=["GOOG", "DVN"]), [])
+        self.assertEqual(len(self.store.history("MSFT")), 5)
+        for entry in self.store.manifest:
+            del entry["tickerBloom"]
+        self.assertEqual(len(self.store.partitions(tickers=["MSFT"])), 10)
+        self.assertEqual(len(self.store.partitions(sectors=["energy"],
+                                                   start=20200105)), 1)
+        loaded = self.store.load(sectors=["large_cap"],
+                                 columns=["ticker", "wacc"])
+        self.assertEqual(list(loaded.columns), ["sector", "ticker", "wacc"])
+        self.assertEqual(len(loaded), 15)
+
+    def test_compact(self):
+        before = self.store.load()
+        # a later run of the same day restates results
+        restated = synthetic_report(["XOM", "CVX", "BP"], seed=99)
+        self.store.write(restated, sector="energy", date=20200105)
+
+        merged = self.store.compact(before=20200201)
+        self.assertEqual(merged, 11)
+        store = reports.ReportStore(self.path)
+        self.assertEqual(len(store.manifest), 2)
+        self.assertEqual(sorted(os.listdir(self.path)),
+                         ["manifest.json", "month=202001"])
+
+        after = store.load()
+        self.assertEqual(len(after), len(before))
+        last = after[(after.date == 20200105) & (after.sector == "energy")]
+        np.testing.assert_allclose(
+            last.set_index("ticker").loc[["XOM", "CVX", "BP"], "wacc"],
+            restated["wacc"])
+        pd.testing.assert_frame_equal(
+            after[after.sector == "large_cap"].reset_index(drop=True),
+            before[before.sector == "large_cap"].reset_index(drop=True))
+
+        # compaction merges new days into the monthly partition
+        self.store = store
+        store.write(synthetic_report(["BP"], seed=7), "energy", 20200110)
+        self.assertEqual(store.compact(before=20200201), 2)
+        self.assertEqual(len(store.history("BP", sectors=["energy"])), 6)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,302 @@
+import gc
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import weakref
+import zlib
+from unittest import mock
+
+import pandas as pd
+
+from evkit import capital, financials, runner, sink, utils, valuation
+
+
+def fake_valuation(ticker, rf, mrp, horizon=5):
+    """ Deterministic stand-in of safe_value_ticker """
+    seed = zlib.crc32(ticker.encode())
+    # finish out of submission order
+    time.sleep(seed % 7 / 1000)
+    if seed % 5 == 0:
+        return dict.fromkeys(valuation.RESULTS)
+    values = {key: (seed % 1000) / 100 + i for i, key in
+              enumerate(valuation.RESULTS)}
+    values['wacc'] = rf + mrp * horizon
+    return values
+
+
+class Interrupted:
+    """ Stand-in valuation interrupted by user after a number of tickers """
+    def __init__(self, after):
+        self.after = after
+        self.calls = []
+
+    def __call__(self, ticker, rf, mrp, horizon=5):
+        if len(self.calls) == self.after:
+            raise KeyboardInterrupt
+        self.calls.append(ticker)
+        return fake_valuation(ticker, rf, mrp, horizon)
+
+
+class TestRunner(unittest.TestCase):
+    """
+    Tests for batch valuation of a universe of tickers.
+    """
+    def setUp(self):
+        runner.CONFIG["verbose"] = False
+        self.output = tempfile.mkdtemp() + "/"
+        self.tickers = [f"T{i:03d}" for i in range(40)]
+        self.tickers_df = pd.DataFrame({
+            "ticker": self.tickers,
+            "name": [f"Company {t}" for t in self.tickers]
+        })
+        return super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+        return super().tearDown()
+
+    def serial(self):
+        return list(
+            runner.iter_valuations(self.tickers,
+                                   0.02,
+                                   0.06,
+                                   workers=1,
+                                   task=fake_valuation))
+
+    def test_ordered_pools_match_serial(self):
+        expected = self.serial()
+        for executor in runner.EXECUTORS:
+            stream = runner.iter_valuations(self.tickers,
+                                            0.02,
+                                            0.06,
+                                            workers=4,
+                                            executor=executor,
+                                            task=fake_valuation)
+            self.assertEqual(list(stream), expected)
+
+    def test_unordered_stream(self):
+        stream = list(
+            runner.iter_valuations(self.tickers,
+                                   0.02,
+                                   0.06,
+                                   workers=4,
+                                   executor="thread",
+                                   ordered=False,
+                                   task=fake_valuation))
+        self.assertEqual(sorted(stream), self.serial())
+
+    def test_run_batch_report(self):
+        serial = runner.run_batch(self.tickers_df,
+                                  "test",
+                                  rf=0.02,
+                                  mrp=0.06,
+                                  output=self.output,
+                                  workers=1,
+                                  task=fake_valuation)
+        pooled = runner.run_batch(self.tickers_df,
+                                  "test",
+                                  rf=0.02,
+                                  mrp=0.06,
+                                  output=self.output,
+                                  workers=4,
+                                  executor="thread",
+                                  ordered=False,
+                                  task=fake_valuation)
+        pd.testing.assert_frame_equal(serial, pooled)
+        self.assertEqual(list(serial.columns),
+                         ["ticker", "name", *valuation.RESULTS])
+        reports = os.listdir(self.output)
+        self.assertEqual(len(reports), 1)
+        report = pd.read_csv(self.output + reports[0])
+        self.assertEqual(list(report.ticker), self.tickers)
+
+    def test_output_directory(self):
+        # output without a trailing separator
+        output = os.path.join(self.output, "reports")
+        interrupted = Interrupted(after=15)
+        runner.run_batch(self.tickers_df,
+                         "test",
+                         rf=0.02,
+                         mrp=0.06,
+                         output=output,
+                         task=interrupted)
+        report_id = runner.get_report_id("test")
+        self.assertEqual(sorted(os.listdir(output)),
+                         [report_id + ".csv", report_id + ".jsonl"])
+        self.assertEqual(os.listdir(self.output), ["reports"])
+
+    def test_resume_interrupted_run(self):
+        expected = runner.run_batch(self.tickers_df,
+                                    "full",
+                                    rf=0.02,
+                                    mrp=0.06,
+                                    output=self.output,
+                                    task=fake_valuation)
+        interrupted = Interrupted(after=15)
+        partial = runner.run_batch(self.tickers_df,
+                                   "test",
+                                   rf=0.02,
+                                   mrp=0.06,
+                                   output=self.output,
+                                   task=interrupted)
+        pd.testing.assert_frame_equal(partial.iloc[:15], expected.iloc[:15])
+        self.assertTrue(partial.iloc[15:, 2:].isna().all().all())
+        sinks = [name for name in os.listdir(self.output)
+                 if name.endswith(".jsonl")]
+        self.assertEqual(len(sinks), 1)
+
+        resumed = Interrupted(after=None)
+        report = runner.run_batch(self.tickers_df,
+                                  "test",
+                                  rf=0.02,
+                                  mrp=0.06,
+                                  output=self.output,
+                                  workers=4,
+                                  executor="thread",
+                                  task=resumed)
+        self.assertEqual(sorted(resumed.calls), self.tickers[15:])
+        pd.testing.assert_frame_equal(report, expected)
+        self.assertFalse(
+            any(name.endswith(".jsonl") for name in os.listdir(self.output)))
+
+    def test_partial_record_is_dropped(self):
+        path = self.output + "sink.jsonl"
+        with sink.ResultSink(path) as result_sink:
+            result_sink.write(0, "T000", fake_valuation("T000", 0.02, 0.06))
+        with open(path, "a") as file:
+            file.write('{"num": 1, "ticker": "T0')
+        self.assertEqual(sink.ResultSink(path).completed(), {"T000"})
+
+    def test_errors_are_retried(self):
+        path = self.output + "sink.jsonl"
+        with sink.ResultSink(path) as result_sink:
+            result_sink.write(0, "T000", fake_valuation("T000", 0.02, 0.06))
+            result_sink.write(1, "T001", dict.fromkeys(valuation.RESULTS) |
+                              {"error": "unexpected page layout"})
+        with open(path) as file:
+            record = json.loads(file.readlines()[-1])
+        self.assertEqual(record["error"], "unexpected page layout")
+        self.assertEqual(sink.ResultSink(path).completed(), {"T000"})
+        with sink.ResultSink(path) as result_sink:
+            result_sink.write(1, "T001", fake_valuation("T001", 0.02, 0.06))
+        self.assertEqual(sink.ResultSink(path).completed(), {"T000", "T001"})
+        self.assertEqual(len(sink.read_sink(path)), 2)
+
+    def test_run_universes(self):
+        """ Overlapping universes are valued once, reported separately """
+        calls = Interrupted(after=None)
+        universes = {
+            "tech": self.tickers_df.iloc[:25],
+            "large": self.tickers_df.iloc[15:][::-1],
+        }
+        reports = runner.run_universes(universes,
+                                       rf=0.02,
+                                       mrp=0.06,
+                                       output=self.output,
+                                       task=calls)
+        self.assertEqual(sorted(calls.calls), self.tickers)
+        expected = runner.run_batch(self.tickers_df,
+                                    "full",
+                                    rf=0.02,
+                                    mrp=0.06,
+                                    output=self.output,
+                                    task=fake_valuation).set_index("ticker")
+        for key, tickers_df in universes.items():
+            self.assertEqual(list(reports[key].ticker), list(tickers_df.ticker))
+            pd.testing.assert_frame_equal(
+                reports[key].set_index("ticker"),
+                expected.loc[tickers_df.ticker])
+        reports = sorted(os.listdir(self.output))
+        self.assertEqual([name.split("-")[0] for name in reports],
+                         ["full", "large", "tech", "universe"])
+
+
+class Concurrency:
+    """ Stand-in valuation recording tickers in flight """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.inflight = 0
+        self.peak = 0
+
+    def __call__(self, ticker, rf, mrp, horizon=5):
+        with self.lock:
+            self.inflight += 1
+            self.peak = max(self.peak, self.inflight)
+        time.sleep(0.002)
+        with self.lock:
+            self.inflight -= 1
+        return fake_valuation(ticker, rf, mrp, horizon)
+
+
+class TestMemoryBound(unittest.TestCase):
+    """
+    Tests for release of page data and the RSS ceiling.
+    """
+    def tearDown(self):
+        runner.CONFIG["memory"]["rssLimit"] = None
+        return super().tearDown()
+
+    def test_release_html(self):
+        cells = "".join(f"<td>{i},000</td>" for i in range(80))
+        source = f"<html><body><table><tr>{cells}</tr></table></body></html>"
+        fin_is = financials.IncomeStatement("TEST")
+        fin_is.get_html_data(utils.parse_page(source))
+        tree = weakref.ref(fin_is.html[0].parent)
+        fin_is.actual_statement()
+        revenue = fin_is.revenue.copy()
+
+        gc.disable()
+        try:
+            fin_is.release_html()
+            # freed by reference counting, no garbage collection needed
+            self.assertIsNone(tree())
+        finally:
+            gc.enable()
+        self.assertIsNone(fin_is.html)
+        self.assertEqual(list(fin_is.revenue), list(revenue))
+
+    def test_release_capital_pages(self):
+        cells = "".join(f"<td>{i}.5B</td>" for i in range(80))
+        source = f"<html><body><table><tr>{cells}</tr></table></body></html>"
+        cap = capital.CostOfCapital("TEST", rf=0.02, mrp=0.06)
+        # a provided page is of the caller, never freed
+        page = utils.parse_page(source)
+        cap.get_shares_outstanding(page, release=True)
+        self.assertIsNotNone(page[0].parent)
+
+        for release in (False, True):
+            page = utils.parse_page(source)
+            tree = weakref.ref(page[0].parent)
+            with mock.patch.object(utils, "get_html", return_value=page):
+                del page
+                gc.disable()
+                try:
+                    num_shares = cap.get_shares_outstanding(release=release)
+                    self.assertEqual(tree() is None, release)
+                finally:
+                    gc.enable()
+            self.assertEqual(num_shares, 37.5 * 1_000_000)
+
+    def test_rss_backpressure(self):
+        tickers = [f"T{i:03d}" for i in range(20)]
+        free = Concurrency()
+        list(runner.iter_valuations(tickers, 0.02, 0.06, workers=4,
+                                    executor="thread", task=free))
+        self.assertGreater(free.peak, 1)
+
+        runner.CONFIG["memory"]["rssLimit"] = 100
+        throttled = Concurrency()
+        with mock.patch.object(runner, "rss", return_value=200):
+            stream = list(
+                runner.iter_valuations(tickers, 0.02, 0.06, workers=4,
+                                       executor="thread", task=throttled))
+        self.assertEqual(throttled.peak, 1)
+        self.assertEqual([ticker for _, ticker, _ in stream], tickers)
+
+
+if __name__ == '__main__':
+    unittest.main()
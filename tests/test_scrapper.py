@@ -0,0 +1,130 @@
+import http.server
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from evkit import scrapper
+
+COMPANIES = {"AAPL": 320193, "MSFT": 789019, "XOM": 34088}
+
+
+def submissions(cik):
+    forms = ["10-K", "10-Q", "8-K", "10-K", "10-Q", "10-K"]
+    return {
+        "cik": str(cik),
+        "filings": {
+            "recent": {
+                "accessionNumber":
+                [f"0000{cik}-20-{i:06d}" for i in range(len(forms))],
+                "form": forms,
+                "filingDate": [f"2020-0{i + 1}-15" for i in range(len(forms))],
+                "primaryDocument": [f"doc{i}.htm" for i in range(len(forms))],
+            }
+        }
+    }
+
+
+class EdgarHandler(http.server.BaseHTTPRequestHandler):
+    """ Local stand-in of EDGAR endpoints """
+    requests = []
+
+    def do_GET(self):
+        self.requests.append((time.monotonic(), self.path))
+        if self.path == "/files/company_tickers.json":
+            body = {
+                str(i): {
+                    "cik_str": cik,
+                    "ticker": ticker,
+                    "title": ticker
+                }
+                for i, (ticker, cik) in enumerate(COMPANIES.items())
+            }
+        elif self.path.startswith("/submissions/CIK"):
+            body = submissions(int(self.path[len("/submissions/CIK"):-5]))
+        elif self.path.startswith("/Archives/"):
+            body = {"document": self.path}
+        else:
+            self.send_error(404)
+            return
+        content = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestScrapper(unittest.TestCase):
+    """
+    Tests for the parallel EDGAR filings downloader.
+    """
+    def setUp(self):
+        scrapper.CONFIG["verbose"] = False
+        self.path = tempfile.mkdtemp() + "/"
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0),
+                                                      EdgarHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.url = {
+            "tickers": base + "/files/company_tickers.json",
+            "submissions": base + "/submissions/",
+            "archives": base + "/Archives/edgar/data/",
+        }
+        EdgarHandler.requests = []
+        return super().setUp()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def downloader(self, rate=50):
+        return scrapper.FilingsDownloader(path=self.path,
+                                          form_type="10-K",
+                                          number=2,
+                                          workers=4,
+                                          rate=rate,
+                                          url=self.url)
+
+    def test_download_and_skip(self):
+        stats = self.downloader().run(["AAPL", "msft", "34088"])
+        self.assertEqual(stats["downloaded"], 6)
+        self.assertEqual(stats["failed"], 0)
+        # tickers file, 3 submissions, 6 documents
+        self.assertEqual(stats["requests"], 10)
+        path = os.path.join(self.path, "320193", "10-K",
+                            "0000320193-20-000000", "doc0.htm")
+        with open(path) as file:
+            self.assertIn("/320193/000032019320000000/doc0.htm", file.read())
+
+        stats = self.downloader().run(["AAPL", "MSFT", "XOM", "UNKNOWN"])
+        self.assertEqual(stats["downloaded"], 0)
+        self.assertEqual(stats["skipped"], 6)
+        self.assertEqual(stats["failed"], 1)
+
+        # metadata of an interrupted download is written again
+        os.remove(os.path.join(os.path.dirname(path), "filing.json"))
+        stats = self.downloader().run(["AAPL"])
+        self.assertEqual((stats["downloaded"], stats["skipped"]), (1, 1))
+        with open(os.path.join(os.path.dirname(path), "filing.json")) as file:
+            self.assertEqual(json.load(file)["accession"],
+                             "0000320193-20-000000")
+
+    def test_rate_limit(self):
+        rate = 20
+        self.downloader(rate=rate).run(list(COMPANIES))
+        times = sorted(t for t, _ in EdgarHandler.requests)
+        # token bucket of burst 1 spaces every request of the pool
+        self.assertGreaterEqual(times[-1] - times[0],
+                                (len(times) - 1) / rate * 0.9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evkit import screener
+from tests.test_backtest import synthetic_sec
+
+
+class TestScreener(unittest.TestCase):
+    """
+    Tests for universe-wide screening of SEC filers.
+    """
+    def setUp(self):
+        screener.CONFIG["verbose"] = False
+        self.ciks = [320193, 789019, 1018724, 1652044]
+        self.index, self.finData = synthetic_sec(self.ciks,
+                                                 list(range(2012, 2020)))
+        prices = pd.Series([40.0, 50.0, 60.0, 70.0], index=self.ciks)
+        self.screener = screener.Screener(self.finData,
+                                          self.index,
+                                          quarter="2020q1",
+                                          prices=prices)
+        return super().setUp()
+
+    def test_compute(self):
+        screen = self.screener.compute()
+        self.assertEqual(list(screen.index), self.ciks)
+        np.testing.assert_allclose(screen["ebit_margin"], 0.2)
+        np.testing.assert_allclose(screen["capex_intensity"], 0.06)
+        np.testing.assert_allclose(screen["debt_to_assets"], 0.25)
+        self.assertTrue(np.isfinite(screen["dcf_price"]).all())
+        self.assertTrue(np.isfinite(screen["upside"]).all())
+
+    def test_shared_workers(self):
+        expected = self.screener.compute()
+        screener.CONFIG["workers"] = 2
+        try:
+            screen = self.screener.compute()
+        finally:
+            screener.CONFIG["workers"] = 1
+        pd.testing.assert_frame_equal(screen, expected)
+
+    def test_quarter_without_filings(self):
+        self.screener.quarter = "2020q2"
+        self.assertEqual(len(self.screener.compute()), 0)
+
+    def test_historical_quarter(self):
+        revenue = self.finData[self.finData["tag"] == "Revenues"]
+        for quarter, year in (("2016q1", 2015), ("2013q1", 2012)):
+            self.screener.quarter = quarter
+            screen = self.screener.compute()
+            self.assertEqual(list(screen.index), self.ciks)
+            # latest fiscal year filed by the quarter end
+            expected = [
+                revenue.loc[f"{cik:010d}-{year}"].set_index("ddate").loc[
+                    year * 10000 + 1231, "value"] for cik in self.ciks
+            ]
+            np.testing.assert_array_equal(
+                self.screener.statements["revenue"][:, -1], expected)
+        # a single annual report holds two fiscal years
+        self.assertEqual(
+            np.isnan(self.screener.statements["revenue"]).sum(axis=1).tolist(),
+            [2] * len(self.ciks))
+
+    def test_shortlist(self):
+        screen = self.screener.compute()
+        shortlist = self.screener.shortlist(by="upside",
+                                            top=2,
+                                            mkt_price=(None, 65))
+        self.assertEqual(len(shortlist), 2)
+        self.assertTrue((shortlist["mkt_price"] <= 65).all())
+        self.assertGreaterEqual(shortlist["upside"].iloc[0],
+                                shortlist["upside"].iloc[1])
+        self.assertEqual(shortlist.index[0],
+                         screen[screen["mkt_price"] <= 65]["upside"].idxmax())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,11 @@
+import contextlib
+import io
+import os
+import shutil
+import tempfile
 import unittest
 
+import numpy as np
 import pandas as pd
 
 from evkit import sec_datareader
@@ -32,5 +38,68 @@ class TestFinancialDataSEC(unittest.TestCase):
         self.assertIsNone(self.findata.cleanup())
 
 
+class TestDeduplicate(unittest.TestCase):
+    """
+    Tests for de-duplication of repeated and restated SEC facts.
+    """
+    def setUp(self):
+        self.findata = sec_datareader.FinancialDataSEC()
+        self.findata.verbose = False
+        self.findata.index = pd.DataFrame(
+            {
+                "cik": [1, 1, 1, 2],
+                "filed": [20190215, 20200214, 20200301, 20200214],
+                "form": ["10-K", "10-K", "10-K/A", "10-K"],
+            },
+            index=pd.Index(["a-19", "a-20", "a-20a", "b-20"], name="adsh"))
+        self.findata.finData = pd.DataFrame(
+            {
+                "tag": ["Revenues"] * 6 + ["Assets"],
+                "ddate": [
+                    20181231, 20181231, 20191231, 20191231, 20181231,
+                    20191231, 20191231
+                ],
+                "qtrs": [4, 4, 4, 4, 4, 4, 0],
+                "uom": ["USD"] * 7,
+                "coreg": [np.nan] * 7,
+                "value": [10.0, 11.0, 20.0, 21.0, 5.0, 6.0, 100.0],
+            },
+            index=pd.Index(
+                ["a-19", "a-20", "a-20", "a-20a", "b-20", "b-20", "a-20"],
+                name="adsh"))
+        return super().setUp()
+
+    def test_latest_filed_value_wins(self):
+        finData = self.findata.deduplicate(to_csv=False)
+        self.assertEqual(len(finData), 5)
+        revenue = finData[finData["tag"] == "Revenues"]
+        self.assertEqual(list(revenue.index), ["a-20", "a-20a", "b-20", "b-20"])
+        self.assertEqual(list(revenue["value"]), [11.0, 21.0, 5.0, 6.0])
+        self.assertEqual(list(revenue["versions"]), [2, 2, 1, 1])
+
+    def test_as_filed_data_kept(self):
+        folder = tempfile.mkdtemp()
+        self.findata.finDataFile = os.path.join(folder, "findata.csv")
+        self.findata.latestFile = os.path.join(folder, "latest.csv")
+        self.findata.indexFile = os.path.join(folder, "index.csv")
+        self.findata.index.to_csv(self.findata.indexFile)
+        self.findata.finData.to_csv(self.findata.finDataFile)
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                self.findata.deduplicate()
+            _, asFiled = self.findata.load()
+            _, latest = self.findata.load(latest=True)
+        finally:
+            shutil.rmtree(folder)
+        self.assertEqual(len(asFiled), 7)
+        self.assertEqual(len(latest), 5)
+
+    def test_idempotent(self):
+        finData = self.findata.deduplicate(to_csv=False)
+        again = self.findata.deduplicate(to_csv=False)
+        pd.testing.assert_frame_equal(finData.drop(columns="versions"),
+                                      again.drop(columns="versions"))
+
+
 if __name__ == '__main__':
     unittest.main()
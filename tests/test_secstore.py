@@ -0,0 +1,123 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evkit import secstore
+from tests.test_backtest import synthetic_sec
+
+
+class TestSECStore(unittest.TestCase):
+    """
+    Tests for scans of the quarter partitioned SEC store.
+    """
+    def setUp(self):
+        secstore.CONFIG["verbose"] = False
+        secstore.CONFIG["chunkRows"] = 40
+        self.path = tempfile.mkdtemp() + "/"
+        self.store = secstore.SECStore(self.path)
+        ciks = [320193, 789019, 1018724, 1652044]
+        index, finData = synthetic_sec(ciks, list(range(2010, 2020)))
+        index["fy"] = index["filed"] // 10000 - 1
+        # 10-K/A of the latest year
+        amended = index["fy"] == 2019
+        index.loc[amended, "form"] = "10-K/A"
+        # filings of a year form the data set of its first quarter
+        self.index, self.finData = index, finData
+        self.facts = finData.reset_index().join(index, on="adsh")
+        for year in range(2011, 2021):
+            filings = index[index["filed"] // 10000 == year]
+            facts = finData[finData.index.isin(filings.index)]
+            self.store.write_quarter(f"{year}q1", facts, filings)
+        return super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def expected(self, tags, forms, first, last, low):
+        facts = self.facts
+        facts = facts[facts["tag"].isin(tags) & facts["form"].isin(forms) &
+                      facts["fy"].between(first, last) &
+                      (facts["value"] >= low)]
+        return facts.sort_values(["adsh", "ddate"]).reset_index(drop=True)
+
+    def test_scan(self):
+        tags, forms = ["LongTermDebtNoncurrent"], ["10-K"]
+        chunks = list(
+            self.store.scan(tags=tags,
+                            forms=forms,
+                            fy=(2015, 2019),
+                            value=(1e9, None)))
+        self.assertTrue(all(len(chunk) for chunk in chunks))
+        result = pd.concat(chunks).sort_values(["adsh", "ddate"])
+        expected = self.expected(tags, forms, 2015, 2019, 1e9)
+        self.assertGreater(len(expected), 0)
+        self.assertEqual(list(result["adsh"]), list(expected["adsh"]))
+        np.testing.assert_array_equal(result["value"], expected["value"])
+        self.assertEqual(result["fy"].min(), 2015)
+        self.assertEqual(result["fy"].max(), 2018)
+        self.assertTrue((result["cik"].isin(self.facts["cik"])).all())
+
+    def test_pruning(self):
+        everything = self.store.chunks()
+        pruned = self.store.chunks(tags=["LongTermDebtNoncurrent"],
+                                   fy=(2015, 2016))
+        self.assertEqual(len(pruned), 2)
+        self.assertGreater(len(everything), 10 * len(pruned))
+        self.assertEqual(self.store.chunks(forms=["10-Q"]), [])
+        self.assertEqual(
+            len(self.store.chunks(quarters=("2012q1", "2013q4"))),
+            sum(len(self.store.manifest[q]) for q in ("2012q1", "2013q1")))
+
+    def test_columns_and_query(self):
+        result = self.store.query(tags=["Assets"],
+                                  ciks=[789019],
+                                  columns=["cik", "ddate", "value"])
+        self.assertEqual(list(result.columns), ["cik", "ddate", "value"])
+        self.assertEqual(len(result), 20)
+        self.assertTrue((result["cik"] == 789019).all())
+        empty = self.store.query(tags=["Goodwill"])
+        self.assertEqual(len(empty), 0)
+
+    def test_encoded_strings(self):
+        chunk = self.store.manifest["2015q1"][0]
+        with np.load(self.path + chunk["file"]) as arrays:
+            self.assertEqual(arrays["tag"].dtype, np.int32)
+            self.assertEqual(list(arrays["tagVocab"]),
+                             sorted(set(arrays["tagVocab"])))
+            tags = secstore.read_column(arrays, "tag")
+        self.assertEqual(str(tags[0]), chunk["tag"][0])
+        # chunks written before encoding hold plain string arrays
+        facts = self.facts[self.facts["filed"] // 10000 == 2016]
+        columns = secstore.to_columns(facts)
+        os.makedirs(self.path + "quarter=legacy")
+        np.savez(self.path + "quarter=legacy/chunk-0.npz", **columns)
+        self.store.manifest["legacy"] = [{
+            "file": "quarter=legacy/chunk-0.npz",
+            **secstore.chunk_stats(columns)
+        }]
+        legacy = self.store.query(tags=["Assets"], quarters="legacy")
+        encoded = self.store.query(tags=["Assets"], quarters="2016q1")
+        pd.testing.assert_frame_equal(
+            legacy.sort_values(["cik", "ddate"]).reset_index(drop=True),
+            encoded)
+        self.assertEqual(set(encoded["tag"]), {"Assets"})
+
+    def test_rewrite_quarter(self):
+        quarter = self.store.manifest["2012q1"]
+        self.store.write_quarter("2012q1",
+                                 self.finData.iloc[:0],
+                                 self.index.iloc[:0])
+        for chunk in quarter:
+            self.assertFalse(os.path.exists(self.path + chunk["file"]))
+        reloaded = secstore.SECStore(self.path)
+        self.assertEqual(reloaded.manifest["2012q1"], [])
+        self.assertEqual(len(reloaded.quarters), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,209 @@
+import json
+import os
+import tempfile
+import time
+import unittest
+import urllib.error
+import urllib.request
+from unittest import mock
+
+import numpy as np
+
+from benchmarks import synthetic
+from evkit import metrics, service, valuation
+
+SIZE = 20
+
+
+def universe():
+    data = synthetic.universe(SIZE)
+    return service.Universe([f"T{i:03d}" for i in range(SIZE)],
+                            data["statements"],
+                            equity_beta=data["equity_beta"],
+                            num_shares=data["num_shares"],
+                            mkt_price=data["mkt_price"])
+
+
+def request(url, body=None):
+    data = None if body is None else json.dumps(body).encode()
+    try:
+        with urllib.request.urlopen(url, data=data) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read().decode()
+
+
+class TestValuationService(unittest.TestCase):
+
+    def setUp(self):
+        self.universe = universe()
+        self.service = service.ValuationService(self.universe, market=None)
+
+    def test_value(self):
+        results = self.service.value(["T003", "T001"])
+        expected = valuation.value_universe(
+            {
+                field: values[[3, 1]]
+                for field, values in self.universe.statements.items()
+            },
+            equity_beta=self.universe.inputs["equity_beta"][[3, 1]],
+            num_shares=self.universe.inputs["num_shares"][[3, 1]],
+            mkt_price=None,
+            rf=service.CONFIG["assumptions"]["riskFree"],
+            mrp=service.CONFIG["assumptions"]["marketPremium"])
+        self.assertEqual(list(results), ["T003", "T001"])
+        np.testing.assert_allclose(
+            [results["T003"]["stock_price"], results["T001"]["stock_price"]],
+            expected["stock_price"])
+        self.assertEqual(results["T001"]["mkt_stock_price"],
+                         self.universe.inputs["mkt_price"][1])
+        with self.assertRaises(KeyError):
+            self.service.value(["MISSING"])
+
+    def test_wacc(self):
+        base = self.service.value(["T002"])["T002"]
+        results = self.service.value(["T002"], wacc=0.09,
+                                     lt_growth=0.02)["T002"]
+        self.assertEqual(results["wacc"], 0.09)
+        self.assertEqual(results["re"], base["re"])
+        self.assertNotAlmostEqual(results["stock_price"],
+                                  base["stock_price"])
+
+    def test_horizon(self):
+        default = self.service.value(["T002"])["T002"]
+        results = self.service.value(
+            ["T002"], horizon=service.CONFIG["assumptions"]["horizon"])["T002"]
+        self.assertEqual(results["stock_price"], default["stock_price"])
+        for horizon in (0, -1, 2.5):
+            with self.assertRaises(ValueError):
+                self.service.value(["T002"], horizon=horizon)
+        with self.assertRaises(ValueError):
+            self.service.sensitivity("T002", wacc=[0.08], horizon=0)
+
+    def test_sensitivity(self):
+        grid = self.service.sensitivity("T004", wacc=[0.07, 0.08, 0.09],
+                                        lt_growth=[0.01, 0.02])
+        self.assertEqual(grid["stock_price"].shape, (3, 2))
+        point = self.service.value(["T004"], wacc=0.08,
+                                   lt_growth=0.02)["T004"]
+        self.assertAlmostEqual(grid["stock_price"][1, 1],
+                               point["stock_price"])
+        # lt_growth of half the wacc
+        grid = self.service.sensitivity("T004", wacc=[0.08, 0.1])
+        self.assertEqual(grid["stock_price"].shape, (2, 1))
+
+    def test_no_terminal_value(self):
+        grid = self.service.sensitivity("T004", wacc=[0.02, 0.01, 0.08],
+                                        lt_growth=[0.02])
+        self.assertTrue(np.isnan(grid["stock_price"][:2]).all())
+        self.assertTrue(np.isfinite(grid["stock_price"][2]).all())
+        results = self.service.value(["T004"], wacc=0.03,
+                                     lt_growth=0.03)["T004"]
+        self.assertTrue(np.isnan(results["stock_price"]))
+        self.assertEqual(results["wacc"], 0.03)
+        self.assertEqual(
+            json.loads(json.dumps(service.to_json(results)))["stock_price"],
+            None)
+        self.assertEqual(service.to_json([np.inf, -np.inf, 1.0]),
+                         [None, None, 1.0])
+
+    def test_refresh(self):
+        self.service.market = lambda universe: {"rf": 0.04}
+        self.assertTrue(self.service.refresh())
+        self.assertEqual(self.service.inputs["rf"], 0.04)
+
+        def failing(universe):
+            raise ConnectionError("offline")
+
+        self.service.market = failing
+        self.service.verbose = False
+        self.assertFalse(self.service.refresh())
+        self.assertEqual(self.service.inputs["rf"], 0.04)
+
+    def test_save_load(self):
+        with tempfile.TemporaryDirectory() as folder:
+            path = self.universe.save(os.path.join(folder, "universe.npz"))
+            loaded = service.Universe.load(path)
+        self.assertEqual(loaded.tickers.tolist(),
+                         self.universe.tickers.tolist())
+        np.testing.assert_array_equal(loaded.statements["ebit"],
+                                      self.universe.statements["ebit"])
+        self.assertEqual(loaded.unit, self.universe.unit)
+
+
+class TestServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        metrics.REGISTRY.reset()
+        refreshes = iter(range(1, 1000))
+        cls.service = service.ValuationService(
+            universe(),
+            market=lambda universe: {"mrp": 0.05 + next(refreshes) / 1e4},
+            refresh=0.01)
+        cls.service.start(port=0)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.service.stop()
+        metrics.enable(False)
+        metrics.REGISTRY.reset()
+
+    def test_value(self):
+        status, body = request(self.service.url + "value/T001?wacc=0.09")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["wacc"], 0.09)
+        status, body = request(self.service.url + "value",
+                               {"tickers": ["T001", "T002"]})
+        self.assertEqual(list(json.loads(body)), ["T001", "T002"])
+
+    def test_sensitivity(self):
+        status, body = request(self.service.url + "sensitivity/T001"
+                               "?wacc=0.08,0.09&lt_growth=0.02")
+        self.assertEqual(status, 200)
+        self.assertEqual(np.shape(json.loads(body)["stock_price"]), (2, 1))
+
+    def test_errors(self):
+        self.assertEqual(request(self.service.url + "value/MISSING")[0], 404)
+        self.assertEqual(request(self.service.url + "value/T001?wacc=x")[0],
+                         400)
+        self.assertEqual(request(self.service.url + "value", {})[0], 400)
+        self.assertEqual(request(self.service.url + "unknown")[0], 404)
+        self.assertEqual(
+            request(self.service.url + "value/T001?horizon=0")[0], 400)
+        # percent-encoded ticker, e.g. %5EGSPC of ^GSPC
+        status, body = request(self.service.url + "value/T%30%301")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body),
+                         json.loads(request(self.service.url +
+                                            "value/T001")[1]))
+        with mock.patch.object(self.service, "value",
+                               side_effect=RuntimeError("failed")):
+            status, body = request(self.service.url + "value/T001")
+        self.assertEqual(status, 500)
+        self.assertEqual(json.loads(body)["error"], "RuntimeError: failed")
+        self.assertEqual(request(self.service.url + "value/T001")[0], 200)
+        status, body = request(self.service.url + "sensitivity/T001"
+                               "?wacc=0.02&lt_growth=0.02")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["stock_price"], [[None]])
+
+    def test_metrics(self):
+        request(self.service.url + "health")
+        stats = json.loads(request(self.service.url + "stats")[1])
+        self.assertGreater(stats["requests"], 0)
+        self.assertIn("p99, ms", stats["latency"])
+        status, body = request(self.service.url + "metrics")
+        self.assertEqual(status, 200)
+        self.assertIn("evkit_service_request_seconds_bucket", body)
+
+    def test_background_refresh(self):
+        deadline = time.monotonic() + 5
+        while self.service.inputs["refreshed"] is None and \
+                time.monotonic() < deadline:
+            time.sleep(0.01)
+        self.assertGreater(self.service.inputs["mrp"], 0.05)
+
+
+if __name__ == "__main__":
+    unittest.main()
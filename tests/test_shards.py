@@ -0,0 +1,213 @@
+import concurrent.futures
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from evkit import launcher, metrics, runner, shards, utils, valuation
+from tests.test_runner import Interrupted, fake_valuation
+
+RUN_ID = "universe-20200601"
+
+
+def node(output, tickers_df, shard, count):
+    """ Stand-in of a node running one shard """
+    runner.CONFIG["verbose"] = False
+    return shards.run_shard(tickers_df,
+                            report_key="universe",
+                            shard=shard,
+                            shards=count,
+                            rf=0.02,
+                            mrp=0.05,
+                            output=output,
+                            run_id=RUN_ID,
+                            task=fake_valuation)
+
+
+class TestShards(unittest.TestCase):
+    """
+    Tests for sharded runs of a universe and their merge.
+    """
+    def setUp(self):
+        runner.CONFIG["verbose"] = False
+        self.output = tempfile.mkdtemp() + "/"
+        tickers = [f"T{i:03d}" for i in range(60)]
+        self.tickers_df = pd.DataFrame({
+            "ticker": tickers,
+            "name": [f"Company {t}" for t in tickers]
+        })
+
+    def tearDown(self):
+        shutil.rmtree(self.output)
+
+    def run_nodes(self, count, order=None):
+        for shard in order or range(count):
+            node(self.output, self.tickers_df, shard, count)
+        return shards.merge({"universe": self.tickers_df},
+                            report_key="universe",
+                            shards=count,
+                            output=self.output,
+                            run_id=RUN_ID)["universe"]
+
+    def read_report(self):
+        with open(self.output + RUN_ID + ".csv") as file:
+            return file.read()
+
+    def test_stable_shards(self):
+        tickers = ["AAPL", "MSFT", "BRK-B", "T000"]
+        self.assertEqual(shards.shard_of(tickers, 8).tolist(),
+                         shards.shard_of(list(reversed(tickers)),
+                                         8)[::-1].tolist())
+        parts = shards.split(self.tickers_df, 4)
+        self.assertEqual(sum(len(part) for part in parts), 60)
+        # universe order within a shard
+        for part in parts:
+            self.assertTrue(part.index.is_monotonic_increasing)
+        self.assertEqual(shards.sink_path(RUN_ID, 1, 4, "/tmp/output"),
+                         f"/tmp/output/{RUN_ID}.shard-1-of-4.jsonl")
+        self.assertEqual(shards.parse_shard("2/4"), (2, 4))
+        with self.assertRaises(ValueError):
+            shards.parse_shard("4/4")
+
+    def test_processes(self):
+        context = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=3, mp_context=context) as pool:
+            futures = [
+                pool.submit(node, self.output, self.tickers_df, shard, 3)
+                for shard in range(3)
+            ]
+            markers = [future.result() for future in futures]
+        self.assertEqual([marker["shard"] for marker in markers], [0, 1, 2])
+        self.assertEqual(sum(marker["tickers"] for marker in markers), 60)
+
+        report = shards.merge({"universe": self.tickers_df},
+                              report_key="universe",
+                              shards=3,
+                              output=self.output,
+                              run_id=RUN_ID)["universe"]
+        serial = runner.run_batch(self.tickers_df,
+                                  report_key="serial",
+                                  rf=0.02,
+                                  mrp=0.05,
+                                  output=self.output,
+                                  task=fake_valuation)
+        self.assertEqual(report.ticker.tolist(), serial.ticker.tolist())
+        pd.testing.assert_frame_equal(report, serial)
+
+    def test_deterministic_merge(self):
+        self.run_nodes(3)
+        first = self.read_report()
+        shards.cleanup(RUN_ID, 3, self.output)
+        self.run_nodes(3, order=[2, 0, 1])
+        self.assertEqual(self.read_report(), first)
+        shards.cleanup(RUN_ID, 3, self.output)
+        self.run_nodes(5)
+        self.assertEqual(self.read_report(), first)
+        shards.cleanup(RUN_ID, 5, self.output)
+        self.assertFalse([f for f in os.listdir(self.output) if "shard" in f])
+
+    def test_resume(self):
+        interrupted = Interrupted(after=5)
+        marker = shards.run_shard(self.tickers_df, "universe", 1, 2,
+                                  rf=0.02, mrp=0.05, output=self.output,
+                                  run_id=RUN_ID, task=interrupted)
+        self.assertIsNone(marker)
+        self.assertEqual(shards.status(RUN_ID, 2, self.output), [None, None])
+        with self.assertRaises(RuntimeError):
+            shards.merge({"universe": self.tickers_df}, "universe", 2,
+                         output=self.output, run_id=RUN_ID)
+
+        resumed = Interrupted(after=len(self.tickers_df))
+        marker = shards.run_shard(self.tickers_df, "universe", 1, 2,
+                                  rf=0.02, mrp=0.05, output=self.output,
+                                  run_id=RUN_ID, task=resumed)
+        self.assertEqual(len(resumed.calls), marker["tickers"] - 5)
+        self.assertFalse(set(interrupted.calls) & set(resumed.calls))
+
+        # partial report, tickers of shard 0 are missing
+        report = shards.merge({"universe": self.tickers_df}, "universe", 2,
+                              output=self.output, run_id=RUN_ID,
+                              partial=True)["universe"]
+        owners = shards.shard_of(report.ticker, 2)
+        valued = report["stock_price"].notna().to_numpy()
+        self.assertFalse(valued[owners == 0].any())
+        expected = [
+            fake_valuation(t, 0.02, 0.05)["stock_price"] is not None
+            for t in report.ticker[owners == 1]
+        ]
+        np.testing.assert_array_equal(valued[owners == 1], expected)
+
+    def test_universes(self):
+        universes = {
+            "first": self.tickers_df.iloc[:40],
+            "second": self.tickers_df.iloc[30:].iloc[::-1],
+        }
+        for shard in range(2):
+            shards.run_shard(runner.union(universes), "first+second", shard,
+                             2, rf=0.02, mrp=0.05, output=self.output,
+                             run_id=RUN_ID, task=fake_valuation,
+                             universes=universes)
+        reports = shards.merge(universes, "first+second", 2,
+                               output=self.output, run_id=RUN_ID)
+        self.assertEqual(reports["second"].ticker.tolist(),
+                         universes["second"].ticker.tolist())
+        self.assertEqual(list(reports["first"].columns),
+                         ["ticker", "name", *valuation.RESULTS])
+
+    def test_planned_universe(self):
+        node(self.output, self.tickers_df, 0, 2)
+        # screener scraped again between shards
+        changed = self.tickers_df.iloc[5:]
+        with self.assertRaises(RuntimeError):
+            node(self.output, changed, 1, 2)
+        node(self.output, self.tickers_df, 1, 2)
+        with self.assertRaises(RuntimeError):
+            shards.merge({"universe": changed}, "universe", 2,
+                         output=self.output, run_id=RUN_ID)
+        report = shards.merge(None, "universe", 2, output=self.output,
+                              run_id=RUN_ID)["universe"]
+        self.assertEqual(report.ticker.tolist(),
+                         self.tickers_df.ticker.tolist())
+        self.assertEqual(report.name.tolist(), self.tickers_df.name.tolist())
+
+    def test_launcher(self):
+        path = os.path.join(self.output, "universe.csv")
+        self.tickers_df.to_csv(path, index=False)
+        options = ["--run-id", RUN_ID, "--output", self.output.rstrip("/"),
+                   "--executor", "thread"]
+        try:
+            with mock.patch.object(runner, "value_ticker", fake_valuation), \
+                    mock.patch.object(utils, "get_rf_mrp",
+                                      return_value=(0.02, 0.05)):
+                for shard in range(2):
+                    launcher.main([path, "--shard", f"{shard}/2",
+                                   "--metrics", *options])
+                # the universe changed after its shards ran
+                self.tickers_df.iloc[:10].to_csv(path, index=False)
+                launcher.main([path, "--merge", "2", *options])
+        finally:
+            metrics.enable(False)
+            metrics.REGISTRY.reset()
+        report = pd.read_csv(self.output + RUN_ID + ".csv")
+        self.assertEqual(report.ticker.tolist(),
+                         self.tickers_df.ticker.tolist())
+        for shard in range(2):
+            self.assertTrue(os.path.exists(
+                f"{self.output}{RUN_ID}.shard-{shard}-of-2.prom"))
+        # sinks are kept for another merge, unless cleaned up
+        self.assertEqual(shards.status(RUN_ID, 2, self.output)[1]["shard"],
+                         1)
+        launcher.main([path, "--merge", "2", "--cleanup", *options])
+        self.assertEqual(shards.status(RUN_ID, 2, self.output), [None, None])
+        self.assertFalse(os.path.exists(shards.plan_path(RUN_ID,
+                                                         self.output)))
+
+
+if __name__ == "__main__":
+    unittest.main()
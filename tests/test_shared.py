@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from evkit import shared, symbols, valuation
+from tests.test_symbols import TICKERS, filings_index
+
+
+def total(universe, rows):
+    start, stop = rows
+    return float(universe["values"][start:stop].sum())
+
+
+def is_shared(universe, _):
+    values = universe["values"]
+    return (not values.flags.writeable, not values.flags.owndata)
+
+
+def ticker_cik(universe, ticker):
+    return symbols.SymbolIndex(dict(universe)).cik(ticker)
+
+
+def failing(universe, task):
+    if task == 2:
+        os._exit(1)
+    return task
+
+
+class TestSharedUniverse(unittest.TestCase):
+    """
+    Tests for universe arrays shared by pool workers.
+    """
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        shared.CONFIG["path"] = self.path
+        self.arrays = {
+            "values": np.arange(1000, dtype=float),
+            "names": np.array(["AAPL", "MSFT", "GOOGL"]),
+            "panel": np.ones((10, 7), dtype=np.int32),
+        }
+        return super().setUp()
+
+    def tearDown(self):
+        shared.CONFIG["path"] = None
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def test_read_only_views(self):
+        for backend in ("memory", "file"):
+            with shared.SharedUniverse(self.arrays, backend) as universe:
+                views = universe.arrays()
+                for key, array in self.arrays.items():
+                    np.testing.assert_array_equal(views[key], array)
+                    self.assertEqual(views[key].dtype, array.dtype)
+                with self.assertRaises(ValueError):
+                    views["values"][0] = 1
+                del views
+
+    def test_map_universe(self):
+        tasks = shared.chunks(1000, 3)
+        self.assertEqual(tasks, [(0, 333), (333, 666), (666, 1000)])
+        for backend in ("memory", "file"):
+            totals = shared.map_universe(total, self.arrays, tasks, 3,
+                                         backend)
+            self.assertEqual(sum(totals), self.arrays["values"].sum())
+            flags = shared.map_universe(is_shared, self.arrays, [0, 1], 2,
+                                        backend)
+            self.assertEqual(flags, [(True, True)] * 2)
+        self.assertEqual(os.listdir(self.path), [])
+
+    def test_symbol_maps(self):
+        index = symbols.SymbolIndex.from_filings(filings_index(), TICKERS)
+        ciks = shared.map_universe(ticker_cik, index.arrays,
+                                   ["GOOG", "AAPL", "XYZ"], 2)
+        self.assertEqual(ciks, [1652044, 320193, None])
+
+    def test_cleanup_on_failure(self):
+        for backend in ("memory", "file"):
+            universe = shared.SharedUniverse(self.arrays, backend)
+            name = universe.name
+            universe.close()
+            if backend == "memory":
+                self.assertFalse(os.path.exists("/dev/shm/" + name))
+            with self.assertRaises(Exception):
+                shared.map_universe(failing, self.arrays, [1, 2, 3], 2,
+                                    backend)
+        self.assertEqual(os.listdir(self.path), [])
+        shm = [n for n in os.listdir("/dev/shm") if n.startswith(
+            f"evkit-{os.getpid()}-")] if os.path.exists("/dev/shm") else []
+        self.assertEqual(shm, [])
+
+    def test_value_universe(self):
+        rng = np.random.default_rng(0)
+        size = 50
+        statements = {
+            field: rng.uniform(1, 100, size=(size, valuation.HISTORY))
+            for field in valuation.FIELDS
+        }
+        inputs = dict(equity_beta=rng.uniform(0.5, 1.5, size),
+                      num_shares=rng.uniform(1, 10, size),
+                      mkt_price=rng.uniform(10, 20, size),
+                      rf=0.02,
+                      mrp=0.05)
+        expected = valuation.value_universe(statements, **inputs)
+        with np.errstate(all="ignore"):
+            results = shared.value_universe(statements, workers=3, **inputs)
+        for key in valuation.RESULTS:
+            np.testing.assert_allclose(results[key], expected[key])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import json
+import os
+import unittest
+import urllib.error
+import urllib.request
+
+from evkit import capital, financials, runner, standin, utils
+
+
+def fetch(url):
+    try:
+        with urllib.request.urlopen(url) as response:
+            return response.status, response.read().decode()
+    except urllib.error.HTTPError as error:
+        return error.code, error.read().decode()
+
+
+class StandInTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.environ = {
+            variable: os.environ.get(variable)
+            for variable, _ in utils.BASE_URLS.values()
+        }
+        cls.server = standin.StandIn(port=0).start()
+        utils.set_base_urls(yahoo=cls.server.url,
+                            morningstar=cls.server.url)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.stop()
+        for variable, value in cls.environ.items():
+            if value is None:
+                os.environ.pop(variable, None)
+            else:
+                os.environ[variable] = value
+
+    def test_base_urls(self):
+        self.assertEqual(utils.get_url("AAPL", "/financials?p="),
+                         self.server.url + "quote/AAPL/financials?p=AAPL")
+
+    def test_statements(self):
+        data = standin.company("AAPL")
+        fin_is = financials.IncomeStatement("AAPL")
+        fin_is.get_html_data()
+        fin_is.actual_statement()
+        self.assertAlmostEqual(fin_is.revenue[-1], round(data["revenue"][0]))
+        self.assertEqual(len(fin_is.ebit), 4)
+        fin_bs = financials.BalanceSheet("AAPL")
+        fin_bs.get_html_data()
+        fin_bs.actual_statement()
+        self.assertAlmostEqual(fin_bs.equity[-1], round(data["equity"][0]))
+
+    def test_cost_of_capital(self):
+        rf, mrp = utils.get_rf_mrp()
+        self.assertAlmostEqual(rf, standin.CONFIG["riskFree"] / 100)
+        self.assertAlmostEqual(
+            mrp, (standin.CONFIG["marketReturn"] - standin.CONFIG["riskFree"])
+            / 100)
+        data = standin.company("AAPL")
+        cap = capital.CostOfCapital("AAPL", rf, mrp)
+        cap.get_stock_summary()
+        self.assertAlmostEqual(cap.mkt_price, round(data["price"], 2))
+
+    def test_tickers(self):
+        _, urls = utils.get_tickers_url("large_cap")
+        stocks = utils.get_tickers(urls)
+        self.assertEqual(len(stocks), standin.CONFIG["universe"])
+        self.assertTrue(stocks["ticker"].is_unique)
+
+    def test_valuation(self):
+        rf, mrp = utils.get_rf_mrp()
+        results = runner.safe_value_ticker("MSFT", rf, mrp)
+        self.assertNotIn("error", results)
+        self.assertIsNotNone(results["wacc"])
+
+    def test_not_found(self):
+        status, _ = fetch(self.server.url + "unknown")
+        self.assertEqual(status, 404)
+        status, body = fetch(self.server.url + "stats")
+        self.assertEqual(status, 200)
+        self.assertGreater(json.loads(body)["statuses"]["404"], 0)
+
+
+class FaultsTest(unittest.TestCase):
+
+    def test_errors(self):
+        with standin.StandIn(port=0, error_rate=1.0) as server:
+            status, _ = fetch(server.url + "quote/AAPL")
+            self.assertIn(status, (500, 503))
+
+    def test_throttling(self):
+        with standin.StandIn(port=0, rate_limit=2) as server:
+            statuses = [fetch(server.url + "quote/AAPL")[0] for _ in range(6)]
+            stats = server.stats()
+        self.assertIn(429, statuses)
+        self.assertEqual(stats["requests"], 6)
+        self.assertEqual(stats["statuses"]["429"], statuses.count(429))
+
+
+if __name__ == "__main__":
+    unittest.main()
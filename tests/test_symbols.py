@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import pandas as pd
+
+from evkit import backtest, symbols
+
+
+def filings_index():
+    """ sub.txt rows of three companies, one renamed """
+    rows = [
+        ("0000320193-19-000001", 320193, "APPLE INC", 20190130, None, None),
+        ("0000320193-19-000002", 320193, "APPLE INC", 20191031, None, None),
+        ("0001018724-19-000001", 1018724, "AMAZON COM INC", 20190201, None,
+         None),
+        ("0001652044-15-000001", 1652044, "GOOGLE INC.", 20150205, None,
+         None),
+        ("0001652044-19-000001", 1652044, "ALPHABET INC.", 20190205,
+         "GOOGLE INC.", 20150902),
+    ]
+    return pd.DataFrame(rows,
+                        columns=[
+                            "adsh", "cik", "name", "filed", "former",
+                            "changed"
+                        ]).set_index("adsh")
+
+
+TICKERS = {
+    "0": {"cik_str": 320193, "ticker": "AAPL", "title": "Apple Inc."},
+    "1": {"cik_str": 1018724, "ticker": "AMZN", "title": "AMAZON COM INC"},
+    "2": {"cik_str": 1652044, "ticker": "GOOGL", "title": "Alphabet Inc."},
+    "3": {"cik_str": 1652044, "ticker": "GOOG", "title": "Alphabet Inc."},
+}
+
+
+class TestSymbolIndex(unittest.TestCase):
+    """
+    Tests for the ticker, CIK and company name index.
+    """
+    def setUp(self):
+        symbols.CONFIG["verbose"] = False
+        self.path = tempfile.mkdtemp() + "/"
+        self.symbols = symbols.SymbolIndex.from_filings(filings_index(),
+                                                        TICKERS)
+        return super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def test_exact_lookups(self):
+        self.assertEqual(len(self.symbols), 3)
+        self.assertEqual(self.symbols.cik("aapl"), 320193)
+        self.assertEqual(self.symbols.cik("Amazon.com, Inc."), 1018724)
+        self.assertEqual(self.symbols.cik("1652044"), 1652044)
+        self.assertIsNone(self.symbols.cik("MSFT"))
+        self.assertEqual(self.symbols.tickers(1652044), ["GOOG", "GOOGL"])
+        self.assertEqual(self.symbols.name(320193), "APPLE INC")
+
+    def test_name_history(self):
+        self.assertEqual(self.symbols.name(1652044), "ALPHABET INC.")
+        self.assertEqual(self.symbols.name(1652044, date=20150601),
+                         "GOOGLE INC.")
+        self.assertEqual([name for name, *_ in self.symbols.names(1652044)],
+                         ["GOOGLE INC.", "ALPHABET INC."])
+        # former names resolve to the company
+        self.assertEqual(self.symbols.cik("Google"), 1652044)
+
+    def test_prefix_search(self):
+        self.assertEqual(self.symbols.search("a"),
+                         [(1652044, "ALPHABET INC."),
+                          (1018724, "AMAZON COM INC"),
+                          (320193, "APPLE INC")])
+        self.assertEqual(self.symbols.search("goo"),
+                         [(1652044, "ALPHABET INC.")])
+        self.assertEqual(self.symbols.search("a", limit=1),
+                         [(1652044, "ALPHABET INC.")])
+        self.assertEqual(self.symbols.search("zz"), [])
+
+    def test_save_load(self):
+        path = self.symbols.save(self.path + "symbols.npz")
+        loaded = symbols.SymbolIndex.load(path)
+        self.assertEqual(loaded.cik("GOOG"), 1652044)
+        self.assertEqual(loaded.name(1652044, date=20150601), "GOOGLE INC.")
+        self.assertEqual(loaded.search("amaz"), [(1018724, "AMAZON COM INC")])
+        with np.load(path) as arrays:
+            self.assertFalse(any(a.dtype == object for a in arrays.values()))
+            self.assertTrue(set(symbols.DERIVED).issubset(arrays.files))
+        # names of a saved index are not normalized on load
+        with mock.patch.object(symbols, "normalize") as normalize:
+            loaded = symbols.SymbolIndex.load(path)
+        normalize.assert_not_called()
+        self.assertEqual(loaded.byName, self.symbols.byName)
+        np.testing.assert_array_equal(loaded.keys, self.symbols.keys)
+
+    def test_match_screener(self):
+        stocks = pd.DataFrame({
+            "ticker": ["AAPL", "BRK.B", "XYZ"],
+            "name": ["Apple Inc.", "Berkshire", "Amazon.com, Inc."],
+        })
+        ciks = self.symbols.match(stocks)["cik"]
+        self.assertEqual(ciks.dtype, "Int64")
+        self.assertEqual(list(ciks.fillna(0)), [320193, 0, 1018724])
+
+    def test_prices_by_ticker(self):
+        path = self.path + "prices.csv"
+        pd.DataFrame({
+            "date": ["2019-03-29", "2019-06-28", "2019-06-28", "2019-06-28"],
+            "ticker": ["AAPL", "AAPL", "GOOGL", "XYZ"],
+            "close": [190.0, 197.0, 1080.0, 1.0],
+        }).to_csv(path, index=False)
+        prices = backtest.load_prices(path, symbol_index=self.symbols)
+        self.assertEqual(list(prices.columns), [320193, 1652044])
+        self.assertEqual(prices[320193].iloc[-1], 197.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
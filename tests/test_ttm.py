@@ -0,0 +1,129 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from evkit import financials, sec_datareader, ttm
+
+
+def quarter_ends(fy_end_month, years):
+    """ yyyymmdd quarter ends of fiscal years ending in fy_end_month """
+    ends = []
+    for year in years:
+        for q in range(4):
+            month = (fy_end_month + 3 * q) % 12 + 1
+            calendar = year - 1 + (fy_end_month + 3 * q) // 12
+            ends.append(calendar * 10000 + month * 100 + 28)
+    return ends
+
+
+def report(cik, quarters, ends, ytd=True):
+    """ 10-Q/10-K facts of a revenue series, YTD or discrete quarters """
+    rows = []
+    for k, ddate in enumerate(ends):
+        q = k % 4 + 1
+        filed = ddate + 100
+        if ytd:
+            rows.append((cik, "Revenues", "USD", ddate, q,
+                         sum(quarters[k - q + 1:k + 1]), filed))
+        else:
+            rows.append((cik, "Revenues", "USD", ddate, 1, quarters[k], filed))
+    return rows
+
+
+class TestTTM(unittest.TestCase):
+    """
+    Tests for trailing-twelve-month flows of SEC facts.
+    """
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.quarters = rng.uniform(10, 20, size=12).round(2)
+        # fiscal year ends in September, first quarter ends in December
+        ends = quarter_ends(9, [2017, 2018, 2019])
+        rows = report(1, self.quarters, ends, ytd=True)
+        rows += report(2, self.quarters, ends, ytd=False)
+        self.facts = pd.DataFrame(rows,
+                                  columns=[
+                                      "cik", "tag", "uom", "ddate", "qtrs",
+                                      "value", "filed"
+                                  ])
+        self.ends = ends
+        return super().setUp()
+
+    def expected(self):
+        return [self.quarters[k - 3:k + 1].sum() for k in range(3, 12)]
+
+    def test_ytd_reports(self):
+        result = ttm.ttm_flows(self.facts[self.facts["cik"] == 1],
+                               keys=["cik", "tag", "uom"])
+        self.assertEqual(list(result["ddate"]), self.ends[3:])
+        np.testing.assert_allclose(result["ttm"], self.expected())
+        self.assertEqual(result["source"].iloc[0], "annual")
+        self.assertEqual(result["source"].iloc[1], "ytd")
+
+    def test_discrete_quarters(self):
+        result = ttm.ttm_flows(self.facts[self.facts["cik"] == 2],
+                               keys=["cik", "tag", "uom"])
+        np.testing.assert_allclose(result["ttm"], self.expected())
+        self.assertTrue((result["source"] == "quarters").all())
+
+    def test_amendment_restates_fact(self):
+        amended = self.facts.iloc[[11]].assign(value=100.0,
+                                               filed=self.ends[-1] + 10100)
+        facts = pd.concat([self.facts, amended])
+        result = ttm.ttm_flows(facts, keys=["cik", "tag", "uom"])
+        latest = result[result["cik"] == 1]["ttm"].iloc[-1]
+        self.assertEqual(latest, 100.0)
+
+    def test_statement_data(self):
+        months = ttm.month_ordinal(self.ends)
+        panel = pd.DataFrame(
+            {
+                "revenue": np.arange(12.0),
+                "ebit": np.arange(12.0) / 10,
+            },
+            index=pd.MultiIndex.from_product([[1], months],
+                                             names=["cik", "month"]))
+        data = ttm.statement_data(panel, 1)
+        np.testing.assert_array_equal(data["revenue"], [np.nan, 3, 7, 11])
+
+        fin_is = financials.IncomeStatement("TEST")
+        # missing oldest period zeroes the series, as get_actual does
+        fin_is.set_actual(data)
+        np.testing.assert_array_equal(fin_is.revenue, np.zeros(4))
+        data["revenue"] = np.array([0.5, 3, 7, 11])
+        fin_is.set_actual(data)
+        np.testing.assert_array_equal(fin_is.revenue, [0.5, 3, 7, 11])
+        # elements absent from the panel
+        np.testing.assert_array_equal(fin_is.tax, np.zeros(4))
+
+    def test_shares_fallback(self):
+        index = pd.DataFrame({
+            "cik": [1, 1],
+            "filed": [20190215, 20200215],
+            "form": ["10-K", "10-K"]
+        }, index=pd.Index(["2018", "2019"], name="adsh"))
+        rows = [
+            ("2018", "Revenues", 20181231, 4, 100.0),
+            ("2018", "EntityCommonStockSharesOutstanding", 20181231, 0, 9.0),
+            ("2019", "Revenues", 20191231, 4, 120.0),
+        ]
+        # weighted average shares of a 10-K are durations
+        for qtrs, value in ((4, 11.0), (1, 10.0)):
+            rows.append(("2018", "WeightedAverageNumberOfDilutedShares"
+                         "Outstanding", 20181231, qtrs, value))
+            rows.append(("2019", "WeightedAverageNumberOfDilutedShares"
+                         "Outstanding", 20191231, qtrs, value + 2))
+        finData = pd.DataFrame(
+            rows, columns=["adsh", "tag", "ddate", "qtrs", "value"])
+        facts = sec_datareader.statement_facts(finData, index)
+        shares = facts[facts["field"] == "shares"]
+        self.assertEqual(shares["qtrs"].tolist(), [0, 0])
+        # preferred instant tag, else the shortest duration
+        self.assertEqual(shares["value"].tolist(), [9.0, 12.0])
+        panel = ttm.statement_panel(finData, index)
+        self.assertEqual(panel["shares"].tolist(), [9.0, 12.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
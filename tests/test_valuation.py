@@ -0,0 +1,129 @@
+import unittest
+
+import numpy as np
+
+from evkit import capital, financials, valuation
+
+
+def per_ticker(statements, beta_eq, num_shares, mkt_price, rf, mrp, horizon):
+    """ Valuation of one ticker along the steps of launcher """
+    fin_is = financials.IncomeStatement("TEST")
+    fin_bs = financials.BalanceSheet("TEST")
+    fin_cf = financials.CashFlowStatement("TEST")
+    for fs in (fin_is, fin_bs, fin_cf):
+        for field, values in statements.items():
+            if hasattr(fs, field):
+                setattr(fs, field, np.array(values, dtype=float))
+    fin_bs.total_debt = fin_bs.st_debt + fin_bs.lt_debt
+    cap = capital.CostOfCapital(ticker="TEST", rf=rf, mrp=mrp)
+    cap.equity_beta = beta_eq
+
+    tax_rate = fin_is.get_tax_rate()
+    rd = cap.get_cost_of_debt(debt=fin_bs.total_debt, interest=fin_is.interest)
+    beta_debt = cap.get_debt_beta()
+    beta_asset = cap.get_asset_beta(debt=fin_bs.lt_debt,
+                                    equity=fin_bs.equity,
+                                    tax_rate=tax_rate)
+    re = cap.get_cost_of_equity()
+    wacc = cap.get_wacc(debt=fin_bs.lt_debt,
+                        assets=fin_bs.total_assets,
+                        tax_rate=tax_rate)
+    dt = capital.discount_factors(wacc=wacc, periods=horizon)
+    st_growth = fin_is.get_st_growth(fin_is.revenue)
+    fin_is.forecast_statement(st_growth=st_growth, periods=horizon)
+    fin_bs.forecast_statement(st_growth=st_growth, periods=horizon)
+    fin_cf.forecast_statement(st_growth=st_growth, periods=horizon)
+    fcf, ev = financials.dcf(ebit=fin_is.ebit,
+                             dna=fin_cf.depreciation,
+                             nwc=fin_bs.nwc,
+                             capex=fin_cf.capex,
+                             tax_rate=tax_rate,
+                             lt_growth=wacc * 0.5,
+                             wacc=wacc,
+                             dt=dt)
+    eq = ev - fin_bs.total_debt[3] + fin_bs.cash[3]
+    return [
+        beta_eq, beta_asset, beta_debt, re, rd, wacc, ev / 1_000_000,
+        eq / 1_000_000,
+        max(0, eq / num_shares), mkt_price
+    ]
+
+
+def synthetic_statements(n, seed=0):
+    """ Random statements of n tickers, YahooFinance sign conventions """
+    rng = np.random.default_rng(seed)
+    scale = rng.uniform(1e3, 1e6, size=(n, 1))
+    growth = np.cumprod(rng.uniform(0.9, 1.2, size=(n, 4)), axis=1)
+    revenue = scale * growth
+    statements = {
+        "revenue": revenue,
+        "ebit": revenue * rng.uniform(0.05, 0.3, size=(n, 1)),
+        "interest": -revenue * rng.uniform(0.001, 0.02, size=(n, 1)),
+        "cash": revenue * rng.uniform(0.05, 0.5, size=(n, 4)),
+        "current_assets": revenue * rng.uniform(0.3, 0.8, size=(n, 4)),
+        "total_assets": revenue * rng.uniform(1.5, 3, size=(n, 4)),
+        "current_liabilities": revenue * rng.uniform(0.2, 0.6, size=(n, 4)),
+        "st_debt": revenue * rng.uniform(0.01, 0.2, size=(n, 4)),
+        "lt_debt": revenue * rng.uniform(0.1, 0.8, size=(n, 4)),
+        "equity": revenue * rng.uniform(0.5, 1.5, size=(n, 4)),
+        "depreciation": revenue * rng.uniform(0.02, 0.1, size=(n, 1)),
+        "capex": -revenue * rng.uniform(0.02, 0.15, size=(n, 1)),
+    }
+    statements["tax"] = statements["ebit"] * rng.uniform(0.1, 0.3, (n, 1))
+    beta = rng.uniform(0.5, 1.8, size=n)
+    shares = scale[:, 0] * rng.uniform(0.01, 0.1, size=n)
+    price = rng.uniform(5, 500, size=n)
+    return statements, beta, shares, price
+
+
+class TestValueUniverse(unittest.TestCase):
+    """
+    Tests for vectorized DCF-WACC valuation.
+    """
+    def setUp(self):
+        self.rf, self.mrp, self.horizon = 0.02, 0.06, 5
+        self.statements, self.beta, self.shares, self.price = \
+            synthetic_statements(50)
+        return super().setUp()
+
+    def test_matches_per_ticker_path(self):
+        results = valuation.value_universe(self.statements,
+                                           equity_beta=self.beta,
+                                           num_shares=self.shares,
+                                           mkt_price=self.price,
+                                           rf=self.rf,
+                                           mrp=self.mrp,
+                                           horizon=self.horizon)
+        for i in range(len(self.beta)):
+            expected = per_ticker(
+                {k: v[i]
+                 for k, v in self.statements.items()}, self.beta[i],
+                self.shares[i], self.price[i], self.rf, self.mrp,
+                self.horizon)
+            actual = [results[col][i] for col in valuation.RESULTS]
+            np.testing.assert_allclose(actual, expected, rtol=1e-9)
+
+    def test_missing_period_zeroes_series(self):
+        self.statements["revenue"][0, 2] = np.nan
+        results = valuation.value_universe(self.statements,
+                                           equity_beta=self.beta,
+                                           num_shares=self.shares,
+                                           mkt_price=self.price,
+                                           rf=self.rf,
+                                           mrp=self.mrp)
+        self.assertTrue(np.isfinite(results["stock_price"][0]))
+
+    def test_missing_trading_information(self):
+        self.beta[3] = np.nan
+        results = valuation.value_universe(self.statements,
+                                           equity_beta=self.beta,
+                                           num_shares=self.shares,
+                                           mkt_price=self.price,
+                                           rf=self.rf,
+                                           mrp=self.mrp)
+        for col in valuation.RESULTS:
+            self.assertTrue(np.isnan(results[col][3]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,173 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+from evkit import sec_datareader, xbrl
+
+CONTEXTS = """
+<xbrli:context id="FY2020">
+  <xbrli:entity><xbrli:identifier scheme="http://www.sec.gov/CIK">0000320193</xbrli:identifier></xbrli:entity>
+  <xbrli:period><xbrli:startDate>2019-09-29</xbrli:startDate><xbrli:endDate>2020-09-26</xbrli:endDate></xbrli:period>
+</xbrli:context>
+<xbrli:context id="Q4">
+  <xbrli:entity><xbrli:identifier scheme="http://www.sec.gov/CIK">0000320193</xbrli:identifier></xbrli:entity>
+  <xbrli:period><xbrli:startDate>2020-06-28</xbrli:startDate><xbrli:endDate>2020-09-26</xbrli:endDate></xbrli:period>
+</xbrli:context>
+<xbrli:context id="I2020">
+  <xbrli:entity><xbrli:identifier scheme="http://www.sec.gov/CIK">0000320193</xbrli:identifier></xbrli:entity>
+  <xbrli:period><xbrli:instant>2020-09-26</xbrli:instant></xbrli:period>
+</xbrli:context>
+<xbrli:context id="Segment">
+  <xbrli:entity><xbrli:identifier scheme="http://www.sec.gov/CIK">0000320193</xbrli:identifier>
+  <xbrli:segment><xbrldi:explicitMember dimension="srt:ProductOrServiceAxis">us-gaap:ProductMember</xbrldi:explicitMember></xbrli:segment></xbrli:entity>
+  <xbrli:period><xbrli:startDate>2019-09-29</xbrli:startDate><xbrli:endDate>2020-09-26</xbrli:endDate></xbrli:period>
+</xbrli:context>
+<xbrli:unit id="usd"><xbrli:measure>iso4217:USD</xbrli:measure></xbrli:unit>
+<xbrli:unit id="shares"><xbrli:measure>xbrli:shares</xbrli:measure></xbrli:unit>
+"""
+
+INLINE = """<?xml version="1.0" encoding="utf-8"?>
+<html xmlns="http://www.w3.org/1999/xhtml"
+ xmlns:ix="http://www.xbrl.org/2013/inlineXBRL"
+ xmlns:xbrli="http://www.xbrl.org/2003/instance"
+ xmlns:xbrldi="http://xbrl.org/2006/xbrldi"
+ xmlns:ixt="http://www.xbrl.org/inlineXBRL/transformation/2020-02-12"
+ xmlns:us-gaap="http://fasb.org/us-gaap/2020-01-31"
+ xmlns:dei="http://xbrl.sec.gov/dei/2019-01-31">
+<head><title>10-K</title></head>
+<body>
+<div style="display:none"><ix:header><ix:resources>{contexts}</ix:resources></ix:header></div>
+<p>Form <ix:nonNumeric name="dei:DocumentType" contextRef="FY2020">10-K</ix:nonNumeric>
+for the period ended <ix:nonNumeric name="dei:DocumentPeriodEndDate" contextRef="FY2020" format="ixt:datemonthdayyearen">September 26, 2020</ix:nonNumeric>
+<ix:nonNumeric name="dei:EntityRegistrantName" contextRef="FY2020">Apple&nbsp;Inc.</ix:nonNumeric></p>
+{padding}
+<table>
+<tr><td>Net sales&nbsp;</td><td>$&#160;<ix:nonFraction name="us-gaap:RevenueFromContractWithCustomerExcludingAssessedTax" contextRef="FY2020" unitRef="usd" decimals="-6" scale="6" format="ixt:numdotdecimal">274,515</ix:nonFraction></td></tr>
+<tr><td>Net sales Q4</td><td><ix:nonFraction name="us-gaap:RevenueFromContractWithCustomerExcludingAssessedTax" contextRef="Q4" unitRef="usd" decimals="-6" scale="6">64,698</ix:nonFraction></td></tr>
+<tr><td>Products</td><td><ix:nonFraction name="us-gaap:RevenueFromContractWithCustomerExcludingAssessedTax" contextRef="Segment" unitRef="usd" decimals="-6" scale="6">220,747</ix:nonFraction></td></tr>
+<tr><td>Capex</td><td>(<ix:nonFraction name="us-gaap:PaymentsToAcquirePropertyPlantAndEquipment" contextRef="FY2020" unitRef="usd" decimals="-6" scale="6">7,309</ix:nonFraction>)</td></tr>
+<tr><td>Cash</td><td><ix:nonFraction name="us-gaap:CashAndCashEquivalentsAtCarryingValue" contextRef="I2020" unitRef="usd" decimals="-6" scale="6">38,016</ix:nonFraction></td></tr>
+<tr><td>Cash again</td><td><ix:nonFraction name="us-gaap:CashAndCashEquivalentsAtCarryingValue" contextRef="I2020" unitRef="usd" decimals="-6" scale="6">38,016</ix:nonFraction></td></tr>
+<tr><td>Loss</td><td><ix:nonFraction name="us-gaap:OperatingIncomeLoss" contextRef="FY2020" unitRef="usd" scale="6" sign="-">1,2</ix:nonFraction></td></tr>
+<tr><td>Not configured</td><td><ix:nonFraction name="us-gaap:Goodwill" contextRef="I2020" unitRef="usd" scale="6">1</ix:nonFraction></td></tr>
+</table>
+</body></html>
+"""
+
+INSTANCE = """<?xml version="1.0" encoding="utf-8"?>
+<xbrli:xbrl xmlns:xbrli="http://www.xbrl.org/2003/instance"
+ xmlns:xbrldi="http://xbrl.org/2006/xbrldi"
+ xmlns:us-gaap="http://fasb.org/us-gaap/2020-01-31"
+ xmlns:dei="http://xbrl.sec.gov/dei/2019-01-31">
+<dei:DocumentType contextRef="FY2020">10-K</dei:DocumentType>
+<dei:DocumentPeriodEndDate contextRef="FY2020">2020-09-26</dei:DocumentPeriodEndDate>
+<us-gaap:Revenues contextRef="FY2020" unitRef="usd" decimals="-6">274515000000</us-gaap:Revenues>
+<us-gaap:LongTermDebtNoncurrent contextRef="I2020" unitRef="usd" decimals="-6">98667000000</us-gaap:LongTermDebtNoncurrent>
+{contexts}
+</xbrli:xbrl>
+"""
+
+CASH = """<us-gaap:CashAndCashEquivalentsAtCarryingValue contextRef="I2020"
+ unitRef="usd" decimals="-6">38016000000</us-gaap:CashAndCashEquivalentsAtCarryingValue>
+"""
+
+
+class TestXbrl(unittest.TestCase):
+    """
+    Tests for streaming XBRL fact extraction.
+    """
+    def setUp(self):
+        xbrl.CONFIG["verbose"] = False
+        self.path = tempfile.mkdtemp() + "/"
+        folder = os.path.join(self.path, "320193", "10-K",
+                              "0000320193-20-000096")
+        os.makedirs(folder)
+        # entities across read chunks of the parser
+        padding = "<p>&nbsp;&amp;&mdash;</p>\n" * 2000
+        self.inline = os.path.join(folder, "aapl-20200926.htm")
+        with open(self.inline, "w") as file:
+            file.write(INLINE.format(contexts=CONTEXTS, padding=padding))
+        with open(os.path.join(folder, "filing.json"), "w") as file:
+            json.dump({"cik": 320193, "accession": "0000320193-20-000096",
+                       "form": "10-K", "date": "2020-10-30"}, file)
+        self.instance = os.path.join(self.path, "instance.xml")
+        with open(self.instance, "w") as file:
+            file.write(INSTANCE.format(contexts=CONTEXTS))
+        return super().setUp()
+
+    def tearDown(self):
+        shutil.rmtree(self.path)
+        return super().tearDown()
+
+    def test_inline(self):
+        index, facts = xbrl.extract_filing(self.inline)
+        self.assertEqual(index["adsh"], "0000320193-20-000096")
+        self.assertEqual(index["cik"], 320193)
+        self.assertEqual(index["filed"], 20201030)
+        self.assertEqual(index["period"], 20200926)
+        self.assertEqual(index["name"], "Apple\xa0Inc.")
+        values = {(f["tag"], f["qtrs"]): f["value"] for f in facts}
+        self.assertEqual(len(facts), 5)
+        revenue = "RevenueFromContractWithCustomerExcludingAssessedTax"
+        self.assertEqual(values[revenue, 4], 274_515e6)
+        self.assertEqual(values[revenue, 1], 64_698e6)
+        self.assertEqual(values["PaymentsToAcquirePropertyPlantAndEquipment",
+                                4], 7_309e6)
+        self.assertEqual(values["CashAndCashEquivalentsAtCarryingValue", 0],
+                         38_016e6)
+        self.assertEqual(values["OperatingIncomeLoss", 4], -12e6)
+        self.assertTrue(all(f["ddate"] == 20200926 for f in facts))
+        self.assertTrue(all(f["uom"] == "USD" for f in facts))
+
+    def test_instance(self):
+        index, facts = xbrl.extract_filing(self.instance)
+        self.assertEqual(index["adsh"], "instance")
+        self.assertEqual(index["cik"], 320193)
+        self.assertEqual(index["form"], "10-K")
+        self.assertEqual(sorted((f["tag"], f["qtrs"], f["version"])
+                                for f in facts),
+                         [("LongTermDebtNoncurrent", 0, "us-gaap/2020"),
+                          ("Revenues", 4, "us-gaap/2020")])
+
+    def test_statement_facts(self):
+        """ Extracted facts feed the SEC data set pipeline """
+        index, finData = xbrl.extract_filings(xbrl.find_filings(self.path),
+                                              workers=2)
+        self.assertEqual(len(index), 2)
+        facts = sec_datareader.statement_facts(finData, index)
+        self.assertEqual(set(facts["cik"]), {320193})
+        values = dict(zip(facts["field"] + facts["qtrs"].astype(str),
+                          facts["value"]))
+        self.assertEqual(values["revenue4"], 274_515e6)
+        # capex signed as YahooFinance
+        self.assertEqual(values["capex4"], -7_309e6)
+        self.assertEqual(values["cash0"], 38_016e6)
+        self.assertEqual(values["lt_debt0"], 98_667e6)
+
+    def test_malformed_values(self):
+        folder = os.path.dirname(self.inline)
+        # a second document of the same filing repeats its facts
+        with open(os.path.join(folder, "aapl-20200926_htm.xml"), "w") as file:
+            file.write(INSTANCE.format(contexts=CONTEXTS).replace(
+                "98667000000", "98,667 (restated)").replace(
+                    "</xbrli:xbrl>", CASH + "</xbrli:xbrl>"))
+        with open(self.instance, "w") as file:
+            file.write("<xbrli:xbrl>unclosed")
+
+        index, facts = xbrl.extract_filing(
+            os.path.join(folder, "aapl-20200926_htm.xml"))
+        self.assertEqual(index["skipped"], 1)
+        self.assertEqual(sorted(f["tag"] for f in facts),
+                         ["CashAndCashEquivalentsAtCarryingValue", "Revenues"])
+
+        index, finData = xbrl.extract_filings(xbrl.find_filings(self.path),
+                                              workers=2)
+        self.assertEqual(list(index.index), ["0000320193-20-000096"])
+        self.assertEqual(len(finData), 6)
+        self.assertFalse(finData.duplicated(["tag", "ddate", "qtrs"]).any())
+
+
+if __name__ == '__main__':
+    unittest.main()